@@ -7,36 +7,120 @@ anonCoin - Полный блокчейн с анонимными функция
 import os
 import json
 import hashlib
+import hmac
 import time
 import logging
+import math
 import random
+import secrets
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import Executor
+from functools import lru_cache
 from mnemonic import Mnemonic
 from base64 import b64encode, b64decode
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List
 from ecdsa import SigningKey, VerifyingKey, NIST384p, BadSignatureError
+from ecdsa.ellipticcurve import INFINITY, PointJacobi
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 
+from key_image_store import KeyImageStore
+from metrics import LONG_BUCKETS, counter, gauge, histogram, timed
+from tracing import span, traced
+
+# ===== Метрики горячих путей (GET /metrics) =====
+MINE_BLOCK_SECONDS = histogram("anoncoin_mine_block_seconds", "Время поиска nonce для блока", buckets=LONG_BUCKETS)
+MINE_HASHES = counter("anoncoin_mine_hashes_total", "Хешей, посчитанных при майнинге")
+MINE_HASHRATE = gauge("anoncoin_mine_hashrate", "Хешрейт последнего замайненного блока, H/s")
+TX_ADD_SECONDS = histogram("anoncoin_tx_add_seconds", "Длительность add_transaction")
+TX_ACCEPTED = counter("anoncoin_tx_accepted_total", "Транзакций принято в пул ожидания")
+TX_REJECTED = counter("anoncoin_tx_rejected_total", "Транзакций отклонено, по причинам", labels=("reason",))
+SIG_VERIFY_SECONDS = histogram("anoncoin_signature_verify_seconds", "Проверка подписи транзакции",
+                               labels=("tx_type",))
+
 # ===== UTXO + key-image helpers =====
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
 from hashlib import sha256
 
+# ===== Суммы =====
+# Все суммы — целые базовые единицы (COIN на монету): сложение точное, без
+# допусков 1e-9, и одинаковое на всех узлах. Транзакции версии 2 так и
+# сериализуются. Транзакции версии 1 (прежние цепочки) хранили float в монетах:
+# при загрузке сумма переводится в единицы, а исходное JSON-значение
+# сохраняется и сериализуется как было — txid и хеши блоков не меняются.
+COIN = 10**8
+TX_VERSION = 2
+
+
+def parse_amount(value) -> int:
+    """Сумма в монетах (число или строка, как вводит пользователь) -> единицы; точнее 1/COIN — ValueError"""
+    try:
+        coins = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"Некорректная сумма: {value!r}") from None
+    units = coins * COIN
+    if not units.is_finite() or units != units.to_integral_value():
+        raise ValueError(f"Сумма {value!r} не кратна 1/{COIN} монеты")
+    return int(units)
+
+
+def legacy_units(value) -> int:
+    """Сумма версии 1 (float/int в монетах) -> единицы, с округлением до ближайшей"""
+    return int((Decimal(repr(value)) * COIN).to_integral_value())
+
+
+def is_valid_units(value) -> bool:
+    """Сумма, допустимая в леджере: целое число единиц от 0 до MAX_SUPPLY"""
+    return type(value) is int and 0 <= value <= MAX_SUPPLY
+
+
+def strict_units(value) -> int:
+    """Сумма версии 2 из сети/файла: только целое от 0 до MAX_SUPPLY"""
+    if type(value) is not int:
+        raise ValueError(f"Сумма версии {TX_VERSION} должна быть целым числом единиц: {value!r}")
+    if not is_valid_units(value):
+        raise ValueError(f"Сумма вне диапазона 0..{MAX_SUPPLY}: {value}")
+    return value
+
+
+def format_amount(units: int) -> str:
+    """Единицы -> строка в монетах с 8 знаками ("12.50000000")"""
+    sign = "-" if units < 0 else ""
+    whole, frac = divmod(abs(units), COIN)
+    return f"{sign}{whole}.{frac:08d}"
+
+
+def to_coins(units: int) -> float:
+    """Единицы -> монеты числом (для отображения и прежних полей API)"""
+    return units / COIN
+
+
 def sha256_hex(data: bytes) -> str:
     return sha256(data).hexdigest()
 
-@dataclass
+@dataclass(slots=True)
 class TxOutput:
     txid: str
     index: int
     address: str
-    amount: float
+    amount: int   # базовые единицы
+    # Сумма выхода транзакции версии 1 как в её JSON (только для сериализации)
+    legacy_amount: float | int | None = field(default=None, compare=False, repr=False)
 
     def to_dict(self):
-        return {"txid": self.txid, "index": self.index, "address": self.address, "amount": self.amount}
+        amount = self.amount if self.legacy_amount is None else self.legacy_amount
+        return {"txid": self.txid, "index": self.index, "address": self.address, "amount": amount}
 
     @classmethod
-    def from_dict(cls, d):
-        return cls(d["txid"], d["index"], d["address"], d["amount"])
+    def from_dict(cls, d, version: int = TX_VERSION):
+        if version < 2:
+            return cls(d["txid"], d["index"], d["address"], legacy_units(d["amount"]), d["amount"])
+        return cls(d["txid"], d["index"], d["address"], strict_units(d["amount"]))
 
 @dataclass
 class TxInput:
@@ -53,59 +137,206 @@ class TxInput:
 
 class UTXOSet:
     """
-    Простой in-memory UTXO-набор. Не сериализуем в файл — восстанавливаем из цепочки.
+    In-memory UTXO-набор. Не сериализуем в файл — восстанавливаем из цепочки.
+
+    Выходы одной транзакции хранятся вместе и упакованными: ключ — 32 байта
+    txid, значение — записи (индекс, сумма в базовых единицах int64, 32 байта
+    адреса) подряд. Для обычной транзакции с получателем и сдачей это ~120 байт
+    на выход вместо ~350 у TxOutput с hex-строками в словаре по кортежам.
+    TxOutput создаётся только при чтении (get / available_for). Выходы, у которых
+    txid или адрес не 32-байтный hex (адрес генезиса), лежат как есть в _other.
+    Сумма вне 0..MAX_SUPPLY или номер выхода вне uint32 — ValueError в add.
     """
+    _RECORD = struct.Struct("<Iq32s")   # индекс выхода, сумма в базовых единицах, адрес
+
     def __init__(self):
-        self._map: dict[tuple[str, int], TxOutput] = {}
+        self._map: dict[bytes, bytes] = {}
+        self._other: dict[tuple[str, int], TxOutput] = {}
+        self._count = 0
+
+    @staticmethod
+    def _raw(hex_str: str) -> bytes | None:
+        if len(hex_str) != 64:
+            return None
+        try:
+            return bytes.fromhex(hex_str)
+        except ValueError:
+            return None
+
+    def _find(self, records: bytes, idx: int) -> int:
+        """Смещение записи выхода idx в значении транзакции или -1"""
+        size = self._RECORD.size
+        for offset in range(0, len(records), size):
+            if int.from_bytes(records[offset:offset + 4], "little") == idx:
+                return offset
+        return -1
+
+    def _unpack(self, txid: str, records: bytes, offset: int) -> TxOutput:
+        idx, units, address = self._RECORD.unpack_from(records, offset)
+        return TxOutput(txid, idx, address.hex(), units)
 
     def add(self, out: TxOutput):
-        self._map[(out.txid, out.index)] = out
+        # Поля проверяются до упаковки: struct.error — не ValueError, и откат блока бы не сработал
+        if not is_valid_units(out.amount):
+            raise ValueError(f"Некорректная сумма выхода {out.txid}:{out.index}: {out.amount!r}")
+        if type(out.index) is not int or not 0 <= out.index < 1 << 32:
+            raise ValueError(f"Некорректный номер выхода {out.txid}:{out.index!r}")
+        raw, address = self._raw(out.txid), self._raw(out.address)
+        if raw is None or address is None:
+            if raw is not None and raw in self._map:
+                self.spend(out.txid, out.index)
+            if (out.txid, out.index) not in self._other:
+                self._count += 1
+            self._other[(out.txid, out.index)] = out
+            return
+        if self._other and self._other.pop((out.txid, out.index), None) is not None:
+            self._count -= 1
+        try:
+            record = self._RECORD.pack(out.index, out.amount, address)
+        except struct.error as e:
+            raise ValueError(f"Выход {out.txid}:{out.index} не упаковывается: {e}") from None
+        records = self._map.get(raw, b"")
+        offset = self._find(records, out.index)
+        if offset < 0:
+            self._map[raw] = records + record
+            self._count += 1
+        else:
+            self._map[raw] = records[:offset] + record + records[offset + self._RECORD.size:]
 
     def spend(self, prev_txid: str, idx: int):
-        self._map.pop((prev_txid, idx), None)
+        raw = self._raw(prev_txid)
+        records = self._map.get(raw) if raw is not None else None
+        offset = self._find(records, idx) if records is not None else -1
+        if offset >= 0:
+            rest = records[:offset] + records[offset + self._RECORD.size:]
+            if rest:
+                self._map[raw] = rest
+            else:
+                del self._map[raw]
+            self._count -= 1
+        elif self._other.pop((prev_txid, idx), None) is not None:
+            self._count -= 1
 
     def has(self, prev_txid: str, idx: int) -> bool:
-        return (prev_txid, idx) in self._map
+        raw = self._raw(prev_txid)
+        records = self._map.get(raw) if raw is not None else None
+        if records is not None and self._find(records, idx) >= 0:
+            return True
+        return (prev_txid, idx) in self._other
 
     def get(self, prev_txid: str, idx: int) -> TxOutput | None:
-        return self._map.get((prev_txid, idx))
-
-    def balance(self, address: str) -> float:
-        return sum(o.amount for o in self._map.values() if o.address == address)
+        raw = self._raw(prev_txid)
+        records = self._map.get(raw) if raw is not None else None
+        offset = self._find(records, idx) if records is not None else -1
+        if offset >= 0:
+            return self._unpack(prev_txid, records, offset)
+        return self._other.get((prev_txid, idx))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _owned(self, address: str):
+        # Полный проход, как и раньше; транзакции без адреса отсекаются поиском байтов без распаковки
+        raw = self._raw(address)
+        if raw is not None:
+            size = self._RECORD.size
+            for txid, records in self._map.items():
+                if raw not in records:
+                    continue
+                for offset in range(0, len(records), size):
+                    if records[offset + 12:offset + size] == raw:
+                        yield txid, records, offset
+        yield from ((None, o, None) for o in self._other.values() if o.address == address)
+
+    def balance(self, address: str) -> int:
+        units = 0
+        for txid, records, offset in self._owned(address):
+            if txid is None:
+                units += records.amount
+            else:
+                units += int.from_bytes(records[offset + 4:offset + 12], "little", signed=True)
+        return units
 
     def available_for(self, address: str) -> list[TxOutput]:
-        return [o for o in self._map.values() if o.address == address]
+        return [self._unpack(txid.hex(), records, offset) if txid is not None else records
+                for txid, records, offset in self._owned(address)]
 
-def compute_key_image(private_key_bytes: bytes, inputs: list[TxInput]) -> str:
+@dataclass
+class BlockUndo:
     """
-    Упрощённая key image: KI = H( priv || concat(prev_txid||index) )
-    Достаточно для обнаружения повторной траты тех же «анонимных» входов.
+    Данные для отката блока: потраченные выходы, созданные выходы, key images.
+    Для созданного выхода хранится и затёртая им запись (совпадение txid у coinbase).
     """
-    h = sha256()
-    h.update(private_key_bytes)
-    for i in inputs:
-        h.update(i.prev_txid.encode())
-        h.update(str(i.output_index).encode())
-    return h.hexdigest()
+    spent: list[TxOutput]
+    created: list[tuple[str, int, TxOutput | None]]
+    key_images: list[str]
+
+@dataclass
+class ChainStats:
+    """
+    Сводка по вершине цепочки, обновляется при подключении/отключении блоков.
+    total_supply — выпущено coinbase-транзакциями (в единицах); next_reward/halvings — для следующего блока.
+    """
+    height: int = -1
+    tip_hash: str = ""
+    total_supply: int = 0
+    tx_count: int = 0
+    is_valid: bool = True
+    next_reward: int = 0
+    halvings: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "height": self.height,
+            "tip_hash": self.tip_hash,
+            "total_supply": self.total_supply,
+            "tx_count": self.tx_count,
+            "is_valid": self.is_valid,
+            "next_reward": self.next_reward,
+            "halvings": self.halvings,
+        }
+
+def compute_key_image(private_key_bytes: bytes, outpoint: TxInput) -> str:
+    """
+    Key image траты выхода outpoint: I = x_o * Hp(P_o), сжатая точка в hex, где
+    P_o = x_o * G — одноразовый ключ выхода (см. _output_secret). I зависит только
+    от выхода, поэтому вторая трата того же выхода (с любым кольцом) даёт ту же I
+    и ловится seen_key_images, а по I нельзя узнать, какой выход кольца потрачен.
+    """
+    secret = int.from_bytes(private_key_bytes, "big")
+    public = _G * secret
+    pub_raw = public.x().to_bytes(_COORD, "big") + public.y().to_bytes(_COORD, "big")
+    one_time = _output_secret(secret, pub_raw, outpoint)
+    return _encode_point(_member_base(_G * one_time) * one_time).hex()
 
 # ================================
 # КОНФИГУРАЦИЯ
 # ================================
 
 BLOCKCHAIN_NAME = "anonCoin"
-MAX_SUPPLY = 33_000_000
+MAX_SUPPLY = 33_000_000 * COIN
 HALVING_INTERVAL = 5000
 ANON_BLOCK_INTERVAL = 333
-BONUS_REWARD = 5
+BONUS_REWARD = 5 * COIN
 DEFAULT_DIFFICULTY = 3
-DEFAULT_REWARD = 50
+DEFAULT_REWARD = 50 * COIN
 RING_SIZE = 5
+# Анонимные траты прежних форматов (явные входы, кольцо ключей) не доказывают
+# владение входами. Уже добытые блоки с ними остаются валидными, новые — нет
+LEGACY_ANON_UNTIL = 1792368000   # 2026-10-19 00:00 UTC, метка времени блока
+MAX_UNDO_DEPTH = 100  # на сколько блоков назад храним данные отката (глубже — rebuild_state)
 AES_KEY_SIZE = 16
+HD_COIN_TYPE = 777    # m/44'/777'/счёт'/цепочка'/индекс'
+HD_GAP_LIMIT = 20     # подряд неиспользованных адресов, после которых сканирование останавливается
 BLOCKCHAIN_DATA_FILE = "blockchain_data.json"
 WALLETS_DATA_FILE = "wallets_data.json"
 
 # Глобальное хранилище кошельков для анонимных транзакций
 wallets = {}
+# Адреса, зарегистрированные после последнего save_wallets (дописываются в файл)
+_unsaved_wallets: list[str] = []
+# Последняя созданная цепочка (см. Blockchain.__init__)
+GLOBAL_BLOCKCHAIN_REF = None
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
@@ -129,10 +360,15 @@ def generate_transaction_id(transaction) -> str:
     tx_data = {
         'sender_pubkey': transaction.sender_pubkey,
         'receiver_address': transaction.receiver_address,
-        'amount': transaction.amount,
+        'amount': transaction.wire_amount(),
         'timestamp': transaction.timestamp,
         'tx_type': transaction.tx_type
     }
+    if transaction.version >= 2:
+        tx_data['version'] = transaction.version
+    if is_output_ring(transaction):
+        # Отправителя нет: без key image две траты одной суммы одному получателю в ту же секунду совпали бы
+        tx_data['key_image'] = transaction.key_image
     tx_string = json.dumps(tx_data, separators=(',', ':'), sort_keys=True)
     return hashlib.sha256(tx_string.encode()).hexdigest()
 
@@ -149,9 +385,9 @@ def is_duplicate_transaction(blockchain, tx_hash: str) -> bool:
 
     return False
 
-def calculate_balance(blockchain, address: str) -> float:
-    """Расчет баланса для указанного адреса"""
-    balance = 0.0
+def calculate_balance(blockchain, address: str) -> int:
+    """Расчет баланса (в базовых единицах) для указанного адреса"""
+    balance = 0
 
     for block in blockchain.chain:
         for tx in block.transactions:
@@ -172,6 +408,14 @@ def validate_transaction_balance(blockchain, transaction) -> bool:
     sender_balance = calculate_balance(blockchain, transaction.get_sender_address())
     return sender_balance >= transaction.amount
 
+def block_reward(height: int) -> int:
+    """
+    Базовая награда за блок на высоте height (в единицах): DEFAULT_REWARD, делится
+    пополам каждые HALVING_INTERVAL, не меньше монеты. Делятся целые монеты, как
+    и до перехода на единицы, — график выпуска прежних цепочек не меняется.
+    """
+    return max((DEFAULT_REWARD // COIN) >> (height // HALVING_INTERVAL), 1) * COIN
+
 def format_hash(hash_str: str, length: int = 8) -> str:
     """Форматирование хеша для отображения"""
     return f"{hash_str[:length]}..."
@@ -184,101 +428,848 @@ def format_timestamp(timestamp: int) -> str:
 # АНОНИМНЫЕ ФУНКЦИИ (КОЛЬЦЕВЫЕ ПОДПИСИ)
 # ================================
 
-def create_ring_signature(message: bytes, private_key: SigningKey, public_keys: List[str]):
-    """Создание кольцевой подписи для анонимных транзакций"""
-    signatures = []
-    key_images = []
+# LSAG (Liu–Wei–Wong) на NIST384p по выходам цепочки. Участник кольца — выход
+# (txid, индекс) с публичным ключом владельца P; его одноразовый ключ
+# P_o = P + Hs(P, выход) * G, у владельца — секрет x_o = x + Hs(P, выход). База
+# H_o = Hp(P_o), key image I = x_o * H_π — одна на выход, от входов транзакции не
+# зависит. Подпись: c_0 и s_0..s_{n-1}; проверка замыкает цепочку
+# c_{i+1} = Hs(prefix, s_i*G + c_i*P_o_i, s_i*H_o_i + c_i*I). Сами выходы кольца
+# (входы транзакции) входят в подписываемое сообщение.
+#
+# Каждый шаг — два двойных умножения (mul_add, трюк Шамира). Для G и часто
+# встречающихся выходов кольца есть предвычисленные таблицы удвоений
+# (PointJacobi(generator=True)): с ними s*G + c*P — два быстрых умножения.
+# Таблица стоит как ~4 обычных умножения и окупается примерно за 8 проверок,
+# поэтому выход получает таблицы (для P_o и H_o) только после
+# RING_PRECOMPUTE_AFTER появлений в кольцах (LRU на RING_POINT_CACHE выходов).
+
+_CURVE = NIST384p.curve
+_G = NIST384p.generator
+_Q = NIST384p.order
+_P = _CURVE.p()
+_COORD = 48                  # байт на координату / скаляр
+MAX_RING_SIZE = 128
+RING_SCHEME = "lsag2"        # кольцо по выходам; "lsag" и список подписей — прежние форматы
+RING_POINT_CACHE = 1024      # выходов кольца в кэше (с таблицами ~200 КБ, без — ~400 байт)
+RING_PRECOMPUTE_AFTER = 16   # появлений выхода в кольцах до построения таблиц
+_LSAG_DOMAIN = b"anonCoin LSAG v2"
+_ring_points: "OrderedDict[str, list]" = OrderedDict()   # ключ:выход -> [P_o, H_o, число появлений]
+_ring_points_lock = threading.Lock()
+
+
+def _encode_point(point) -> bytes:
+    return point.to_bytes("compressed")
+
+
+def _precomputed(point) -> PointJacobi:
+    """Та же точка, но с таблицей удвоений для быстрых умножений"""
+    return PointJacobi(_CURVE, point.x(), point.y(), 1, _Q, generator=True)
+
+
+def _hash_to_scalar(*parts: bytes) -> int:
+    h = hashlib.sha384()
+    for part in parts:
+        h.update(part)
+    return int.from_bytes(h.digest(), "big") % _Q
+
+
+def _hash_to_point(data: bytes) -> PointJacobi:
+    """Хеш в точку кривой перебором (try-and-increment); p ≡ 3 (mod 4) — корень одной степенью"""
+    a, b = _CURVE.a(), _CURVE.b()
+    for counter in range(256):
+        x = int.from_bytes(hashlib.sha384(data + counter.to_bytes(4, "big")).digest(), "big") % _P
+        y2 = (pow(x, 3, _P) + a * x + b) % _P
+        y = pow(y2, (_P + 1) // 4, _P)
+        if y * y % _P == y2:
+            return PointJacobi(_CURVE, x, y if y % 2 == 0 else _P - y, 1, _Q)
+    raise ValueError("hash_to_point: не найдена точка")  # вероятность 2^-256
+
+
+def _outpoint_bytes(outpoint: TxInput) -> bytes:
+    return f"{outpoint.prev_txid}:{outpoint.output_index};".encode()
+
+
+def _output_tweak(pub_raw: bytes, outpoint: TxInput) -> int:
+    return _hash_to_scalar(_LSAG_DOMAIN, b"out", pub_raw, _outpoint_bytes(outpoint))
+
+
+def _output_secret(secret: int, pub_raw: bytes, outpoint: TxInput) -> int:
+    """Секрет одноразового ключа выхода: x_o = x + Hs(P, выход)"""
+    return (secret + _output_tweak(pub_raw, outpoint)) % _Q
 
-    for pub_hex in public_keys:
-        pub_bytes = bytes.fromhex(pub_hex)
-        # Если это наш ключ - подписываем настоящим ключом
-        if pub_bytes == private_key.verifying_key.to_string():
-            sig = private_key.sign(message)
-        else:
-            # Иначе создаем фальшивую подпись
-            fake_key = SigningKey.generate(curve=NIST384p)
-            sig = fake_key.sign(message)
-
-        signatures.append(b64encode(sig).decode())
-        key_images.append(pub_hex)
-
-    return (signatures, key_images)
-
-def verify_ring_signature(message: bytes, ring_signature, key_images):
-    """Проверка кольцевой подписи"""
-    signatures, key_images_list = ring_signature
-
-    for sig_b64, pub_hex in zip(signatures, key_images_list):
-        valid = False
-        pub_bytes = bytes.fromhex(pub_hex)
-
-        # Проверяем подпись с каждым кошельком в системе
-        for wallet_info in wallets.values():
-            pubkey_hex = wallet_info.get("public_key", "")
-            pubkey_bytes = bytes.fromhex(pubkey_hex) if pubkey_hex else b""
-
-            if pubkey_bytes == pub_bytes:
-                try:
-                    vk = VerifyingKey.from_string(pubkey_bytes, curve=NIST384p)
-                    if vk.verify(b64decode(sig_b64), message):
-                        valid = True
-                        break
-                except Exception:
-                    continue
 
-        if not valid:
+def _member_base(output_key) -> PointJacobi:
+    return _hash_to_point(_LSAG_DOMAIN + b"Hp" + _encode_point(output_key))
+
+
+def _ring_member(pub_hex: str, outpoint: TxInput) -> tuple:
+    """
+    (P_o, H_o) выхода кольца; частым выходам строятся таблицы.
+    Ключ не на кривой — ValueError/MalformedPointError.
+    """
+    key = pub_hex + ":" + _outpoint_bytes(outpoint).decode()
+    with _ring_points_lock:
+        entry = _ring_points.get(key)
+        if entry is not None:
+            _ring_points.move_to_end(key)
+            entry[2] += 1
+            if entry[2] == RING_PRECOMPUTE_AFTER:
+                entry[0], entry[1] = _precomputed(entry[0]), _precomputed(entry[1])
+            return entry[0], entry[1]
+    pub_raw = bytes.fromhex(pub_hex)
+    owner = VerifyingKey.from_string(pub_raw, curve=NIST384p).pubkey.point
+    output_key = _G.mul_add(_output_tweak(pub_raw, outpoint), owner, 1)
+    if output_key == INFINITY:
+        raise ValueError("одноразовый ключ выхода — бесконечно удалённая точка")
+    base = _member_base(output_key)
+    with _ring_points_lock:
+        _ring_points[key] = [output_key, base, 1]
+        if len(_ring_points) > RING_POINT_CACHE:
+            _ring_points.popitem(last=False)
+    return output_key, base
+
+
+def _scalar_hex(value: int) -> str:
+    return value.to_bytes(_COORD, "big").hex()
+
+
+def _ring_prefix(message: bytes, image, ring: List[str], inputs) -> bytes:
+    return hashlib.sha384(_LSAG_DOMAIN + message + _encode_point(image)
+                          + b"".join(bytes.fromhex(pub) for pub in ring)
+                          + b"".join(_outpoint_bytes(i) for i in inputs)).digest()
+
+
+def create_ring_signature(message: bytes, private_key: SigningKey, public_keys: List[str],
+                          inputs, key_image: str | None = None) -> dict:
+    """
+    Кольцевая подпись LSAG сообщения message по выходам inputs (TxInput),
+    public_keys[i] — ключ владельца inputs[i]. Подписант владеет ровно одним
+    выходом кольца. key_image — уже посчитанный compute_key_image этого выхода
+    (иначе считается здесь).
+    """
+    ring, inputs = list(public_keys), list(inputs)
+    own = private_key.verifying_key.to_string().hex()
+    if ring.count(own) != 1:
+        raise ValueError("ключ подписанта должен входить в кольцо ровно один раз")
+    outpoints = {(i.prev_txid, i.output_index) for i in inputs}
+    if len(ring) != len(inputs) or len(ring) > MAX_RING_SIZE or len(outpoints) != len(inputs):
+        raise ValueError("некорректное кольцо")
+    n, pi = len(ring), ring.index(own)
+    secret = _output_secret(private_key.privkey.secret_multiplier, bytes.fromhex(own), inputs[pi])
+    members = [_ring_member(pub, outpoint) for pub, outpoint in zip(ring, inputs)]
+    image = _decode_key_image(key_image) if key_image else members[pi][1] * secret
+    prefix = _ring_prefix(message, image, ring, inputs)
+
+    c, s = [0] * n, [0] * n
+    alpha = secrets.randbelow(_Q - 1) + 1
+    c[(pi + 1) % n] = _hash_to_scalar(prefix, _encode_point(_G * alpha), _encode_point(members[pi][1] * alpha))
+    i = (pi + 1) % n
+    while i != pi:
+        s[i] = secrets.randbelow(_Q)
+        left = _G.mul_add(s[i], members[i][0], c[i])
+        right = members[i][1].mul_add(s[i], image, c[i])
+        c[(i + 1) % n] = _hash_to_scalar(prefix, _encode_point(left), _encode_point(right))
+        i = (i + 1) % n
+    s[pi] = (alpha - c[pi] * secret) % _Q
+    return {"scheme": RING_SCHEME, "ring": ring, "c0": _scalar_hex(c[0]), "s": [_scalar_hex(v) for v in s]}
+
+
+def _decode_key_image(key_image: str) -> PointJacobi:
+    """Точка key image из hex (сжатая форма); проверяется принадлежность кривой"""
+    point = PointJacobi.from_bytes(_CURVE, bytes.fromhex(key_image), order=_Q)
+    if point == INFINITY:
+        raise ValueError("key image — бесконечно удалённая точка")
+    return point
+
+
+def verify_ring_signature(message: bytes, ring_signature, key_image: str | None, inputs) -> bool:
+    """
+    Проверка LSAG по выходам inputs. Что ключи кольца — владельцы этих выходов,
+    проверяет вызывающий (Blockchain._check_ring_spend). Прежние форматы не проверяются.
+    """
+    try:
+        ring, s_values = ring_signature["ring"], ring_signature["s"]
+        n = len(ring)
+        if ring_signature.get("scheme") != RING_SCHEME or not 1 <= n <= MAX_RING_SIZE \
+                or len(s_values) != n or len(inputs) != n or not key_image \
+                or len({(i.prev_txid, i.output_index) for i in inputs}) != n:
             return False
-    return True
+        c0 = int(ring_signature["c0"], 16)
+        s = [int(v, 16) for v in s_values]
+        if c0 >= _Q or any(v >= _Q for v in s):
+            return False
+        image = _decode_key_image(key_image)
+        members = [_ring_member(pub, outpoint) for pub, outpoint in zip(ring, inputs)]
+    except (KeyError, TypeError, ValueError, AttributeError, AssertionError) as e:
+        logging.warning(f"Некорректная кольцевая подпись: {e}")
+        return False
+
+    prefix = _ring_prefix(message, image, ring, inputs)
+    c = c0
+    for i in range(n):
+        left = _G.mul_add(s[i], members[i][0], c)
+        right = members[i][1].mul_add(s[i], image, c)
+        if left == INFINITY or right == INFINITY:
+            return False
+        c = _hash_to_scalar(prefix, _encode_point(left), _encode_point(right))
+    return c == c0
+
+
+def is_output_ring(tx) -> bool:
+    """Анонимная транзакция с кольцом по выходам: её входы — кольцо, а не тратящиеся выходы"""
+    ring_signature = getattr(tx, "ring_signature", None)
+    return (tx.tx_type == "anonymous" and isinstance(ring_signature, dict)
+            and ring_signature.get("scheme") == RING_SCHEME)
+
+
+def spent_inputs(tx) -> list:
+    """Входы, которые транзакция действительно тратит (у кольца по выходам — никакие: трату отмечает key image)"""
+    return [] if is_output_ring(tx) else list(getattr(tx, "inputs", None) or [])
+
+# ================================
+# ИНДЕКС ВЫХОДОВ ДЛЯ ПРИМАНОК
+# ================================
+# Приманки кольца выбираются среди выходов цепочки, а не среди всех известных
+# кошельков: OutputIndex держит в порядке появления выходов массивы их
+# владельцев, сумм и мест в блоке (18 байт на выход) и массив начала каждого
+# блока в них. Выбор — случайный возраст в блоках по распределению, затем
+# случайный выход этого блока; обе операции — доступ по индексу, так что кольцо
+# стоит O(размера кольца) при любом числе выходов. Все выходы кольца должны
+# иметь одну сумму (сумма входа — она), поэтому приманки с другой суммой
+# пропускаются.
+#
+# Возраст по умолчанию — гамма-распределение логарифма возраста в секундах
+# (параметры Monero): у настоящих трат чаще свежие выходы, и равномерные
+# приманки выдавали бы настоящего участника. Если цепочка короче выпавшего
+# возраста, берётся равномерно случайный выход.
+#
+# Приманка годится, только если известен публичный ключ владельца: он
+# раскрывается стандартными транзакциями и кольцами, известен для
+# зарегистрированных кошельков и может быть сообщён явно (learn).
+
+DECOY_AGE_SHAPE = 19.28      # гамма-распределение ln(возраста в секундах)
+DECOY_AGE_RATE = 1.61
+DECOY_BLOCK_SECONDS = 120    # ожидаемое время блока для перевода возраста в блоки
+DECOY_ATTEMPTS = 8           # попыток на одну приманку (пропуск выходов с неизвестным ключом)
+
+
+def gamma_decoy_age(rng: random.Random) -> int:
+    """Возраст приманки в блоках по гамма-распределению"""
+    seconds = math.exp(rng.gammavariate(DECOY_AGE_SHAPE, 1 / DECOY_AGE_RATE))
+    return int(seconds / DECOY_BLOCK_SECONDS)
+
+
+def uniform_decoy_age(rng: random.Random) -> None:
+    """Без предпочтения по возрасту: равномерно по всем выходам"""
+    return None
+
+
+class OutputIndex:
+    """
+    Владельцы выходов цепочки в массивах для выбора приманок.
+    Подписчик Blockchain: блоки подключаются и откатываются только с вершины,
+    поэтому откат — усечение массивов.
+    """
+
+    def __init__(self, age_sampler: Callable[[random.Random], int | None] = gamma_decoy_age):
+        self.age_sampler = age_sampler
+        self._owners = array("I")          # номер адреса владельца каждого выхода
+        self._amounts = array("q")         # сумма выхода в единицах
+        self._tx_pos = array("I")          # номер транзакции выхода в его блоке
+        self._out_pos = array("I")         # номер выхода в транзакции
+        self._block_start = array("I")     # высота -> позиция первого выхода блока
+        self._ids: dict[str, int] = {}     # адрес -> номер
+        self._addresses: list[str] = []
+        self._pubkeys: dict[int, str] = {}  # номер адреса -> публичный ключ hex
+        self._rng = random.SystemRandom()
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def _intern(self, address: str) -> int:
+        owner = self._ids.get(address)
+        if owner is None:
+            owner = self._ids[address] = len(self._addresses)
+            self._addresses.append(address)
+        return owner
+
+    def learn(self, public_key_hex: str):
+        """Запомнить публичный ключ: выходы его адреса становятся пригодными приманками"""
+        try:
+            address = pubkey_to_address(bytes.fromhex(public_key_hex))
+        except (TypeError, ValueError):
+            return
+        self._pubkeys.setdefault(self._intern(address), public_key_hex)
+
+    def public_key(self, address: str) -> str | None:
+        owner = self._ids.get(address)
+        if owner is not None and owner in self._pubkeys:
+            return self._pubkeys[owner]
+        info = wallets.get(address)
+        return info["public_key"] if info else None
+
+    # ---------- события цепочки ----------
+    def on_chain_reset(self):
+        # Ключи и номера адресов остаются: это факты, не зависящие от цепочки
+        for column in (self._owners, self._amounts, self._tx_pos, self._out_pos, self._block_start):
+            del column[:]
+
+    def _append(self, address: str, amount: int, tx_pos: int, out_pos: int):
+        self._owners.append(self._intern(address))
+        self._amounts.append(amount)
+        self._tx_pos.append(tx_pos)
+        self._out_pos.append(out_pos)
+
+    def on_block_connected(self, block):
+        self._block_start.append(len(self._owners))
+        for tx_pos, tx in enumerate(block.transactions):
+            if tx.sender_pubkey:
+                self.learn(tx.sender_pubkey)
+            ring = getattr(tx, "ring_signature", None)
+            if isinstance(ring, dict):
+                for member in ring.get("ring", ()):
+                    self.learn(member)
+            if getattr(tx, "outputs", None):
+                for out_pos, out in enumerate(tx.outputs):
+                    self._append(out.address, out.amount, tx_pos, out_pos)
+            elif tx.receiver_address:
+                self._append(tx.receiver_address, tx.amount, tx_pos, 0)
+
+    def on_block_disconnected(self, block):
+        if block.index != len(self._block_start) - 1:
+            logging.warning(f"Индекс выходов: откат блока {block.index} не с вершины, индекс не изменён")
+            return
+        start = self._block_start.pop()
+        for column in (self._owners, self._amounts, self._tx_pos, self._out_pos):
+            del column[start:]
+
+    # ---------- выбор приманок ----------
+    def _draw(self, rng: random.Random) -> int:
+        """Случайная позиция выхода: возраст по распределению, затем выход внутри блока"""
+        tip = len(self._block_start) - 1
+        age = self.age_sampler(rng)
+        if age is None or age > tip:
+            return rng.randrange(len(self._owners))
+        height = tip - age
+        start = self._block_start[height]
+        end = self._block_start[height + 1] if height < tip else len(self._owners)
+        if end == start:
+            return rng.randrange(len(self._owners))
+        return start + rng.randrange(end - start)
+
+    def _sample(self, count: int, exclude, rng: random.Random | None,
+                accept: Callable[[int], bool] | None = None) -> list[tuple[int, str]]:
+        """(позиция, ключ владельца) выходов разных владельцев; accept — дополнительный фильтр позиции"""
+        if count <= 0 or not self._owners:
+            return []
+        rng = rng or self._rng
+        skip = {self._ids[a] for a in exclude if a in self._ids}
+        picked: dict[int, tuple[int, str]] = {}
+        for _ in range(count * DECOY_ATTEMPTS):
+            position = self._draw(rng)
+            owner = self._owners[position]
+            if owner in skip or owner in picked:
+                continue
+            public_key = self._pubkeys.get(owner)
+            if public_key is None:
+                info = wallets.get(self._addresses[owner])
+                if info is None:
+                    skip.add(owner)
+                    continue
+                public_key = info["public_key"]
+            if accept is not None and not accept(position):
+                continue
+            picked[owner] = (position, public_key)
+            if len(picked) == count:
+                break
+        return list(picked.values())
+
+    def outpoint(self, position: int, chain) -> TxInput:
+        """Выход по позиции в индексе; chain — цепочка, по событиям которой построен индекс"""
+        height = bisect_right(self._block_start, position) - 1
+        tx = chain[height].transactions[self._tx_pos[position]]
+        return TxInput(generate_transaction_id(tx), self._out_pos[position])
+
+    def sample_outputs(self, chain, count: int, amount: int, exclude=(), rng: random.Random | None = None,
+                       utxo_set=None) -> list[tuple[str, TxInput]]:
+        """
+        До count выходов разных владельцев с суммой ровно amount (кроме адресов
+        exclude): пары (ключ владельца, выход). С utxo_set — только непотраченные
+        выходы, какими их видит проверка блока. Выходов с редкой суммой может не
+        хватить — тогда кольцо меньше.
+        """
+        found: dict[int, TxInput] = {}
+
+        def accept(position: int) -> bool:
+            if self._amounts[position] != amount:
+                return False
+            outpoint = self.outpoint(position, chain)
+            if utxo_set is not None:
+                out = utxo_set.get(outpoint.prev_txid, outpoint.output_index)
+                if out is None or out.amount != amount or out.address != self._addresses[self._owners[position]]:
+                    return False
+            found[position] = outpoint
+            return True
 
-def get_ring_public_keys(sender_address, ring_size=RING_SIZE):
-    """Получение публичных ключей для кольцевой подписи"""
-    all_addresses = list(wallets.keys())
+        return [(public_key, found[position]) for position, public_key in self._sample(count, exclude, rng, accept)]
+
+    def stats(self) -> dict:
+        columns = (self._owners, self._amounts, self._tx_pos, self._out_pos, self._block_start)
+        return {
+            "outputs": len(self._owners),
+            "blocks": len(self._block_start),
+            "owners": len(self._addresses),
+            "known_keys": len(self._pubkeys),
+            "array_bytes": sum(c.buffer_info()[1] * c.itemsize for c in columns),
+        }
 
-    if len(all_addresses) < ring_size:
-        ring_size = len(all_addresses)
 
-    if ring_size <= 1:
-        # Если недостаточно кошельков, возвращаем только отправителя
-        if sender_address in wallets:
-            return [wallets[sender_address]["public_key"]]
+def get_ring_outputs(real: TxOutput, public_key_hex: str, ring_size: int = RING_SIZE,
+                     blockchain=None) -> tuple[list[str], list[TxInput]]:
+    """
+    Кольцо для траты выхода real: приманки — непотраченные выходы цепочки с той
+    же суммой, real — на случайном месте. Возвращает (ключи владельцев, выходы).
+    """
+    blockchain = blockchain or GLOBAL_BLOCKCHAIN_REF
+    members = []
+    if blockchain is not None:
+        members = blockchain.output_index.sample_outputs(
+            blockchain.chain, ring_size - 1, real.amount, exclude=(real.address,), utxo_set=blockchain.utxo_set)
+    members.insert(secrets.randbelow(len(members) + 1), (public_key_hex, TxInput(real.txid, real.index)))
+    return [pub for pub, _ in members], [outpoint for _, outpoint in members]
+
+# ================================
+# HD-ДЕРИВАЦИЯ КЛЮЧЕЙ
+# ================================
+# Схема в духе BIP32, адаптированная к NIST384p: из seed получается мастер-ключ
+# и chain code, дочерние ключи — только усиленные (hardened), т. е. считаются из
+# приватного ключа родителя одним HMAC-SHA512 без операций на кривой. Умножение
+# точки нужно лишь для публичного ключа (адреса) конечного ключа.
+
+HARDENED = 0x80000000
+_HD_ORDER = NIST384p.order
+_HD_KEY_BYTES = 48
+
+
+def hd_master_key(seed: bytes) -> tuple[int, bytes]:
+    """Мастер-ключ и chain code из seed (BIP39 to_seed)"""
+    key = int.from_bytes(hmac.new(b"anonCoin seed", seed, hashlib.sha384).digest(), "big") % _HD_ORDER
+    if key == 0:
+        raise ValueError("seed даёт нулевой мастер-ключ")
+    return key, hmac.new(b"anonCoin chain", seed, hashlib.sha256).digest()
+
+
+def hd_child_key(key: int, chain_code: bytes, index: int) -> tuple[int, bytes]:
+    """Усиленный дочерний ключ номер index (бит HARDENED выставляется всегда)"""
+    data = b"\x00" + key.to_bytes(_HD_KEY_BYTES, "big") + (index | HARDENED).to_bytes(4, "big")
+    digest = hmac.new(chain_code, data, hashlib.sha512).digest()
+    child = (key + int.from_bytes(digest[:32], "big")) % _HD_ORDER
+    if child == 0:
+        raise ValueError(f"недопустимый дочерний ключ {index}, используйте следующий индекс")
+    return child, digest[32:]
+
+
+def parse_hd_path(path: str) -> tuple[int, ...]:
+    """ "m/44'/777'/0'/0'/5'" -> индексы без бита HARDENED; неусиленные компоненты не поддерживаются"""
+    parts = path.strip().split("/")
+    if not parts or parts[0] != "m":
+        raise ValueError("путь должен начинаться с m/")
+    indices = []
+    for part in parts[1:]:
+        if not part.endswith(("'", "h")):
+            raise ValueError(f"поддерживается только усиленная деривация: {part}")
+        value = int(part[:-1])
+        if not 0 <= value < HARDENED:
+            raise ValueError(f"индекс вне диапазона: {part}")
+        indices.append(value)
+    return tuple(indices)
+
+
+def format_hd_path(indices: tuple[int, ...]) -> str:
+    return "/".join(["m"] + [f"{i}'" for i in indices])
+
+
+class HDWallet:
+    """
+    Много адресов из одного seed: m/44'/HD_COIN_TYPE'/account'/change'/index'.
+
+    Узлы дерева кешируются по префиксу пути, поэтому следующий адрес счёта — это
+    один HMAC от закешированного родителя. Публичные ключи тоже кешируются
+    (и могут быть подгружены из хранилища через preload), так что повторная
+    выдача адресов не требует операций на кривой.
+    """
+
+    def __init__(self, seed: bytes, account: int = 0):
+        self.seed = seed
+        self.account = account
+        self._nodes: dict[tuple[int, ...], tuple[int, bytes]] = {(): hd_master_key(seed)}
+        self._public: dict[tuple[int, int], str] = {}   # (change, index) -> публичный ключ hex
+        self._fingerprint: str | None = None
+
+    @classmethod
+    def from_mnemonic(cls, seed_phrase: str, passphrase: str = "", account: int = 0) -> "HDWallet":
+        mnemo = english_mnemonic()
+        if not mnemo.check(seed_phrase):
+            raise ValueError("Невалидная сид-фраза")
+        return cls(mnemo.to_seed(seed_phrase, passphrase), account)
+
+    def path(self, index: int, change: int = 0) -> tuple[int, ...]:
+        return (44, HD_COIN_TYPE, self.account, change, index)
+
+    def derive(self, path: tuple[int, ...]) -> tuple[int, bytes]:
+        """(ключ, chain code) узла; считается от самого длинного закешированного префикса"""
+        node = self._nodes.get(path)
+        if node is not None:
+            return node
+        depth = len(path)
+        while path[:depth] not in self._nodes:
+            depth -= 1
+        key, chain_code = self._nodes[path[:depth]]
+        for i in range(depth, len(path)):
+            key, chain_code = hd_child_key(key, chain_code, path[i])
+            # Листья (адреса) не кешируем: их тысячи, а родитель и так в кеше
+            if i < len(path) - 1:
+                self._nodes[path[:i + 1]] = (key, chain_code)
+        return key, chain_code
+
+    def private_key_hex(self, index: int, change: int = 0) -> str:
+        return self.derive(self.path(index, change))[0].to_bytes(_HD_KEY_BYTES, "big").hex()
+
+    def public_key_hex(self, index: int, change: int = 0) -> str:
+        cached = self._public.get((change, index))
+        if cached is None:
+            sk = SigningKey.from_secret_exponent(self.derive(self.path(index, change))[0], curve=NIST384p)
+            cached = self._public[(change, index)] = sk.verifying_key.to_string().hex()
+        return cached
+
+    def preload(self, public_keys: list[str], change: int = 0, start: int = 0):
+        """Подставить ранее вычисленные публичные ключи индексов start..start+n-1"""
+        for index, pub_hex in enumerate(public_keys, start):
+            self._public[(change, index)] = pub_hex
+
+    def address(self, index: int, change: int = 0) -> str:
+        return pubkey_to_address(bytes.fromhex(self.public_key_hex(index, change)))
+
+    def wallet(self, index: int, change: int = 0) -> "Wallet":
+        """Кошелёк для подписи от адреса index (SigningKey создаётся лениво)"""
+        return Wallet.from_keys(self.private_key_hex(index, change), self.public_key_hex(index, change))
+
+    @property
+    def fingerprint(self) -> str:
+        """Идентификатор счёта: хеш первого адреса внешней цепочки"""
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.sha256(f"{self.account}:{self.address(0)}".encode()).hexdigest()[:16]
+        return self._fingerprint
+
+    def scan(self, is_used, gap_limit: int = HD_GAP_LIMIT, change: int = 0,
+             start: int = 0) -> tuple[list[int], int]:
+        """
+        Сканирование с лимитом разрыва: идём по индексам, пока не встретим gap_limit
+        неиспользованных адресов подряд. is_used(address) -> bool — например,
+        проверка по индексу адресов. Возвращает (использованные индексы, следующий свободный).
+        """
+        used, gap, index = [], 0, start
+        while gap < gap_limit:
+            if is_used(self.address(index, change)):
+                used.append(index)
+                gap = 0
+            else:
+                gap += 1
+            index += 1
+        return used, (used[-1] + 1 if used else start)
+
+
+# ================================
+# UTXO КОШЕЛЬКА
+# ================================
+
+class CoinTracker:
+    """
+    Монеты (UTXO) адресов одного кошелька с курсором лучшего блока. Подписывается
+    на события цепочки (Blockchain.add_listener(..., replay=False)), поэтому выбор
+    входов и баланс — локальные операции без обхода глобального UTXO-набора.
+
+    Потраченные монеты держатся ещё MAX_UNDO_DEPTH блоков, чтобы отключение блока
+    вернуло их без пересканирования. Отключение более старого блока — повод для
+    rescan() с высоты рождения кошелька.
+
+    Трата кольцом по выходам не называет монету — её выдаёт только key image.
+    key_image_of(монета) -> key image (нужен приватный ключ, см.
+    Wallet.output_key_image); без него такие траты учёт не видит.
+    """
+
+    def __init__(self, addresses, birth_height: int = 0,
+                 key_image_of: Callable[[TxOutput], str | None] | None = None):
+        self.addresses: set[str] = set(addresses)
+        self.birth_height = birth_height
+        self.key_image_of = key_image_of
+        self.blockchain = None
+        self.coins: dict[tuple[str, int], TxOutput] = {}
+        self.balances: dict[str, int] = {}   # в единицах
+        self.best_height = -1
+        self.best_hash = ""
+        # (txid, индекс) -> (высота траты, монета); высота None — трата не видна кошельку
+        # (анонимный вход при сканировании по индексу адресов)
+        self._spent: dict[tuple[str, int], tuple[int | None, TxOutput]] = {}
+        self._images: dict[str, tuple[str, int]] = {}   # key image монеты -> (txid, индекс)
+        self._undo_floor = 0   # блоки ниже этой высоты отключаются только через rescan()
+
+    # ---------- состояние ----------
+    def _add(self, out: TxOutput):
+        # Совпадающий txid (одинаковые coinbase) затирает монету, как и в UTXOSet
+        self._remove((out.txid, out.index))
+        self.coins[(out.txid, out.index)] = out
+        self.balances[out.address] = self.balances.get(out.address, 0) + out.amount
+        if self.key_image_of is not None:
+            image = self.key_image_of(out)
+            if image:
+                self._images[image] = (out.txid, out.index)
+
+    def _remove(self, key) -> TxOutput | None:
+        out = self.coins.pop(key, None)
+        if out is not None:
+            self.balances[out.address] -= out.amount
+        return out
+
+    def _reset(self):
+        self.coins, self.balances, self._spent, self._images = {}, {}, {}, {}
+        self.best_height, self.best_hash = -1, ""
+
+    def _own_outputs(self, tx):
+        if getattr(tx, "outputs", None):
+            if not any(out.address in self.addresses for out in tx.outputs):
+                return []
+            txid = generate_transaction_id(tx)
+            return [TxOutput(txid, idx, out.address, out.amount)
+                    for idx, out in enumerate(tx.outputs) if out.address in self.addresses]
+        if tx.receiver_address in self.addresses:
+            return [TxOutput(generate_transaction_id(tx), 0, tx.receiver_address, tx.amount)]
         return []
 
-    ring_members = random.sample(all_addresses, min(ring_size - 1, len(all_addresses)))
+    def _spends(self, tx) -> list[tuple[str, int]]:
+        """Монеты, которые транзакция тратит: явные входы или монета с её key image"""
+        keys = [(txin.prev_txid, txin.output_index) for txin in spent_inputs(tx)]
+        if is_output_ring(tx) and tx.key_image in self._images:
+            keys.append(self._images[tx.key_image])
+        return keys
+
+    def _apply(self, block):
+        for tx in block.transactions:
+            for key in self._spends(tx):
+                out = self._remove(key)
+                if out is not None:
+                    self._spent[key] = (block.index, out)
+            for out in self._own_outputs(tx):
+                self._add(out)
+        self.best_height, self.best_hash = block.index, block.hash
+
+    def _prune_spent(self):
+        floor = self.best_height - MAX_UNDO_DEPTH + 1
+        if floor > self._undo_floor:
+            self._undo_floor = floor
+            self._spent = {k: v for k, v in self._spent.items() if v[0] is None or v[0] >= floor}
+
+    # ---------- события цепочки ----------
+    def on_chain_reset(self):
+        # Цепочка будет подключена заново с генезиса — события восстановят монеты
+        self._reset()
+        self._undo_floor = 0
+
+    def on_block_connected(self, block):
+        if block.index <= self.best_height:
+            return  # уже учтён (например, rescan во время подключения)
+        self._apply(block)
+        self._prune_spent()
+
+    def on_block_disconnected(self, block):
+        if block.index > self.best_height:
+            return
+        if block.index < self._undo_floor:
+            if self.blockchain is not None:
+                self.rescan(self.blockchain)
+            return
+        for tx in reversed(block.transactions):
+            for out in self._own_outputs(tx):
+                self._remove((out.txid, out.index))
+            for key in self._spends(tx):
+                spent = self._spent.pop(key, None)
+                if spent is not None:
+                    self._add(spent[1])
+        self.best_height, self.best_hash = block.index - 1, block.previous_hash
+
+    # ---------- сканирование ----------
+    def rescan(self, blockchain, start_height: int | None = None, heights=None):
+        """
+        Пересобрать монеты с высоты start_height (по умолчанию — высота рождения):
+        монеты, полученные раньше, не учитываются. heights — только эти высоты
+        (например, из индекса адресов) вместо всех блоков; траты, скрытые анонимными
+        входами, тогда сверяются с UTXO-набором и key images цепочки.
+        """
+        self.blockchain = blockchain
+        start = self.birth_height if start_height is None else start_height
+        self._reset()
+        chain = blockchain.chain
+        for height in (range(start, len(chain)) if heights is None else sorted(h for h in heights if h >= start)):
+            self._apply(chain[height])
+        if heights is not None:
+            spent_images = {key: image for image, key in self._images.items()
+                            if image in blockchain.seen_key_images}
+            for key in [k for k in self.coins if not blockchain.utxo_set.has(*k) or k in spent_images]:
+                self._spent[key] = (None, self._remove(key))
+        self.best_height = len(chain) - 1
+        self.best_hash = chain[-1].hash if chain else ""
+        self._undo_floor = start
+        self._prune_spent()
+        return self
+
+    def add_address(self, address: str):
+        """Новый (ещё не использованный) адрес; для адреса с историей нужен rescan()"""
+        self.addresses.add(address)
+
+    # ---------- запросы ----------
+    def balance(self, address: str | None = None) -> int:
+        if address is not None:
+            return self.balances.get(address, 0)
+        return sum(self.balances.values())
+
+    def available(self, address: str | None = None) -> list[TxOutput]:
+        return [o for o in self.coins.values() if address is None or o.address == address]
+
+    def select(self, amount: int, address: str | None = None) -> list[TxOutput] | None:
+        """Входы на сумму amount в единицах (старые монеты первыми); None — не хватает средств"""
+        selected, total = [], 0
+        for out in self.coins.values():
+            if address is not None and out.address != address:
+                continue
+            selected.append(out)
+            total += out.amount
+            if total >= amount:
+                return selected
+        return None
 
-    if sender_address not in ring_members and sender_address in wallets:
-        ring_members.append(sender_address)
+    def stats(self) -> dict:
+        return {
+            "addresses": len(self.addresses),
+            "coins": len(self.coins),
+            "balance": self.balance(),
+            "best_height": self.best_height,
+            "best_hash": self.best_hash,
+        }
 
-    random.shuffle(ring_members)
-    return [wallets[addr]["public_key"] for addr in ring_members if addr in wallets]
 
 # ================================
 # КЛАСС КОШЕЛЬКА
 # ================================
 
+@lru_cache(maxsize=None)
+def english_mnemonic() -> Mnemonic:
+    """Один объект Mnemonic со словарём на процесс: конструктор читает и разбирает wordlist"""
+    return Mnemonic("english")
+
+
+BULK_CHUNK = 256  # ключей на одну задачу пула при пакетном создании кошельков
+
+
+def generate_key_batch(count: int, with_seed_phrase: bool = True) -> list[tuple[str, str, str | None]]:
+    """
+    (приватный ключ hex, публичный ключ hex, сид-фраза) для count новых кошельков.
+    Выполняется в процессах пула: возвращает только строки, без объектов ecdsa.
+    """
+    mnemo = english_mnemonic() if with_seed_phrase else None
+    keys = []
+    for _ in range(count):
+        if mnemo:
+            # Как в Wallet(): ключ — первый HD-адрес сид-фразы
+            phrase = mnemo.to_mnemonic(os.urandom(32))
+            hd = HDWallet(mnemo.to_seed(phrase))
+            keys.append((hd.private_key_hex(0), hd.public_key_hex(0), phrase))
+        else:
+            sk = SigningKey.generate(curve=NIST384p)
+            keys.append((sk.to_string().hex(), sk.verifying_key.to_string().hex(), None))
+    return keys
+
+
+def generate_wallets(count: int, executor: Executor | None = None,
+                     with_seed_phrase: bool = True) -> list["Wallet"]:
+    """
+    Пакетное создание кошельков. С executor (ProcessPoolExecutor) генерация ключей
+    идёт параллельно кусками по BULK_CHUNK; объекты SigningKey в родительском
+    процессе не строятся, пока ключ не понадобится для подписи.
+    """
+    chunks = [min(BULK_CHUNK, count - i) for i in range(0, count, BULK_CHUNK)]
+    if executor is None or len(chunks) < 2:
+        batches = [generate_key_batch(n, with_seed_phrase) for n in chunks]
+    else:
+        batches = executor.map(generate_key_batch, chunks, [with_seed_phrase] * len(chunks))
+    return [Wallet.from_keys(priv, pub, phrase) for batch in batches for priv, pub, phrase in batch]
+
+
 class Wallet:
+    """
+    Ключи хранятся как hex и материализуются в объекты ecdsa при первом обращении:
+    SigningKey.from_string стоит столько же, сколько генерация ключа (умножение точки),
+    а для загрузки и пакетного создания кошельков он не нужен.
+    """
+
+    # Монеты кошелька (см. track); без него входы ищутся в UTXO-наборе цепочки
+    coins: CoinTracker | None = None
+
     def __init__(self, seed_phrase=None):
         """Инициализация кошелька. Если передан seed_phrase, восстанавливаем кошелек"""
         if seed_phrase:
             # Восстанавливаем кошелек из сид-фразы
             self._restore_from_seed(seed_phrase)
         else:
-            # Генерация нового кошелька
-            self.private_key = SigningKey.generate(curve=NIST384p)
-            self.public_key = self.private_key.verifying_key
-            self.aes_key = os.urandom(AES_KEY_SIZE)
-            self.public_key_hex = self.public_key.to_string().hex()
-            self.seed_phrase = self.generate_seed_phrase()
+            # Генерация нового кошелька: ключ выводится из сид-фразы, чтобы по ней его можно было восстановить
+            self._restore_from_seed(self.generate_seed_phrase())
+
+    # ---------- ключи (ленивые) ----------
+    @property
+    def private_key(self) -> SigningKey:
+        if self._private_key is None:
+            self._private_key = SigningKey.from_string(bytes.fromhex(self._private_key_hex), curve=NIST384p)
+        return self._private_key
+
+    @private_key.setter
+    def private_key(self, key: SigningKey):
+        self._private_key = key
+        self._private_key_hex = None
+
+    @property
+    def private_key_hex(self) -> str:
+        if self._private_key_hex is None:
+            self._private_key_hex = self._private_key.to_string().hex()
+        return self._private_key_hex
+
+    @property
+    def public_key(self) -> VerifyingKey:
+        if self._public_key is None:
+            self._public_key = VerifyingKey.from_string(bytes.fromhex(self.public_key_hex), curve=NIST384p)
+        return self._public_key
+
+    @public_key.setter
+    def public_key(self, key: VerifyingKey):
+        self._public_key = key
+
+    @classmethod
+    def from_keys(cls, private_key_hex: str, public_key_hex: str, seed_phrase: str | None = None) -> "Wallet":
+        """Кошелёк из готовых ключей без вычислений на кривой (ключи не проверяются)"""
+        wallet = cls.__new__(cls)
+        wallet._private_key, wallet._private_key_hex = None, private_key_hex
+        wallet._public_key = None
+        wallet.public_key_hex = public_key_hex
+        wallet.aes_key = os.urandom(AES_KEY_SIZE)
+        wallet.seed_phrase = seed_phrase
+        return wallet
 
     def generate_seed_phrase(self):
         """Генерация сид-фразы для кошелька"""
-        mnemonic = Mnemonic("english")
+        mnemonic = english_mnemonic()
         seed = os.urandom(32)  # Генерация случайного 256-битного значения
         seed_phrase = mnemonic.to_mnemonic(seed)
         return seed_phrase
 
     def _restore_from_seed(self, seed_phrase):
-        from mnemonic import Mnemonic
-
         # Приводим seed_phrase к строке, если это bytes
         if isinstance(seed_phrase, bytes):
             try:
@@ -286,15 +1277,15 @@ class Wallet:
             except Exception:
                 seed_phrase = seed_phrase.decode("latin1", errors="ignore")
 
-        mnemo = Mnemonic("english")
+        mnemo = english_mnemonic()
 
         # Проверяем валидность сид-фразы (если хочешь, можно убрать)
         if not mnemo.check(seed_phrase):
             raise ValueError("Невалидная сид-фраза")
 
-        seed = mnemo.to_seed(seed_phrase)
-        # Извлекаем из seed приватный ключ
-        self.private_key = SigningKey.from_string(seed[:32], curve=NIST384p)
+        # Ключ кошелька — первый адрес HD-счёта 0 (m/44'/777'/0'/0'/0')
+        hd = HDWallet(mnemo.to_seed(seed_phrase))
+        self.private_key = SigningKey.from_secret_exponent(hd.derive(hd.path(0))[0], curve=NIST384p)
         self.public_key = self.private_key.verifying_key
         self.aes_key = os.urandom(AES_KEY_SIZE)  # Новый AES ключ
         self.public_key_hex = self.public_key.to_string().hex()
@@ -312,7 +1303,21 @@ class Wallet:
 
     def get_address(self) -> str:
         """Получение адреса кошелька"""
-        return pubkey_to_address(self.public_key.to_string())
+        return pubkey_to_address(bytes.fromhex(self.public_key_hex))
+
+    def track(self, blockchain, birth_height: int = 0, heights=None) -> CoinTracker:
+        """Завести свой учёт монет: сканирование с birth_height и подписка на события цепочки"""
+        if self.coins is not None:
+            blockchain.remove_listener(self.coins)
+        self.coins = CoinTracker([self.get_address()], birth_height, self.output_key_image).rescan(
+            blockchain, heights=heights)
+        blockchain.add_listener(self.coins, replay=False)
+        return self.coins
+
+    def untrack(self, blockchain):
+        if self.coins is not None:
+            blockchain.remove_listener(self.coins)
+            self.coins = None
 
     def get_public_key(self):
         """Получение объекта публичного ключа"""
@@ -359,82 +1364,77 @@ class Wallet:
             logging.warning(f"Ошибка расшифровки: {e}")
             return None
 
-    def create_anonymous_transaction(self, receiver_address: str, amount: float, metadata=None):
-       """Создание анонимной транзакции: входы UTXO + key_image + (опционально) ring signature."""
+    def output_key_image(self, out: TxOutput) -> str | None:
+        """Key image своей монеты (для учёта трат кольцом); чужая монета — None"""
+        if out.address != self.get_address():
+            return None
+        return compute_key_image(self.private_key.to_string(), TxInput(out.txid, out.index))
+
+    def create_anonymous_transaction(self, receiver_address: str, amount: int, metadata=None, blockchain=None):
+       """
+       Создание анонимной транзакции (amount в единицах): одна своя монета, скрытая в
+       кольце выходов цепочки с той же суммой, key image этой монеты и подпись LSAG.
+       Выходы — получатель и сдача.
+       """
+       blockchain = blockchain or GLOBAL_BLOCKCHAIN_REF
        sender_address = self.get_address()
-   
-       # 1) Попросим блокчейн (глобально импортирован в узле) подсказать доступные UTXO.
-       #    Если это ядро используется отдельно, ниже fallback через глобальную функцию.
-       try:
-           available = GLOBAL_BLOCKCHAIN_REF.utxo_set.available_for(sender_address)  # будет задан ниже
-       except Exception:
-           available = []
-   
-       # Fallback: если утх-реестр ещё не собран, пусть блокчейн соберёт его из цепи
-       if not available and 'GLOBAL_BLOCKCHAIN_REF' in globals():
+
+       # 1) Свои монеты: свой учёт (track), иначе — UTXO-набор блокчейна
+       #    (глобальная ссылка задаётся в Blockchain.__init__)
+       if self.coins is not None:
+           available = self.coins.available(sender_address)
+       else:
            try:
-               GLOBAL_BLOCKCHAIN_REF.ensure_state()
-               available = GLOBAL_BLOCKCHAIN_REF.utxo_set.available_for(sender_address)
+               available = blockchain.utxo_set.available_for(sender_address)
            except Exception:
                available = []
-   
-       # 2) Набираем входы на требуемую сумму
-       inputs, total_in = [], 0.0
-       for out in available:
-           inputs.append(TxInput(prev_txid=out.txid, output_index=out.index))
-           total_in += out.amount
-           if total_in + 1e-9 >= amount:
-               break
-   
-       if total_in + 1e-9 < amount:
-           print("❌ Недостаточно средств в UTXO")
+
+       # 2) Одна монета на всю сумму: кольцо прячет один выход. Потраченные кольцом
+       #    монеты остаются в UTXO-наборе — отсеиваем их по key image (и пул ожидания)
+       spent = {tx.key_image for tx in blockchain.pending_transactions} if blockchain is not None else set()
+       coin, key_image = None, None
+       for out in sorted((o for o in available if o.amount >= amount), key=lambda o: o.amount):
+           image = self.output_key_image(out)
+           if image in spent or (blockchain is not None and image in blockchain.seen_key_images):
+               continue
+           coin, key_image = out, image
+           break
+
+       if coin is None:
+           print("❌ Нет непотраченной монеты на всю сумму")
            return None
-   
-       # 3) Формируем выходы: получатель и (если нужно) сдача
-       outputs = []
-       # txid пока неизвестен — заполним постфактум при применении блока; но для сериализации хватит адрес/amount
-       outputs.append(TxOutput(txid="", index=0, address=receiver_address, amount=float(amount)))
-       change = total_in - amount
+
+       # 3) Выходы: получатель и (если нужно) сдача
+       outputs = [TxOutput(txid="", index=0, address=receiver_address, amount=amount)]
+       change = coin.amount - amount
        if change > 0:
-           outputs.append(TxOutput(txid="", index=1, address=sender_address, amount=float(change)))
-   
-       # 4) Собираем транзакцию
+           outputs.append(TxOutput(txid="", index=1, address=sender_address, amount=change))
+
+       # 4) Кольцо: монета на случайном месте среди выходов цепочки с той же суммой
+       ring_keys, ring_inputs = get_ring_outputs(coin, self.public_key_hex, RING_SIZE, blockchain)
+
        tx = Transaction(
            sender_pubkey_hex=None,           # скрыт
            receiver_address=receiver_address,
-           amount=float(amount),
+           amount=amount,
            metadata=metadata,
            tx_type="anonymous",
-           inputs=inputs,
+           inputs=ring_inputs,
            outputs=outputs,
+           key_image=key_image,
        )
-   
-       # 5) key image: связываем с конкретными входами, чтобы нельзя было потратить повторно
-       try:
-           priv_bytes = self.private_key.to_string()
-           tx.key_image = compute_key_image(priv_bytes, inputs)
-       except Exception:
-           # если по какой-то причине не удалось — всё равно заблокируем повтор по входам на этапе валидации
-           tx.key_image = None
-   
-       # 6) (Опционально) кольцевая подпись — если в кодовой базе есть нужные функции
-       try:
-           ring_keys = get_ring_public_keys(sender_address, RING_SIZE)
-           if len(ring_keys) >= 2:
-               message = serialize_transaction({k: v for k, v in tx.to_dict().items() if k not in ("signature", "ring_signature")})
-               ring_signature = create_ring_signature(message, self.private_key, ring_keys)
-               tx.ring_signature = ring_signature
-       except Exception as e:
-           # кольцо не обязательно — защита от двойной траты обеспечивается key image + UTXO
-           logging.info(f"Ring signature пропущена: {e}")
-   
-       print(f"✅ Создана анонимная транзакция с {len(inputs)} вход(а/ов) и key_image={tx.key_image[:16]+'…' if tx.key_image else 'None'}")
+
+       # 5) Подпись LSAG: входы, выходы и key image — в подписываемом сообщении
+       tx.ring_signature = create_ring_signature(tx.signing_message(), self.private_key, ring_keys,
+                                                 ring_inputs, key_image)
+
+       print(f"✅ Создана анонимная транзакция: кольцо из {len(ring_inputs)} выходов, key_image={key_image[:16]}…")
        return tx
 
     def to_dict(self):
         """Сериализация кошелька в словарь"""
         return {
-            'private_key': self.private_key.to_string().hex(),
+            'private_key': self.private_key_hex,
             'public_key': self.public_key_hex,
             'aes_key': b64encode(self.aes_key).decode(),
             'address': self.get_address(),
@@ -470,10 +1470,14 @@ class Transaction:
         inputs: list[TxInput] | None = None,
         outputs: list[TxOutput] | None = None,
         key_image: str | None = None,
+        version: int = TX_VERSION,
+        legacy_amount=None,
     ):
         self.sender_pubkey = sender_pubkey_hex
         self.receiver_address = receiver_address
-        self.amount = amount
+        self.amount = amount            # базовые единицы
+        self.version = version
+        self.legacy_amount = legacy_amount  # версия 1: сумма как в исходном JSON (для txid и хеша блока)
         self.signature = signature
         self.metadata = metadata
         self.tx_type = tx_type
@@ -485,11 +1489,17 @@ class Transaction:
         self.outputs = outputs or []   # список выходов UTXO
         self.key_image = key_image     # для анонимных транзакций
 
+    def wire_amount(self):
+        """Сумма в сериализованной форме: единицы (версия 2) или исходное значение версии 1"""
+        if self.version >= 2:
+            return self.amount
+        return self.legacy_amount if self.legacy_amount is not None else to_coins(self.amount)
+
     def to_dict(self) -> dict:
         result = {
             "sender_pubkey": self.sender_pubkey,
             "receiver_address": self.receiver_address,
-            "amount": self.amount,
+            "amount": self.wire_amount(),
             "signature": self.signature,
             "metadata": self.metadata,
             "tx_type": self.tx_type,
@@ -503,6 +1513,8 @@ class Transaction:
             result["outputs"] = [o.to_dict() for o in self.outputs]
         if self.key_image:
             result["key_image"] = self.key_image
+        if self.version >= 2:
+            result["version"] = self.version
         return result
 
     def to_json(self) -> str:
@@ -520,17 +1532,27 @@ class Transaction:
 
     def verify_signature(self) -> bool:
         """Проверка подписи транзакции."""
-        # Анонимные транзакции — подпись кольцом (если используется) + key_image проверяется отдельно
+        started = time.perf_counter()
+        try:
+            return self._verify_signature()
+        finally:
+            SIG_VERIFY_SECONDS.labels(self.tx_type).observe(time.perf_counter() - started)
+
+    def signing_message(self) -> bytes:
+        """Подписываемые данные: вся транзакция без подписи и кольца"""
+        return serialize_transaction(self.to_dict())
+
+    def _verify_signature(self) -> bool:
+        # Анонимные — только кольцо по выходам; что ключи кольца владеют его выходами,
+        # проверяет Blockchain._check_ring_spend. Прежние форматы не доказывают владение
         if self.tx_type == "anonymous":
-            if self.ring_signature:
-                try:
-                    message = serialize_transaction({k: v for k, v in self.to_dict().items() if k not in ("signature", "ring_signature")})
-                    return verify_ring_signature(message, self.ring_signature, self.ring_signature[1])
-                except Exception as e:
-                    logging.warning(f"Ошибка проверки ring signature: {e}")
-                    return False
-            # допускаем анонимные без ring_signature, если активна модель с одним отправителем
-            return True
+            if not is_output_ring(self):
+                return False
+            try:
+                return verify_ring_signature(self.signing_message(), self.ring_signature, self.key_image, self.inputs)
+            except Exception as e:
+                logging.warning(f"Ошибка проверки ring signature: {e}")
+                return False
 
         # Для обычных транзакций — ECDSA
         if not self.sender_pubkey or not self.signature:
@@ -557,13 +1579,20 @@ class Transaction:
 
     @classmethod
     def from_dict(cls, data):
-        """Создание транзакции из словаря (совместимо со старым форматом)."""
+        """
+        Создание транзакции из словаря. Без "version" — прежний формат (версия 1,
+        float в монетах): суммы переводятся в единицы, исходные значения сохраняются.
+        """
+        version = data.get("version", 1)
+        if version not in (1, TX_VERSION):
+            raise ValueError(f"Неподдерживаемая версия транзакции: {version!r}")
         inputs = [TxInput.from_dict(i) for i in data.get("inputs", [])]
-        outputs = [TxOutput.from_dict(o) for o in data.get("outputs", [])]
+        outputs = [TxOutput.from_dict(o, version) for o in data.get("outputs", [])]
+        legacy = version < 2
         return cls(
             sender_pubkey_hex=data.get('sender_pubkey'),
             receiver_address=data['receiver_address'],
-            amount=data['amount'],
+            amount=legacy_units(data['amount']) if legacy else strict_units(data['amount']),
             signature=data.get('signature'),
             metadata=data.get('metadata'),
             tx_type=data.get('tx_type', 'standard'),
@@ -572,6 +1601,8 @@ class Transaction:
             inputs=inputs,
             outputs=outputs,
             key_image=data.get("key_image"),
+            version=version,
+            legacy_amount=data['amount'] if legacy else None,
         )
 # ================================
 # КЛАСС БЛОКА
@@ -596,9 +1627,16 @@ class Block:
     def mine_block(self, difficulty):
         """Майнинг блока с заданной сложностью"""
         target = '0' * difficulty
+        started, start_nonce = time.perf_counter(), self.nonce
         while self.hash[:difficulty] != target:
             self.nonce += 1
             self.hash = self.calculate_hash()
+        elapsed = time.perf_counter() - started
+        hashes = self.nonce - start_nonce
+        MINE_BLOCK_SECONDS.observe(elapsed)
+        MINE_HASHES.inc(hashes)
+        if elapsed > 0:
+            MINE_HASHRATE.set(hashes / elapsed)
 
         logging.info(f"Блок {self.index} замайнен: nonce={self.nonce}, хеш={self.hash}")
 
@@ -640,7 +1678,17 @@ class Blockchain:
         self.rewards = DEFAULT_REWARD
         # === Новые структуры состояния ===
         self.utxo_set = UTXOSet()
-        self.seen_key_images: set[str] = set()
+        # Потраченные key images: дайджесты в отсортированном массиве + фильтр Блума;
+        # узел подменяет на хранилище с файлом (key_image_store.py)
+        self.seen_key_images = KeyImageStore()
+        self._key_images_synced = -1  # при пересборке: до этой высоты key images уже в хранилище
+        self.stats = ChainStats()
+        self._undo: dict[str, BlockUndo] = {}  # хеш блока -> данные отката (последние MAX_UNDO_DEPTH)
+        # Подписчики на подключение/отключение блоков (индексы, кэши, уведомления).
+        # Методы (все необязательны): on_block_connected(block), on_block_disconnected(block), on_chain_reset(),
+        # on_transaction_added(tx) — транзакция принята в пул ожидания
+        self.output_index = OutputIndex()   # выходы цепочки для приманок колец
+        self.listeners: list = [self.output_index]
         self.create_genesis_block()
         # Глобальная ссылка для доступа из Wallet (см. create_anonymous_transaction)
         global GLOBAL_BLOCKCHAIN_REF
@@ -648,7 +1696,7 @@ class Blockchain:
 
     def create_genesis_block(self):
         """Создание генезис блока с фиксированным балансом"""
-        start_balance = 3333666  # фиксированная сумма в anonCoin
+        start_balance = 3333666 * COIN  # фиксированная сумма: 3 333 666 anonCoin
 
         initial_tx = Transaction(
             sender_pubkey_hex=None,  # coinbase
@@ -675,17 +1723,20 @@ class Blockchain:
         # Майним генезис-блок
         genesis_block.mine_block(self.difficulty)
 
-        self.chain.append(genesis_block)
+        # Подключаем: coinbase-выход становится UTXO, обновляется сводка
+        self._connect(genesis_block)
         logging.info("✅ Генезис-блок создан: %s монет отправлено на %s",
-                     start_balance, initial_tx.receiver_address)
-
-        # Зарегистрировать coinbase-выход как UTXO
-        self._apply_block_utxo(genesis_block)
+                     format_amount(start_balance), initial_tx.receiver_address)
 
     def get_latest_block(self):
         return self.chain[-1]
 
     def get_total_supply(self):
+        """Выпущенные монеты — накопитель из сводки, O(1)"""
+        return self.stats.total_supply
+
+    def recount_total_supply(self):
+        """Полный пересчёт выпуска по всей цепочке (для проверки накопителя)"""
         total = 0
         for block in self.chain:
             for tx in block.transactions:
@@ -694,44 +1745,84 @@ class Blockchain:
                         total += tx.amount
         return total
 
+    @timed(TX_ADD_SECONDS)
+    @traced("add_transaction", args=lambda self, tx: {"tx_type": tx.tx_type})
     def add_transaction(self, transaction: Transaction):
         """Добавление транзакции в пул ожидания"""
         try:
-            if not transaction.verify_signature():
+            # Кольцевая подпись проверяется в validate_transaction_utxo — после дешёвых проверок кольца
+            with span("verify_signature"):
+                signature_ok = transaction.tx_type == "anonymous" or transaction.verify_signature()
+            if not signature_ok:
                 logging.warning("❌ Неверная подпись транзакции. Транзакция отклонена.")
+                TX_REJECTED.labels("bad_signature").inc()
+                return False
+
+            if not is_valid_units(transaction.amount) or not all(
+                    is_valid_units(out.amount) for out in transaction.outputs or ()):
+                logging.warning("❌ Сумма должна быть целым числом единиц от 0 до MAX_SUPPLY. Транзакция отклонена.")
+                TX_REJECTED.labels("bad_amount").inc()
                 return False
 
             if transaction.tx_type not in ["anonymous", "coinbase"]:
                 if not transaction.sender_pubkey or not transaction.receiver_address:
                     logging.warning("❌ Пустой адрес отправителя или получателя. Транзакция отклонена.")
+                    TX_REJECTED.labels("missing_address").inc()
                     return False
 
-            if transaction.tx_type != "coinbase":
-                if not validate_transaction_balance(self, transaction):
+            if transaction.tx_type == "anonymous":
+                # Счёта отправителя нет: проверяются кольцо выходов, подпись и key image
+                if not is_output_ring(transaction):
+                    logging.warning("❌ Анонимная транзакция без кольца по выходам (LSAG). Транзакция отклонена.")
+                    TX_REJECTED.labels("missing_ring_signature").inc()
+                    return False
+                with span("validate_utxo"):
+                    inputs_ok = self.validate_transaction_utxo(transaction)
+                if not inputs_ok:
+                    TX_REJECTED.labels("invalid_inputs").inc()
+                    return False
+                if any(tx.key_image == transaction.key_image for tx in self.pending_transactions):
+                    logging.warning("❌ Key image уже есть в пуле ожидания. Транзакция отклонена.")
+                    TX_REJECTED.labels("key_image_reused").inc()
+                    return False
+            elif transaction.inputs:
+                # Монеты тратятся только кольцом (key image); явный вход не отмечал бы трату
+                logging.warning("❌ Явные входы допускаются только в анонимных транзакциях. Транзакция отклонена.")
+                TX_REJECTED.labels("invalid_inputs").inc()
+                return False
+            elif transaction.tx_type != "coinbase":
+                with span("validate_balance"):
+                    balance_ok = validate_transaction_balance(self, transaction)
+                if not balance_ok:
                     logging.warning("❌ Недостаточно средств. Транзакция отклонена.")
+                    TX_REJECTED.labels("insufficient_funds").inc()
                     return False
 
             tx_hash = generate_transaction_id(transaction)
-            if is_duplicate_transaction(self, tx_hash):
+            with span("is_duplicate_transaction"):
+                duplicate = is_duplicate_transaction(self, tx_hash)
+            if duplicate:
                 logging.warning("❌ Дублирующая транзакция. Отклонено.")
+                TX_REJECTED.labels("duplicate").inc()
                 return False
 
             self.pending_transactions.append(transaction)
             logging.info("✅ Транзакция добавлена в пул.")
+            TX_ACCEPTED.inc()
+            self._notify("on_transaction_added", transaction)
             return True
         except Exception as e:
             logging.error(f"Ошибка при добавлении транзакции: {e}")
+            TX_REJECTED.labels("error").inc()
             return False
 
     def mine_pending_transactions(self, miner_address: str, manifest=None):
         block_index = len(self.chain)
 
-        # Награда за блок
-        if self.get_total_supply() < MAX_SUPPLY:
-            if block_index % HALVING_INTERVAL == 0 and self.rewards > 1:
-                self.rewards = max(self.rewards // 2, 1)
-
-            reward = min(self.rewards, MAX_SUPPLY - self.get_total_supply())
+        # Награда за блок: выпуск и халвинг берутся из сводки цепочки, без обхода блоков
+        issued = self.stats.total_supply
+        if issued < MAX_SUPPLY:
+            reward = min(self.stats.next_reward, MAX_SUPPLY - issued)
 
             metadata = None
             if block_index % ANON_BLOCK_INTERVAL == 0:
@@ -753,125 +1844,372 @@ class Blockchain:
             manifest=manifest
         )
         block.mine_block(self.difficulty)
-        self.chain.append(block)
-        self.pending_transactions = []
 
-        # Обновляем UTXO и KeyImages
-        self._apply_block_utxo(block)
+        # Обновляем UTXO, KeyImages и сводку
+        self._connect(block)
+        self.pending_transactions = []
 
         logging.info(f"✅ Блок {block_index} замайнен успешно!")
 
-    def is_chain_valid(self):
-        for i in range(1, len(self.chain)):
-            current_block = self.chain[i]
-            previous_block = self.chain[i - 1]
+    @traced("is_chain_valid", args=lambda self, chain=None: {"blocks": len(chain if chain is not None else self.chain)})
+    def is_chain_valid(self, chain=None):
+        """Проверка хешей, связности и номеров блоков (по умолчанию — своей цепочки). O(длина цепочки)"""
+        chain = self.chain if chain is None else chain
+        if chain and chain[0].index != 0:
+            return False
+        for i in range(1, len(chain)):
+            current_block = chain[i]
+            previous_block = chain[i - 1]
 
+            # Индексы (адресов, транзакций) адресуют блок его номером — он обязан быть позицией
+            if current_block.index != i:
+                return False
             if current_block.hash != current_block.calculate_hash():
                 return False
             if current_block.previous_hash != previous_block.hash:
                 return False
         return True
 
-    def get_balance(self, address: str) -> float:
+    def is_valid_new_block(self, block) -> bool:
+        """Блок продолжает текущую вершину и его хеш соответствует содержимому"""
+        tip = self.get_latest_block()
+        return (block.index == tip.index + 1
+                and block.previous_hash == tip.hash
+                and block.hash == block.calculate_hash())
+
+    # ================================
+    # ПОДКЛЮЧЕНИЕ / ОТКЛЮЧЕНИЕ БЛОКОВ
+    # ================================
+
+    def connect_block(self, block) -> bool:
+        """Подключение проверенного блока к вершине (блок от пира)"""
+        if not self.is_valid_new_block(block):
+            logging.warning(f"❌ Блок {block.index} не продолжает вершину или повреждён")
+            return False
+        try:
+            self._connect(block)
+        except ValueError as e:
+            logging.warning(f"❌ Блок {block.index} отклонён: {e}")
+            return False
+
+        # Из мемпула уходят только транзакции, попавшие в блок
+        included = {generate_transaction_id(tx) for tx in block.transactions}
+        self.pending_transactions = [
+            tx for tx in self.pending_transactions if generate_transaction_id(tx) not in included
+        ]
+        return True
+
+    def disconnect_tip(self):
+        """Откат вершины; некоинбейс-транзакции блока возвращаются в мемпул"""
+        if len(self.chain) <= 1:
+            raise ValueError("Генезис-блок нельзя отключить")
+        block = self.chain.pop()
+        undo = self._undo.pop(block.hash, None)
+        if undo is None:
+            # Данные отката уже вытеснены — пересобираем состояние целиком
+            self.rebuild_state()
+        else:
+            self._revert_utxo(undo)
+            self.seen_key_images.commit(len(self.chain) - 1, self.chain[-1].hash)
+            self._update_stats(block, -1)
+            self._notify("on_block_disconnected", block)
+        self.pending_transactions[0:0] = [tx for tx in block.transactions if tx.tx_type != "coinbase"]
+        return block
+
+    def _disconnect_to(self, length: int):
+        """
+        Откат цепочки до length блоков. Если данных отката хватает — по блоку;
+        иначе (откат глубже MAX_UNDO_DEPTH) — одна пересборка, а не по одной на блок.
+        """
+        if all(block.hash in self._undo for block in self.chain[length:]):
+            while len(self.chain) > length:
+                self.disconnect_tip()
+            return
+        removed = self.chain[length:]
+        self.chain = self.chain[:length]
+        self.rebuild_state()
+        self.pending_transactions[0:0] = [
+            tx for block in removed for tx in block.transactions if tx.tx_type != "coinbase"
+        ]
+
+    def replace_chain(self, new_chain) -> bool:
+        """
+        Переход на более длинную валидную цепочку: откат до общего предка
+        и подключение новых блоков. При ошибке остаётся прежняя цепочка.
+        """
+        if len(new_chain) <= len(self.chain) or not self.is_chain_valid(new_chain):
+            return False
+
+        fork = 0
+        limit = min(len(self.chain), len(new_chain))
+        while fork < limit and self.chain[fork].hash == new_chain[fork].hash:
+            fork += 1
+
+        if fork == 0:
+            # Другой генезис — общего предка нет, пересобираем состояние
+            old_chain = self.chain
+            try:
+                self.load_chain(new_chain)
+                return True
+            except ValueError as e:
+                logging.warning(f"❌ Цепочка отклонена: {e}")
+                self.load_chain(old_chain)
+                return False
+
+        old_tail = self.chain[fork:]
+        self._disconnect_to(fork)
+        for block in new_chain[fork:]:
+            if not self.connect_block(block):
+                self._disconnect_to(fork)
+                for old_block in old_tail:
+                    self.connect_block(old_block)
+                return False
+        return True
+
+    def load_chain(self, blocks):
+        """Полная загрузка цепочки (из файла) с пересборкой UTXO и сводки"""
+        self.chain = list(blocks)
+        self.rebuild_state()
+
+    def _connect(self, block):
+        if block.index != len(self.chain):
+            raise ValueError(f"Номер блока {block.index} не совпадает с его высотой {len(self.chain)}")
+        undo = self._apply_block_utxo(block)  # ValueError — состояние не изменено
+        self.chain.append(block)
+        if block.index > self._key_images_synced:
+            self.seen_key_images.commit(block.index, block.hash)
+        self._undo[block.hash] = undo
+        if len(self._undo) > MAX_UNDO_DEPTH:
+            self._undo.pop(next(iter(self._undo)))
+        self._update_stats(block, +1)
+        self._notify("on_block_connected", block)
+
+    def add_listener(self, listener, replay: bool = True):
+        """Подписать listener на события цепочки; replay — сразу отдать уже подключённые блоки"""
+        self.listeners.append(listener)
+        if replay and hasattr(listener, "on_block_connected"):
+            for block in self.chain:
+                listener.on_block_connected(block)
+
+    def remove_listener(self, listener):
+        try:
+            self.listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _notify(self, event: str, *args):
+        # Ошибка в индексе/кэше не должна ломать консенсусное состояние
+        for listener in self.listeners:
+            handler = getattr(listener, event, None)
+            if handler is None:
+                continue
+            try:
+                handler(*args)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика {event} в {type(listener).__name__}: {e}")
+
+    def _update_stats(self, block, sign: int):
+        self.stats.total_supply += sign * sum(
+            tx.amount for tx in block.transactions if tx.tx_type == "coinbase" and not tx.sender_pubkey
+        )
+        self.stats.tx_count += sign * len(block.transactions)
+        self.stats.height = len(self.chain) - 1
+        self.stats.tip_hash = self.chain[-1].hash if self.chain else ""
+        self.stats.next_reward = block_reward(len(self.chain))
+        self.stats.halvings = len(self.chain) // HALVING_INTERVAL
+        self.rewards = self.stats.next_reward
+
+    def verify_stats(self) -> bool:
+        """Сверка инкрементальной сводки с полным пересчётом по цепочке"""
+        expected = {
+            "height": len(self.chain) - 1,
+            "tip_hash": self.chain[-1].hash if self.chain else "",
+            "total_supply": self.recount_total_supply(),
+            "tx_count": sum(len(block.transactions) for block in self.chain),
+            "next_reward": block_reward(len(self.chain)),
+            "halvings": len(self.chain) // HALVING_INTERVAL,
+        }
+        actual = self.stats.to_dict()
+        mismatches = {k: (actual[k], v) for k, v in expected.items() if actual[k] != v}
+        for key, (got, want) in mismatches.items():
+            logging.warning(f"❌ Сводка цепочки расходится с пересчётом: {key}={got}, ожидалось {want}")
+        return not mismatches
+
+    def get_summary(self) -> dict:
+        """Сводка для API за O(1): всё поддерживается инкрементально"""
+        return {
+            "height": self.stats.height,
+            "blocks_count": len(self.chain),
+            "tip_hash": self.stats.tip_hash,
+            "total_supply": self.stats.total_supply,
+            "tx_count": self.stats.tx_count,
+            "is_valid": self.stats.is_valid,
+            "next_reward": self.stats.next_reward,
+            "halvings": self.stats.halvings,
+            "difficulty": self.difficulty,
+            "pending_transactions": len(self.pending_transactions),
+        }
+
+    def get_balance(self, address: str) -> int:
         return calculate_balance(self, address)
 
     def ensure_state(self):
         """Если UTXO/KeyImages ещё не восстановлены"""
-        if not self.utxo_set._map and len(self.chain) > 0:
+        if not len(self.utxo_set) and len(self.chain) > 0:
             self.rebuild_state()
 
     def rebuild_state(self):
-        """Полная реконструкция UTXO и key images"""
+        """Полная реконструкция UTXO, key images и сводки по цепочке"""
+        chain = self.chain
+        self.chain = []
         self.utxo_set = UTXOSet()
-        self.seen_key_images = set()
-        for block in self.chain:
-            self._apply_block_utxo(block)
-
-    def _apply_block_utxo(self, block):
-        """Применить все транзакции блока к UTXO/KeyImages."""
-        for tx in block.transactions:
-            txid = generate_transaction_id(tx)
-    
-            # 1) Потратить входы (если есть)
-            for txin in getattr(tx, "inputs", []) or []:
-                if not self.utxo_set.exists(txin.prev_txid, txin.output_index):
-                    raise ValueError(f"Попытка потратить несуществующий UTXO: {txin.prev_txid}:{txin.output_index}")
-                self.utxo_set.spend(txin.prev_txid, txin.output_index)
-    
-            # 2) Создать выходы
-            if getattr(tx, "outputs", None):
-                for idx, out in enumerate(tx.outputs):
-                    out.txid = txid
-                    out.index = idx
+        # Постоянное хранилище, записанное для блока этой цепочки, не перезаполняется
+        self._key_images_synced = self.seen_key_images.resume(chain)
+        self.stats = ChainStats()
+        self._undo = {}
+        self._notify("on_chain_reset")
+        try:
+            for block in chain:
+                self._connect(block)
+        except ValueError:
+            self.chain = chain
+            self.stats.is_valid = False
+            raise
+        finally:
+            self._key_images_synced = -1
+        self.stats.is_valid = self.is_chain_valid()
+
+    @traced("_apply_block_utxo", args=lambda self, block: {"height": block.index, "txs": len(block.transactions)})
+    def _apply_block_utxo(self, block) -> BlockUndo:
+        """
+        Применить все транзакции блока к UTXO/KeyImages.
+        При ошибке уже сделанные изменения откатываются и бросается ValueError.
+        """
+        undo = BlockUndo(spent=[], created=[], key_images=[])
+        try:
+            for tx in block.transactions:
+                if is_output_ring(tx):
+                    # Блоки до _key_images_synced проверялись при первом подключении
+                    if block.index > self._key_images_synced:
+                        self._check_ring_spend(tx)
+                elif block.timestamp >= LEGACY_ANON_UNTIL and (tx.tx_type == "anonymous" or getattr(tx, "inputs", None)):
+                    raise ValueError("Явные входы и кольцо ключей не доказывают владение: траты — только кольцом по выходам")
+                strict_units(tx.amount)
+                for out in getattr(tx, "outputs", None) or ():
+                    strict_units(out.amount)
+                txid = generate_transaction_id(tx)
+
+                # 1) Потратить входы (прежние форматы; кольцо по выходам ничего не тратит явно)
+                for txin in spent_inputs(tx):
+                    spent = self.utxo_set.get(txin.prev_txid, txin.output_index)
+                    if spent is None:
+                        raise ValueError(f"Попытка потратить несуществующий UTXO: {txin.prev_txid}:{txin.output_index}")
+                    self.utxo_set.spend(txin.prev_txid, txin.output_index)
+                    undo.spent.append(spent)
+
+                # 2) Создать выходы (копиями: сама транзакция не меняется, иначе
+                #    разошлись бы её txid и хеш блока)
+                if getattr(tx, "outputs", None):
+                    for idx, out in enumerate(tx.outputs):
+                        undo.created.append((txid, idx, self.utxo_set.get(txid, idx)))
+                        self.utxo_set.add(TxOutput(txid, idx, out.address, out.amount))
+                else:
+                    # Для coinbase или старых транзакций без outputs
+                    out = TxOutput(txid, 0, tx.receiver_address, tx.amount)
+                    undo.created.append((txid, 0, self.utxo_set.get(txid, 0)))
                     self.utxo_set.add(out)
-            else:
-                # Для coinbase или старых транзакций без outputs
-                out = TxOutput(txid, 0, tx.receiver_address, float(tx.amount))
-                self.utxo_set.add(out)
-    
-            # 3) Key image для анонимных транзакций
-            if tx.tx_type == "anonymous" and tx.key_image:
-                if tx.key_image in self.seen_key_images:
-                    raise ValueError(f"Двойная трата key_image: {tx.key_image}")
-                self.seen_key_images.add(tx.key_image)
+
+                # 3) Key image для анонимных транзакций
+                if tx.tx_type == "anonymous" and tx.key_image:
+                    if block.index <= self._key_images_synced:
+                        # Уже в хранилище: блок проверялся при первом подключении
+                        undo.key_images.append(tx.key_image)
+                        continue
+                    if tx.key_image in self.seen_key_images:
+                        raise ValueError(f"Двойная трата key_image: {tx.key_image}")
+                    self.seen_key_images.add(tx.key_image)
+                    undo.key_images.append(tx.key_image)
+        except ValueError:
+            self._revert_utxo(undo)
+            raise
+        return undo
+
+    def _revert_utxo(self, undo: BlockUndo):
+        """Обратное применение BlockUndo (в обратном порядке)"""
+        for key_image in reversed(undo.key_images):
+            self.seen_key_images.discard(key_image)
+        for txid, idx, replaced in reversed(undo.created):
+            self.utxo_set.spend(txid, idx)
+            if replaced is not None:
+                self.utxo_set.add(replaced)
+        for out in reversed(undo.spent):
+            self.utxo_set.add(out)
 
     def validate_transaction_utxo(self, tx: Transaction) -> bool:
-        """Проверка трат через UTXO/KeyImages"""
+        """Проверка анонимной траты через UTXO/KeyImages (coinbase — всегда True)"""
         self.ensure_state()
-
-        if not getattr(tx, "inputs", None) or not getattr(tx, "outputs", None):
-            if tx.tx_type != "coinbase":
-                logging.warning("TX без inputs/outputs не допускается (кроме coinbase)")
-                return False
-
         if tx.tx_type == "coinbase":
             return True
-
-        amount_in, amount_out = 0.0, 0.0
-
-        # Проверка входов
-        for i in tx.inputs:
-            if not self.utxo_set.has(i.prev_txid, i.output_index):
-                logging.warning("Потраченный или отсутствующий вход UTXO")
-                return False
-            utxo = self.utxo_set.get(i.prev_txid, i.output_index)
-            amount_in += float(utxo.amount)
-
-        # Сумма выходов
-        for o in tx.outputs:
-            amount_out += float(o.amount)
-
-        if amount_in + 1e-9 < amount_out:
-            logging.warning("Сумма входов меньше суммы выходов")
+        try:
+            self._check_ring_spend(tx)
+        except ValueError as e:
+            logging.warning(f"Анонимная трата отклонена: {e}")
             return False
-
-        # Анонимные tx
-        if tx.tx_type == "anonymous":
-            if tx.key_image and tx.key_image in self.seen_key_images:
-                logging.warning("Повторная трата: key_image уже встречался")
-                return False
-            return True
-
-        # Стандартные tx
-        if not tx.verify_signature():
-            logging.warning("Невалидная подпись стандартной транзакции")
+        if tx.key_image in self.seen_key_images:
+            logging.warning("Повторная трата: key_image уже встречался")
             return False
+        return True
 
-        sender_addr = tx.get_sender_address()
-        for i in tx.inputs:
-            utxo = self.utxo_set.get(i.prev_txid, i.output_index)
-            if not utxo or utxo.address != sender_addr:
-                logging.warning("Вход UTXO не принадлежит отправителю")
-                return False
+    def _check_ring_spend(self, tx: Transaction):
+        """
+        Трата кольцом по выходам: каждый вход — непотраченный выход, ключ кольца на
+        его месте — ключ владельца, суммы выходов кольца равны (это сумма входа и
+        она не меньше выходов транзакции), подпись LSAG верна. Иначе ValueError.
+        Повтор key image проверяет вызывающий.
+        """
+        if not is_output_ring(tx):
+            raise ValueError("нет кольца по выходам")
+        ring = tx.ring_signature.get("ring")
+        if not isinstance(ring, list) or not tx.inputs or len(ring) != len(tx.inputs) or not tx.key_image:
+            raise ValueError("кольцо не совпадает с входами или нет key image")
+        if not tx.outputs or tx.outputs[0].address != tx.receiver_address or tx.outputs[0].amount != tx.amount:
+            raise ValueError("первый выход должен быть платежом получателю")
+
+        amount_in = None
+        for public_key, txin in zip(ring, tx.inputs):
+            out = self.utxo_set.get(txin.prev_txid, txin.output_index)
+            if out is None:
+                raise ValueError(f"выход кольца не найден или потрачен: {txin.prev_txid}:{txin.output_index}")
+            try:
+                owner = pubkey_to_address(bytes.fromhex(public_key))
+            except (TypeError, ValueError):
+                raise ValueError("некорректный ключ кольца") from None
+            if owner != out.address:
+                raise ValueError("ключ кольца не владеет своим выходом")
+            if amount_in is None:
+                amount_in = out.amount
+            elif out.amount != amount_in:
+                raise ValueError("суммы выходов кольца различаются")
+
+        amount_out = 0
+        for o in tx.outputs:
+            if not is_valid_units(o.amount):
+                raise ValueError("некорректная сумма выхода")
+            amount_out += o.amount
+        if amount_in < amount_out:
+            raise ValueError("сумма входа меньше суммы выходов")
 
-        return True
+        with span("verify_ring_signature"):
+            if not tx.verify_signature():
+                raise ValueError("неверная кольцевая подпись")
 
     def to_dict(self):
         return {
             'chain': [block.to_dict() for block in self.chain],
             'pending_transactions': [tx.to_dict() for tx in self.pending_transactions],
             'difficulty': self.difficulty,
-            'rewards': self.rewards
+            'rewards': self.rewards,
+            'state': self.stats.to_dict(),
         }
 
     @classmethod
@@ -879,8 +2217,11 @@ class Blockchain:
         blockchain = cls(difficulty=data['difficulty'])
         blockchain.chain = [Block.from_dict(block) for block in data['chain']]
         blockchain.pending_transactions = [Transaction.from_dict(tx) for tx in data['pending_transactions']]
-        blockchain.rewards = data['rewards']
         blockchain.rebuild_state()
+        # Снимок хранит накопители; после пересборки они должны совпасть
+        saved = data.get('state')
+        if saved and saved != blockchain.stats.to_dict():
+            logging.warning("⚠️ Сводка в снимке не совпадает с пересобранной — используется пересобранная")
         return blockchain
 
 # ================================
@@ -916,37 +2257,61 @@ def load_blockchain(filename=BLOCKCHAIN_DATA_FILE) -> Blockchain | None:
         logging.error(f"❌ Ошибка загрузки блокчейна: {e}")
         return None
 
+def _wallet_record(address, wallet_info) -> dict:
+    if isinstance(wallet_info, dict):
+        return wallet_info
+    return {'public_key': wallet_info.public_key_hex, 'address': address}
+
+def _is_legacy_wallets_file(filename) -> bool:
+    """Прежний формат — один JSON-объект с отступами; новый — JSON Lines"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        return f.readline().strip() in ('{', '{}')
+
 def save_wallets(filename=WALLETS_DATA_FILE):
-    """Сохранение кошельков в JSON файл"""
+    """
+    Сохранение кошельков: файл — JSON Lines, по строке на кошелёк. Дописываются
+    только новые регистрации; целиком файл переписывается лишь при переходе
+    с прежнего формата или если он пропал.
+    """
+    global _unsaved_wallets
     try:
-        wallet_data = {}
-        for address, wallet_info in wallets.items():
-            if isinstance(wallet_info, dict):
-                wallet_data[address] = wallet_info
-            else:
-                wallet_data[address] = {
-                    'public_key': wallet_info.public_key_hex,
-                    'address': address
-                }
-
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(wallet_data, f, indent=2, ensure_ascii=False)
-        logging.info(f"✅ Кошельки сохранены в {filename}")
+        if os.path.exists(filename) and not _is_legacy_wallets_file(filename):
+            mode, addresses = 'a', [a for a in _unsaved_wallets if a in wallets]
+        else:
+            mode, addresses = 'w', list(wallets)
+
+        if addresses or mode == 'w':
+            with open(filename, mode, encoding='utf-8') as f:
+                f.writelines(json.dumps(_wallet_record(a, wallets[a]), ensure_ascii=False) + '\n'
+                             for a in addresses)
+        _unsaved_wallets = []
+        logging.info(f"✅ Кошельки сохранены в {filename} (записано {len(addresses)})")
         return True
     except Exception as e:
         logging.error(f"❌ Ошибка сохранения кошельков: {e}")
         return False
 
 def load_wallets(filename=WALLETS_DATA_FILE):
-    """Загрузка кошельков из JSON файла"""
-    global wallets
+    """Загрузка кошельков из JSON Lines (или из JSON прежнего формата)"""
+    global wallets, _unsaved_wallets
     try:
         if not os.path.exists(filename):
             logging.info(f"📁 Файл кошельков {filename} не найден")
             return
 
-        with open(filename, 'r', encoding='utf-8') as f:
-            wallets = json.load(f)
+        if _is_legacy_wallets_file(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                wallets = json.load(f)
+        else:
+            wallets = {}
+            with open(filename, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        wallets[record['address']] = record
+                    except (ValueError, KeyError, TypeError):
+                        continue  # оборванная последняя строка после сбоя
+        _unsaved_wallets = []
 
         logging.info(f"✅ Кошельки загружены из {filename}")
     except Exception as e:
@@ -955,6 +2320,8 @@ def load_wallets(filename=WALLETS_DATA_FILE):
 def register_wallet(wallet: Wallet):
     """Регистрация кошелька в глобальном хранилище"""
     address = wallet.get_address()
+    if address not in wallets:
+        _unsaved_wallets.append(address)
     wallets[address] = {
         'public_key': wallet.public_key_hex,
         'address': address
@@ -1000,7 +2367,12 @@ def demo_blockchain():
         print(f"⛏️  Майнинг блока {i+1}...")
         blockchain.mine_pending_transactions(miner_address, f"Демо блок {i+1}")
         balance = calculate_balance(blockchain, miner_address)
-        print(f"   Баланс майнера: {balance:.2f} {BLOCKCHAIN_NAME}")
+        print(f"   Баланс майнера: {format_amount(balance)} {BLOCKCHAIN_NAME}")
+
+    # Награды других кошельков — выходы с той же суммой, среди которых прячется анонимная трата
+    for i, wallet in enumerate(wallets_demo[1:], start=2):
+        blockchain.mine_pending_transactions(wallet.get_address(), f"Демо блок кошелька {i}")
+    print(f"⛏️  Ещё {len(wallets_demo) - 1} блока добыты другими кошельками (выходы для колец)")
 
     # Обычные транзакции
     print("\n💰 ОБЫЧНЫЕ ТРАНЗАКЦИИ")
@@ -1013,7 +2385,7 @@ def demo_blockchain():
     tx1 = Transaction(
         sender_pubkey_hex=sender.public_key_hex,
         receiver_address=receiver.get_address(),
-        amount=30.0,
+        amount=30 * COIN,
         metadata="Обычная транзакция"
     )
     tx1.sign_transaction(sender)
@@ -1022,7 +2394,7 @@ def demo_blockchain():
         print("✅ Обычная транзакция создана")
         print(f"   От: {sender.get_address()[:16]}...")
         print(f"   К: {receiver.get_address()[:16]}...")
-        print(f"   Сумма: {tx1.amount}")
+        print(f"   Сумма: {format_amount(tx1.amount)}")
 
     # АНОНИМНЫЕ ТРАНЗАКЦИИ
     print("\n🔒 АНОНИМНЫЕ ТРАНЗАКЦИИ")
@@ -1031,7 +2403,7 @@ def demo_blockchain():
     # Создание анонимной транзакции
     anon_tx = sender.create_anonymous_transaction(
         receiver_address=wallets_demo[2].get_address(),
-        amount=20.0,
+        amount=20 * COIN,
         metadata="Секретная транзакция"
     )
 
@@ -1039,8 +2411,10 @@ def demo_blockchain():
         print("✅ Анонимная транзакция создана")
         print(f"   От: {anon_tx.get_sender_address()}")  # Покажет "ANONYMOUS"
         print(f"   К: {anon_tx.receiver_address[:16]}...")
-        print(f"   Сумма: {anon_tx.amount}")
+        print(f"   Сумма: {format_amount(anon_tx.amount)}")
         print(f"   Тип: {anon_tx.tx_type}")
+    else:
+        print("❌ Анонимная транзакция не создана (нет непотраченной монеты на всю сумму)")
 
     # Майнинг блока с транзакциями
     print("\n⛏️  МАЙНИНГ БЛОКА С ТРАНЗАКЦИЯМИ")
@@ -1056,14 +2430,14 @@ def demo_blockchain():
     for i, wallet in enumerate(wallets_demo):
         address = wallet.get_address()
         balance = calculate_balance(blockchain, address)
-        print(f"Кошелек {i+1}: {balance:.2f} {BLOCKCHAIN_NAME}")
+        print(f"Кошелек {i+1}: {format_amount(balance)} {BLOCKCHAIN_NAME}")
 
     # Проверка блокчейна
     print("\n🔍 ПРОВЕРКА БЛОКЧЕЙНА")
     print("-" * 40)
 
     print(f"🔗 Всего блоков: {len(blockchain.chain)}")
-    print(f"🪙 Общее предложение: {blockchain.get_total_supply():.2f}")
+    print(f"🪙 Общее предложение: {format_amount(blockchain.get_total_supply())}")
     print(f"✅ Блокчейн валиден: {blockchain.is_chain_valid()}")
 
     # Сохранение данных
@@ -1102,13 +2476,13 @@ def console_interface():
         print(f"🪙  {BLOCKCHAIN_NAME} - Консольный интерфейс")
         print("=" * 60)
         print(f"📊 Всего блоков: {len(blockchain.chain)}")
-        print(f"🪙 Общее предложение: {blockchain.get_total_supply():.2f}")
+        print(f"🪙 Общее предложение: {format_amount(blockchain.get_total_supply())}")
         print(f"📝 Ожидающих транзакций: {len(blockchain.pending_transactions)}")
         print(f"👛 Зарегистрированных кошельков: {len(wallets)}")
 
         if current_wallet:
             balance = calculate_balance(blockchain, current_wallet.get_address())
-            print(f"💰 Ваш баланс: {balance:.2f} {BLOCKCHAIN_NAME}")
+            print(f"💰 Ваш баланс: {format_amount(balance)} {BLOCKCHAIN_NAME}")
 
         print("\n🔹 Меню:")
         print("1. 👛 Создать кошелек")
@@ -1143,11 +2517,11 @@ def console_interface():
 
             try:
                 receiver = input("👉 Адрес получателя: ").strip()
-                amount = float(input("👉 Сумма: ").strip())
+                amount = parse_amount(input("👉 Сумма: "))
 
                 balance = calculate_balance(blockchain, current_wallet.get_address())
                 if balance < amount:
-                    print(f"❌ Недостаточно средств. Доступно: {balance:.2f}")
+                    print(f"❌ Недостаточно средств. Доступно: {format_amount(balance)}")
                     continue
 
                 tx = Transaction(
@@ -1179,11 +2553,11 @@ def console_interface():
 
             try:
                 receiver = input("👉 Адрес получателя: ").strip()
-                amount = float(input("👉 Сумма: ").strip())
+                amount = parse_amount(input("👉 Сумма: "))
 
                 balance = calculate_balance(blockchain, current_wallet.get_address())
                 if balance < amount:
-                    print(f"❌ Недостаточно средств. Доступно: {balance:.2f}")
+                    print(f"❌ Недостаточно средств. Доступно: {format_amount(balance)}")
                     continue
 
                 anon_tx = current_wallet.create_anonymous_transaction(receiver, amount)
@@ -1218,9 +2592,9 @@ def console_interface():
             # Показать блокчейн
             print(f"\n🔍 Обзор блокчейна:")
             print(f"🔗 Всего блоков: {len(blockchain.chain)}")
-            print(f"🪙 Общее предложение: {blockchain.get_total_supply():.2f}")
+            print(f"🪙 Общее предложение: {format_amount(blockchain.get_total_supply())}")
             print(f"⚙️  Сложность: {blockchain.difficulty}")
-            print(f"🎁 Текущая награда: {blockchain.rewards}")
+            print(f"🎁 Текущая награда: {format_amount(blockchain.rewards)}")
 
             print("\n📋 Последние блоки:")
             recent = blockchain.chain[-3:]
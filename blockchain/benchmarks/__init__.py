@@ -0,0 +1,7 @@
+"""
+Бенчмарки anonCoin. Запуск из каталога blockchain/:
+
+    python -m benchmarks.suite --json results.json     # горячие пути ядра
+    python -m benchmarks.suite --compare results.json  # сравнение с прошлым запуском
+    python -m benchmarks.bench_wire
+"""
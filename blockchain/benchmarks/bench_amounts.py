@@ -0,0 +1,72 @@
+"""
+Суммирование сумм: прежние float в монетах против целых единиц (COIN = 10**8).
+
+Меряется подсчёт эмиссии по --count выходам тремя способами: sum по float,
+sum по int и по упакованному array('q') (int64, как суммы в записях UTXOSet). Для
+каждого — отклонение от точной суммы в единицах: у float оно зависит от
+порядка сложения, поэтому узлы, суммирующие по-разному, расходятся.
+Сложение float быстрее (машинное слово против длинного int), но цена
+неточности — расхождение состояния, а не микросекунды.
+
+    python -m benchmarks.bench_amounts [--count 1000000] [--repeat 5] [--json out.json]
+"""
+
+import argparse
+import json
+import random
+from array import array
+from decimal import Decimal
+
+from anoncoin_core import COIN
+from benchmarks.harness import environment, measure
+
+
+def _amounts(count: int, seed: int) -> list[int]:
+    # Суммы от 0.00000001 до ~100 монет, как у переводов и сдачи
+    rnd = random.Random(seed)
+    return [rnd.randrange(1, 100 * COIN) for _ in range(count)]
+
+
+def run(count: int, repeat: int, seed: int = 1) -> dict:
+    units = _amounts(count, seed)
+    coins = [u / COIN for u in units]
+    packed = array("q", units)
+    exact = sum(units)
+    report = {"count": count, "environment": environment(), "exact_units": exact}
+
+    def error_units(total_coins: float) -> int:
+        return abs(int((Decimal(repr(total_coins)) * COIN).to_integral_value()) - exact)
+
+    shuffled = coins[:]
+    random.Random(seed + 1).shuffle(shuffled)
+    report["float"] = measure(lambda: sum(coins), repeat, number=1, memory=False)
+    report["float"].update(error_units=error_units(sum(coins)),
+                           order_dependent=sum(coins) != sum(shuffled))
+    report["int"] = measure(lambda: sum(units), repeat, number=1, memory=False)
+    report["int"]["error_units"] = sum(units) - exact
+    report["array"] = measure(lambda: sum(packed), repeat, number=1, memory=False)
+    report["array"]["error_units"] = sum(packed) - exact
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args()
+
+    r = run(args.count, args.repeat)
+    print(f"Сумм: {r['count']}")
+    print(f"{'':>6} {'медиана, мс':>12} {'ошибка, единиц':>15}")
+    for name in ("float", "int", "array"):
+        row = r[name]
+        print(f"{name:>6} {row['median_s'] * 1000:>12.2f} {row['error_units']:>15}")
+    print(f"Сумма float зависит от порядка сложения: {'да' if r['float']['order_dependent'] else 'нет'}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(r, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Память при экспорте цепочки: потоковый stream_chain() против прежнего
+построения списка [block.to_dict() ...] и одного json.dumps.
+
+RSS процесса снимается из /proc/self/status после каждого чанка; для потока
+прирост должен оставаться постоянным (порядка одного чанка), независимо от длины.
+
+    python -m benchmarks.bench_chain_export [--blocks 100000] [--format ndjson|bin1] [--json out.json]
+"""
+
+import argparse
+import asyncio
+import gc
+import io
+import json
+import time
+
+from benchmarks.synthetic import build_chain
+from export import read_export, stream_chain
+
+
+def rss_kb() -> int:
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def _drain(chain, fmt: str, keep: io.BytesIO | None) -> dict:
+    base = peak = rss_kb()
+    samples, total, started = [], 0, time.perf_counter()
+    async for chunk in stream_chain(chain, 0, fmt):
+        total += len(chunk)
+        if keep is not None:
+            keep.write(chunk)
+        current = rss_kb()
+        peak = max(peak, current)
+        samples.append(current)
+    return {
+        "seconds": time.perf_counter() - started,
+        "bytes": total,
+        "rss_growth_kb": peak - base,
+        # рост между первой и последней четвертью экспорта: ~0 при постоянной памяти
+        "rss_drift_kb": samples[-1] - samples[len(samples) // 4] if samples else 0,
+    }
+
+
+def _list_export(chain) -> dict:
+    base, started = rss_kb(), time.perf_counter()
+    data = json.dumps([block.to_dict() for block in chain.chain], ensure_ascii=False)
+    peak = rss_kb()
+    result = {"seconds": time.perf_counter() - started, "bytes": len(data.encode("utf-8")),
+              "rss_growth_kb": peak - base}
+    del data
+    return result
+
+
+def run(blocks: int, fmt: str, txs_per_block: int = 1, verify: int = 1000) -> dict:
+    chain = build_chain(blocks, txs_per_block)
+    gc.collect()
+    report = {"blocks": blocks, "format": fmt, "txs_per_block": txs_per_block,
+              "stream": asyncio.run(_drain(chain, fmt, None))}
+    gc.collect()
+    report["list"] = _list_export(chain)
+
+    # Импорт из экспорта даёт те же блоки (проверяем префикс, чтобы не держать весь поток в памяти)
+    small = build_chain(min(blocks, verify), txs_per_block)
+    buf = io.BytesIO()
+    asyncio.run(_drain(small, fmt, buf))
+    buf.seek(0)
+    imported = [b.hash for b in read_export(buf, fmt)]
+    report["roundtrip_ok"] = imported == [b.hash for b in small.chain]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=100_000)
+    parser.add_argument("--format", default="ndjson", choices=["ndjson", "bin1"])
+    parser.add_argument("--txs", type=int, default=1, help="обычных транзакций в блоке")
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args()
+
+    report = run(args.blocks, args.format, args.txs)
+    s, l = report["stream"], report["list"]
+    print(f"блоков: {report['blocks']}, формат: {report['format']}, импорт совпал: {report['roundtrip_ok']}")
+    print(f"{'':>8}{'сек':>10}{'МБ':>10}{'прирост RSS, МБ':>18}")
+    print(f"{'поток':>8}{s['seconds']:>10.2f}{s['bytes'] / 2**20:>10.1f}{s['rss_growth_kb'] / 1024:>18.1f}")
+    print(f"{'список':>8}{l['seconds']:>10.2f}{l['bytes'] / 2**20:>10.1f}{l['rss_growth_kb'] / 1024:>18.1f}")
+    print(f"дрейф RSS потока (1/4 -> конец): {s['rss_drift_kb']} КБ")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Задержка /api/blockchain/info в зависимости от длины цепочки:
+прежний путь (get_total_supply + is_chain_valid на каждый запрос)
+против инкрементальной сводки Blockchain.get_summary().
+
+    python -m benchmarks.bench_chain_info [--lengths 100,1000,5000] [--json out.json]
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.synthetic import build_chain
+
+
+def _per_call(fn, min_time: float = 0.2) -> float:
+    calls, started = 0, time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def run(lengths: list[int], txs_per_block: int = 2) -> dict:
+    rows = []
+    for n in lengths:
+        chain = build_chain(n, txs_per_block)
+
+        def full_scan():
+            return {"total_supply": chain.get_total_supply(), "is_valid": chain.is_chain_valid()}
+
+        rows.append({
+            "blocks": n,
+            "full_scan_ms": _per_call(full_scan) * 1000,
+            "summary_us": _per_call(chain.get_summary) * 1e6,
+        })
+    return {"txs_per_block": txs_per_block, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="100,1000,5000")
+    parser.add_argument("--txs", type=int, default=2, help="обычных транзакций в блоке")
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args()
+
+    report = run([int(x) for x in args.lengths.split(",")], args.txs)
+    print(f"{'блоков':>8}{'полный пересчёт, мс':>22}{'get_summary, мкс':>20}")
+    for r in report["results"]:
+        print(f"{r['blocks']:>8}{r['full_scan_ms']:>22.2f}{r['summary_us']:>20.2f}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Выбор приманок кольца: индекс выходов цепочки (OutputIndex) против прежнего
+random.sample(list(wallets.keys())), который на каждую анонимную транзакцию
+копировал весь реестр кошельков.
+
+Цепочка синтетическая: --outputs выходов одной суммы по --per-block в блоке,
+владельцы — --owners адресов с известными ключами (строки-заглушки: индекс
+ключи не проверяет). Блоки не хранятся, а собираются заново по высоте — так
+sample_outputs находит выход, не держа в памяти всю цепочку. Возраст
+приманок — распределение индекса по умолчанию.
+
+    python -m benchmarks.bench_decoys [--outputs 2000000] [--owners 200000] [--ring 5,11,16] [--json out.json]
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import logging
+import random
+import time
+from types import SimpleNamespace
+
+from anoncoin_core import COIN, OutputIndex
+from benchmarks.bench_chain_export import rss_kb
+from benchmarks.harness import environment, measure
+
+
+AMOUNT = 50 * COIN
+
+
+class _SyntheticChain:
+    """Цепочка, блок которой детерминированно собирается по высоте"""
+
+    def __init__(self, blocks: int, owners: list[str], per_block: int, seed: int):
+        self.blocks, self.owners, self.per_block, self.seed = blocks, owners, per_block, seed
+
+    def __len__(self) -> int:
+        return self.blocks
+
+    def __getitem__(self, height: int):
+        rnd = random.Random(self.seed * 1_000_003 + height)
+        txs = [SimpleNamespace(sender_pubkey=None, ring_signature=None, outputs=None, tx_type="standard",
+                               version=2, timestamp=height, amount=AMOUNT, wire_amount=lambda: AMOUNT,
+                               receiver_address=self.owners[rnd.randrange(len(self.owners))])
+               for _ in range(self.per_block)]
+        return SimpleNamespace(index=height, transactions=txs)
+
+
+def _build(chain: _SyntheticChain) -> OutputIndex:
+    index = OutputIndex()
+    for height in range(len(chain)):
+        index.on_block_connected(chain[height])
+    return index
+
+
+def run(outputs: int, owner_count: int, per_block: int, rings: list[int], repeat: int = 5, seed: int = 1) -> dict:
+    logging.disable(logging.INFO)
+    owners = [hashlib.sha256(i.to_bytes(8, "big")).hexdigest() for i in range(owner_count)]
+    registry = {a: {"public_key": "pk" + a, "address": a} for a in owners}
+
+    gc.collect()
+    base, started = rss_kb(), time.perf_counter()
+    chain = _SyntheticChain(outputs // per_block, owners, per_block, seed)
+    index = _build(chain)
+    build_seconds = time.perf_counter() - started
+    for owner, address in enumerate(index._addresses):
+        index._pubkeys[owner] = registry[address]["public_key"]
+    report = {
+        "outputs": len(index),
+        "owners": owner_count,
+        "build_seconds": build_seconds,
+        "rss_growth_kb": rss_kb() - base,
+        "index": index.stats(),
+        "results": [],
+    }
+
+    rnd = random.Random(seed)
+    sender = owners[0]
+    for ring in rings:
+        def legacy():
+            # Прежний get_ring_public_keys
+            members = rnd.sample(list(registry.keys()), ring - 1)
+            return [registry[a]["public_key"] for a in members]
+
+        report["results"].append({
+            "ring_size": ring,
+            "decoys": len(index.sample_outputs(chain, ring - 1, AMOUNT, exclude=(sender,), rng=rnd)),
+            "indexed": measure(lambda: index.sample_outputs(chain, ring - 1, AMOUNT, exclude=(sender,), rng=rnd),
+                               repeat),
+            "legacy": measure(legacy, repeat, number=3),
+        })
+    report["environment"] = environment()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--outputs", type=int, default=2_000_000)
+    parser.add_argument("--owners", type=int, default=200_000)
+    parser.add_argument("--per-block", type=int, default=20)
+    parser.add_argument("--ring", default="5,11,16")
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args()
+
+    r = run(args.outputs, args.owners, args.per_block, [int(s) for s in args.ring.split(",")])
+    print(f"Выходов: {r['outputs']}, владельцев {r['owners']}, индекс построен за {r['build_seconds']:.1f} с, "
+          f"массивы {r['index']['array_bytes'] / 2**20:.1f} МБ, RSS +{r['rss_growth_kb'] / 1024:.1f} МБ")
+    print(f"{'кольцо':>6} {'приманок':>9} {'индекс, мкс':>12} {'прежний, мс':>12} {'память прежн., КБ':>18}")
+    for row in r["results"]:
+        print(f"{row['ring_size']:>6} {row['decoys']:>9} {row['indexed']['median_s'] * 1e6:>12.1f} "
+              f"{row['legacy']['median_s'] * 1000:>12.1f} {row['legacy']['peak_kb']:>18.0f}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(r, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Множество потраченных key images: прежний set hex-строк против KeyImageStore
+(дайджесты по 32 байта в отсортированном массиве + фильтр Блума), в памяти и
+с файлом. Меряются память, вставка (с компакциями), проверка присутствующего
+и отсутствующего key image (последнее — обычный случай для новой транзакции)
+и открытие файла при рестарте.
+
+Память — размер самих структур («структура»: таблица set + строки, массив +
+фильтр) и прирост RSS. Строки set отчасти общие с объектами транзакций, а RSS
+хранилища в памяти завышен временными буферами компакций.
+
+    python -m benchmarks.bench_key_images [--count 1000000] [--json out.json]
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_chain_export import rss_kb
+from key_image_store import KeyImageStore, digest
+
+LOOKUPS = 20_000
+
+
+def _key_images(count: int, seed: int) -> list[str]:
+    # Сжатая точка P-384 в hex, как у compute_key_image
+    rnd = random.Random(seed)
+    return [rnd.choice(("02", "03")) + rnd.randbytes(48).hex() for _ in range(count)]
+
+
+def _lookup_us(container, probes) -> float:
+    started = time.perf_counter()
+    for k in probes:
+        k in container  # noqa: B015
+    return (time.perf_counter() - started) / len(probes) * 1e6
+
+
+def _fill(container, images) -> dict:
+    gc.collect()
+    base, started = rss_kb(), time.perf_counter()
+    for i, k in enumerate(images):
+        container.add(k)
+        if hasattr(container, "commit") and i % 100 == 99:
+            container.commit(i // 100, str(i))
+    return {"insert_us": (time.perf_counter() - started) / len(images) * 1e6, "rss_growth_kb": rss_kb() - base}
+
+
+def run(count: int, seed: int = 1) -> dict:
+    logging.disable(logging.INFO)
+    images = _key_images(count, seed)
+    rnd = random.Random(seed + 1)
+    present = [rnd.choice(images) for _ in range(LOOKUPS)]
+    absent = _key_images(LOOKUPS, seed + 2)
+    report = {"count": count}
+
+    legacy: set[str] = set()
+    report["set"] = _fill(legacy, images)
+    report["set"].update(hit_us=_lookup_us(legacy, present), miss_us=_lookup_us(legacy, absent),
+                         structure_bytes=sys.getsizeof(legacy) + sum(sys.getsizeof(k) for k in legacy))
+    del legacy
+
+    memory = KeyImageStore()
+    report["memory"] = _fill(memory, images)
+    memory.compact()
+    report["memory"].update(hit_us=_lookup_us(memory, present), miss_us=_lookup_us(memory, absent),
+                            false_positive=sum(memory._bloom_may_contain(digest(k)) for k in absent) / LOOKUPS,
+                            structure_bytes=memory.stats()["data_bytes"] + memory.stats()["bloom_bytes"])
+    del memory
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "key_images.dat")
+        store = KeyImageStore(path).open()
+        report["file"] = _fill(store, images)
+        store.close()
+        gc.collect()
+        base, started = rss_kb(), time.perf_counter()
+        store = KeyImageStore(path).open()
+        report["file"].update(
+            open_ms=(time.perf_counter() - started) * 1000,
+            open_rss_growth_kb=rss_kb() - base,
+            file_mb=os.path.getsize(path) / 2**20,
+            hit_us=_lookup_us(store, present),
+            miss_us=_lookup_us(store, absent),
+            ok=all(k in store for k in present) and not any(k in store for k in absent),
+            structure_bytes=store.stats()["bloom_bytes"],   # массив — в mmap, в кучу не читается
+        )
+        store.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args()
+
+    r = run(args.count)
+    print(f"Key images: {r['count']}")
+    print(f"{'':>8} {'вставка, мкс':>13} {'структура, МБ':>14} {'RSS, МБ':>9} {'есть, мкс':>10} {'нет, мкс':>9}")
+    for name in ("set", "memory", "file"):
+        row = r[name]
+        print(f"{name:>8} {row['insert_us']:>13.2f} {row['structure_bytes'] / 2**20:>14.1f} "
+              f"{row['rss_growth_kb'] / 1024:>9.1f} {row['hit_us']:>10.2f} {row['miss_us']:>9.2f}")
+    f = r["file"]
+    print(f"Файл {f['file_mb']:.1f} МБ, открытие {f['open_ms']:.1f} мс (RSS +{f['open_rss_growth_kb'] / 1024:.1f} МБ), "
+          f"ложных срабатываний фильтра {r['memory']['false_positive']:.2%}, {'ok' if f['ok'] else 'ОШИБКА'}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as fh:
+            json.dump(r, fh, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Стоимость кольцевой подписи LSAG в зависимости от размера кольца.
+
+Проверка меряется дважды: с «холодными» ключами кольца (новые приманки, без
+таблиц) и с «тёплыми» — после RING_PRECOMPUTE_AFTER появлений ключи получают
+предвычисленные таблицы. Для сравнения — прежняя схема: генерация ключа и
+ECDSA-подпись на каждого участника, ECDSA-проверка на каждого.
+
+    python -m benchmarks.bench_ring [--sizes 5,8,16,32,64] [--repeat 3] [--json out.json]
+"""
+
+import argparse
+import json
+import logging
+
+import anoncoin_core
+from anoncoin_core import (NIST384p, RING_PRECOMPUTE_AFTER, SigningKey, TxInput, compute_key_image,
+                           create_ring_signature, verify_ring_signature)
+from benchmarks.harness import environment, measure
+from benchmarks.synthetic import build_wallets
+
+MESSAGE = b"anonCoin ring benchmark"
+
+
+def _legacy(ring_size: int, signer: SigningKey, repeat: int) -> dict:
+    # Прежний create_ring_signature: настоящая подпись + SigningKey.generate и подпись на каждую приманку
+    keys = [signer] + [SigningKey.generate(curve=NIST384p) for _ in range(ring_size - 1)]
+    signatures = [k.sign(MESSAGE) for k in keys]
+
+    def sign():
+        for _ in range(ring_size - 1):
+            SigningKey.generate(curve=NIST384p).sign(MESSAGE)
+        signer.sign(MESSAGE)
+
+    def verify():
+        for k, sig in zip(keys, signatures):
+            k.verifying_key.verify(sig, MESSAGE)
+
+    return {"sign": measure(sign, repeat, number=1, memory=False),
+            "verify": measure(verify, repeat, number=1, memory=False)}
+
+
+def run(sizes: list[int], repeat: int, seed: int = 1) -> dict:
+    logging.disable(logging.INFO)
+    results = []
+    for size in sizes:
+        members = build_wallets(size, seed + size)
+        signer = members[size // 2]
+        ring = [w.public_key_hex for w in members]
+        # Кольцо по выходам: у каждого участника свой выход
+        inputs = [TxInput(f"{i:064x}", 0) for i in range(len(ring))]
+        key_image = compute_key_image(signer.private_key.to_string(), inputs[size // 2])
+        anoncoin_core._ring_points.clear()
+
+        signature = create_ring_signature(MESSAGE, signer.private_key, ring, inputs, key_image)
+        anoncoin_core._ring_points.clear()
+        cold = measure(lambda: verify_ring_signature(MESSAGE, signature, key_image, inputs), repeat,
+                       number=1, setup=anoncoin_core._ring_points.clear, memory=False)
+        for _ in range(RING_PRECOMPUTE_AFTER):
+            verify_ring_signature(MESSAGE, signature, key_image, inputs)
+        warm = measure(lambda: verify_ring_signature(MESSAGE, signature, key_image, inputs), repeat,
+                       number=1, memory=False)
+        sign = measure(lambda: create_ring_signature(MESSAGE, signer.private_key, ring, inputs, key_image),
+                       repeat, number=1, memory=False)
+        results.append({
+            "ring_size": size,
+            "valid": verify_ring_signature(MESSAGE, signature, key_image, inputs),
+            "sign": sign,
+            "verify_cold": cold,
+            "verify_warm": warm,
+            "legacy": _legacy(size, signer.private_key, repeat),
+        })
+    return {"environment": environment(), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="5,8,16,32,64")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args()
+
+    report = run([int(s) for s in args.sizes.split(",")], args.repeat)
+    print(f"{'кольцо':>6} {'подпись':>10} {'пров. хол.':>11} {'пров. тепл.':>12} {'мс/участн.':>11} "
+          f"{'прежн. подп.':>13} {'прежн. пров.':>13}")
+    for r in report["results"]:
+        ms = lambda m: m["median_s"] * 1000  # noqa: E731
+        print(f"{r['ring_size']:>6} {ms(r['sign']):>9.1f}  {ms(r['verify_cold']):>10.1f} "
+              f"{ms(r['verify_warm']):>11.1f}  {ms(r['verify_warm']) / r['ring_size']:>10.2f} "
+              f"{ms(r['legacy']['sign']):>12.1f}  {ms(r['legacy']['verify']):>12.1f}"
+              f"{'' if r['valid'] else '  НЕВАЛИДНА'}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
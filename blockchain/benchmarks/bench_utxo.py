@@ -0,0 +1,136 @@
+"""
+Память и скорость UTXO-набора: прежнее представление (словарь по кортежам
+(txid, индекс) -> dataclass с hex-строками и float) против упакованного
+UTXOSet (ключ 36 байт, значение — int64 + 32 байта адреса).
+
+Меряется прирост RSS при заполнении --count выходами и пересчитывается на
+--target выходов (память линейна по числу выходов). Адреса повторяются: на
+--per-address выходов один адрес, как у реальных получателей.
+
+    python -m benchmarks.bench_utxo [--count 1000000] [--target 5000000] [--json out.json]
+"""
+
+import argparse
+import gc
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass
+
+from anoncoin_core import COIN, TxOutput, UTXOSet
+from benchmarks.bench_chain_export import rss_kb
+from benchmarks.harness import environment
+
+LOOKUPS = 100_000
+
+
+@dataclass
+class _LegacyOutput:
+    txid: str
+    index: int
+    address: str
+    amount: float
+
+
+class _LegacyUTXOSet:
+    """UTXOSet до упаковки"""
+
+    def __init__(self):
+        self._map: dict[tuple[str, int], _LegacyOutput] = {}
+
+    def add(self, out):
+        self._map[(out.txid, out.index)] = out
+
+    def spend(self, prev_txid: str, idx: int):
+        self._map.pop((prev_txid, idx), None)
+
+    def has(self, prev_txid: str, idx: int) -> bool:
+        return (prev_txid, idx) in self._map
+
+    def get(self, prev_txid: str, idx: int):
+        return self._map.get((prev_txid, idx))
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+
+def _outputs(count: int, per_address: int, seed: int, cls):
+    rnd = random.Random(seed)
+    addresses = [rnd.randbytes(32).hex() for _ in range(max(count // per_address, 1))]
+    for i in range(count):
+        # два выхода на транзакцию: получатель и сдача
+        if i % 2 == 0:
+            txid = rnd.randbytes(32).hex()
+        cents = rnd.randrange(1, 10**6)
+        # прежний набор хранил float в монетах, нынешний — целые единицы
+        amount = cents / 100 if cls is _LegacyOutput else cents * (COIN // 100)
+        yield cls(txid, i % 2, addresses[rnd.randrange(len(addresses))], amount)
+
+
+def _measure(factory, cls, count: int, per_address: int, seed: int) -> tuple[object, dict]:
+    gc.collect()
+    base, started = rss_kb(), time.perf_counter()
+    utxo = factory()
+    for out in _outputs(count, per_address, seed, cls):
+        utxo.add(out)
+    fill = time.perf_counter() - started
+    gc.collect()
+    grown = rss_kb() - base
+    return utxo, {"fill_s": fill, "rss_growth_kb": grown, "bytes_per_output": grown * 1024 / count}
+
+
+def _ops(utxo, probes) -> dict:
+    started = time.perf_counter()
+    found = sum(utxo.get(txid, idx) is not None for txid, idx in probes)
+    get_us = (time.perf_counter() - started) / len(probes) * 1e6
+    started = time.perf_counter()
+    for txid, idx in probes:
+        utxo.has(txid, idx)
+    has_us = (time.perf_counter() - started) / len(probes) * 1e6
+    started = time.perf_counter()
+    for txid, idx in probes:
+        utxo.spend(txid, idx)
+    spend_us = (time.perf_counter() - started) / len(probes) * 1e6
+    return {"get_us": get_us, "has_us": has_us, "spend_us": spend_us, "found": found}
+
+
+def run(count: int, target: int, per_address: int = 4, seed: int = 1) -> dict:
+    logging.disable(logging.INFO)
+    rnd = random.Random(seed + 1)
+    report = {"count": count, "target": target, "environment": environment()}
+    for name, factory, cls in (("legacy", _LegacyUTXOSet, _LegacyOutput), ("packed", UTXOSet, TxOutput)):
+        utxo, row = _measure(factory, cls, count, per_address, seed)
+        probes = [(o.txid, o.index) for o in _outputs(count, per_address, seed, cls) if rnd.random() < LOOKUPS / count]
+        row.update(_ops(utxo, probes))
+        row["extrapolated_mb"] = row["bytes_per_output"] * target / 2**20
+        report[name] = row
+        del utxo
+    report["reduction"] = report["legacy"]["bytes_per_output"] / report["packed"]["bytes_per_output"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--target", type=int, default=5_000_000)
+    parser.add_argument("--per-address", type=int, default=4)
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args()
+
+    r = run(args.count, args.target, args.per_address)
+    print(f"Выходов: {r['count']}, пересчёт на {r['target']}")
+    print(f"{'':>7} {'байт/выход':>11} {'МБ на цель':>11} {'заполн., с':>11} {'get, мкс':>9} {'has, мкс':>9} "
+          f"{'spend, мкс':>11}")
+    for name in ("legacy", "packed"):
+        row = r[name]
+        print(f"{name:>7} {row['bytes_per_output']:>11.0f} {row['extrapolated_mb']:>11.0f} {row['fill_s']:>11.2f} "
+              f"{row['get_us']:>9.2f} {row['has_us']:>9.2f} {row['spend_us']:>11.2f}")
+    print(f"Экономия памяти: в {r['reduction']:.1f} раза")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(r, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
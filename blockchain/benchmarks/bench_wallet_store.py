@@ -0,0 +1,125 @@
+"""
+Старт узла с большим числом кошельков: хранилище wallet_store (mmap-индекс +
+хвост журнала) против прежнего wallets.json, который читался целиком и
+превращался в объекты Wallet с SigningKey.
+
+Ключи синтетические (случайные байты, адрес — sha256 публичного ключа):
+хранилище их не проверяет, а генерация миллиона настоящих ключей заняла бы
+полчаса. Прежний путь меряется на --legacy-count кошельках, потому что каждый
+SigningKey.from_string — умножение точки.
+
+    python -m benchmarks.bench_wallet_store [--count 1000000] [--legacy-count 2000] [--json out.json]
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+
+from anoncoin_core import Wallet
+from benchmarks.bench_chain_export import rss_kb
+from wallet_store import WalletStore
+
+CHUNK = 50_000
+
+
+def _synthetic(count: int, seed: int):
+    rnd = random.Random(seed)
+    for _ in range(count):
+        pub_hex = rnd.randbytes(96).hex()
+        yield Wallet.from_keys(rnd.randbytes(48).hex(), pub_hex)
+
+
+def _fill(store: WalletStore, count: int, seed: int) -> list[str]:
+    sample = []
+    wallets = _synthetic(count, seed)
+    for start in range(0, count, CHUNK):
+        chunk = [next(wallets) for _ in range(min(CHUNK, count - start))]
+        store.add_many(chunk)
+        sample.append(chunk[0].get_address())
+    return sample
+
+
+def _open(path: str) -> tuple[WalletStore, dict]:
+    gc.collect()
+    base, started = rss_kb(), time.perf_counter()
+    store = WalletStore(path).open()
+    return store, {"seconds": time.perf_counter() - started, "rss_growth_kb": rss_kb() - base}
+
+
+def run(count: int, legacy_count: int, lookups: int = 10_000, seed: int = 1) -> dict:
+    logging.disable(logging.INFO)
+    report = {"count": count}
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "wallets.dat")
+        store = WalletStore(path).open()
+        started = time.perf_counter()
+        sample = _fill(store, count, seed)
+        report["fill_seconds"] = time.perf_counter() - started
+        report["data_mb"] = os.path.getsize(path) / 2**20
+        store.close()
+
+        # Без индекса: весь журнал — хвост, open() сам строит индекс (первый старт после импорта)
+        store, report["open_unindexed"] = _open(path)
+        store.close()
+
+        # Обычный старт: индекс в mmap, хвост пуст
+        store, report["open_indexed"] = _open(path)
+        rnd = random.Random(seed)
+        probes = [rnd.choice(sample) for _ in range(lookups)]
+        missing = [hashlib.sha256(rnd.randbytes(8)).hexdigest() for _ in range(lookups)]
+        started = time.perf_counter()
+        found = sum(store.get(a) is not None for a in probes)
+        absent = sum(a in store for a in missing)
+        report["lookup_us"] = (time.perf_counter() - started) / (2 * lookups) * 1e6
+        report["lookups_ok"] = found == lookups and absent == 0
+        store.close()
+
+        # Прежний путь: wallets.json целиком + SigningKey на каждый кошелёк
+        legacy = os.path.join(data_dir, "wallets.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump({w.get_address(): {"private_key_hex": w.private_key_hex, "public_key_hex": w.public_key_hex}
+                       for w in (Wallet.from_private_key_hex(os.urandom(47).hex().rjust(96, "0"))
+                                 for _ in range(legacy_count))}, f, indent=2)
+        gc.collect()
+        base, started = rss_kb(), time.perf_counter()
+        with open(legacy, "r", encoding="utf-8") as f:
+            loaded = {addr: Wallet.from_private_key_hex(info["private_key_hex"]) for addr, info in json.load(f).items()}
+        elapsed = time.perf_counter() - started
+        report["legacy"] = {
+            "count": legacy_count,
+            "seconds": elapsed,
+            "rss_growth_kb": rss_kb() - base,
+            "extrapolated_seconds": elapsed * count / legacy_count,
+        }
+        del loaded
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--legacy-count", type=int, default=2000)
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args()
+
+    r = run(args.count, args.legacy_count)
+    print(f"Кошельков: {r['count']}, журнал {r['data_mb']:.1f} МБ, запись {r['fill_seconds']:.1f} с")
+    for name in ("open_unindexed", "open_indexed"):
+        print(f"{name:>15}: {r[name]['seconds'] * 1000:9.1f} мс, RSS +{r[name]['rss_growth_kb'] / 1024:7.1f} МБ")
+    print(f"{'lookup':>15}: {r['lookup_us']:9.1f} мкс ({'ok' if r['lookups_ok'] else 'ОШИБКА'})")
+    legacy = r["legacy"]
+    print(f"{'wallets.json':>15}: {legacy['count']} кошельков за {legacy['seconds']:.2f} с "
+          f"(RSS +{legacy['rss_growth_kb'] / 1024:.1f} МБ), для {r['count']} ≈ {legacy['extrapolated_seconds']:.0f} с")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(r, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Скорость создания кошельков: прежний путь api_create_wallet (Wallet() с новым
+Mnemonic("english") + полная перезапись wallets.json на каждый кошелёк) против
+пакетного generate_wallets (общий словарь, одна дозапись в хранилище
+кошельков на пакет) — в одном процессе и в пуле процессов.
+
+    python -m benchmarks.bench_wallets [--count 2000] [--old-count 200] [--workers N] [--json out.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from mnemonic import Mnemonic
+
+from anoncoin_core import NIST384p, SigningKey, Wallet, generate_wallets
+from wallet_store import WalletStore
+
+
+def _old_wallet() -> Wallet:
+    # Как Wallet() до пакетного API: свой Mnemonic на каждый кошелёк
+    w = Wallet.from_keys(*(lambda sk: (sk.to_string().hex(), sk.verifying_key.to_string().hex()))(
+        SigningKey.generate(curve=NIST384p)))
+    w.seed_phrase = Mnemonic("english").to_mnemonic(os.urandom(32))
+    return w
+
+
+def _save_wallets_json(path: str, wallets: dict):
+    # Прежний save_wallets узла: весь словарь заново, JSON с отступами
+    data = {addr: {"private_key_hex": w.private_key_hex, "public_key_hex": w.public_key_hex}
+            for addr, w in wallets.items()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def run(count: int, old_count: int, workers: int) -> dict:
+    logging.disable(logging.INFO)
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        old_wallets = {}
+        started = time.perf_counter()
+        for _ in range(old_count):
+            w = _old_wallet()
+            old_wallets[w.get_address()] = w
+            _save_wallets_json(os.path.join(data_dir, "wallets.json"), old_wallets)
+        elapsed = time.perf_counter() - started
+        results["per_wallet_save"] = {"wallets": old_count, "seconds": elapsed, "wallets_per_s": old_count / elapsed}
+
+        def bulk(executor):
+            store = WalletStore(os.path.join(data_dir, f"wallets-{id(executor)}.dat")).open()
+            t0 = time.perf_counter()
+            store.add_many(generate_wallets(count, executor))
+            store.close()
+            dt = time.perf_counter() - t0
+            return {"wallets": count, "seconds": dt, "wallets_per_s": count / dt}
+
+        results["bulk_inline"] = bulk(None)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(int, range(workers)))  # прогрев процессов вне замера
+                results["bulk_pool"] = bulk(pool)
+                results["bulk_pool"]["workers"] = workers
+    return {"cpu_count": os.cpu_count(), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--old-count", type=int, default=200, help="кошельков для прежнего пути (он квадратичный)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args()
+
+    report = run(args.count, args.old_count, args.workers)
+    print(f"CPU: {report['cpu_count']}")
+    for name, r in report["results"].items():
+        print(f"{name:>16}: {r['wallets']:>6} кошельков за {r['seconds']:7.2f} с = {r['wallets_per_s']:8.1f} /с")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
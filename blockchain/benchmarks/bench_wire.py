@@ -0,0 +1,95 @@
+"""
+Сравнение кадров wire.py (bin1 и cjson — JSON в кадре) с JSON-текстом: размер
+сообщения, скорость кодирования и декодирования для блоков и транзакций.
+
+    python -m benchmarks.bench_wire [--txs 200] [--repeat 50] [--json out.json]
+"""
+
+import argparse
+import json
+import logging
+import time
+import zlib
+
+from anoncoin_core import COIN, Blockchain, Transaction, Wallet
+from peers import encode_message
+from wire import decode_frame, encode_frame, zstandard
+
+
+def _synthetic_block(tx_count: int) -> dict:
+    logging.disable(logging.INFO)
+    chain = Blockchain(difficulty=1)
+    sender, receiver = Wallet(), Wallet()
+    for i in range(tx_count):
+        tx = Transaction(sender.public_key_hex, receiver.get_address(), (125 + 100 * i) * COIN // 100, metadata=f"tx {i}")
+        tx.sign_transaction(sender)
+        chain.pending_transactions.append(tx)
+    chain.mine_pending_transactions(sender.get_address())
+    return chain.get_latest_block().to_dict()
+
+
+def _timeit(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def run(tx_count: int = 200, repeat: int = 50) -> dict:
+    block = _synthetic_block(tx_count)
+    messages = {
+        "new_block": {"type": "new_block", "block": block},
+        "new_transaction": {"type": "new_transaction", "transaction": block["transactions"][-1]},
+    }
+    codecs = [None, "zlib"] + (["zstd"] if zstandard is not None else [])
+
+    results = {}
+    for name, msg in messages.items():
+        text = encode_message(msg)
+        raw = text.encode()
+        packed = zlib.compress(raw, 6)
+        row = {
+            "json": {
+                "bytes": len(raw),
+                "encode_us": _timeit(lambda: encode_message(msg), repeat) * 1e6,
+                "decode_us": _timeit(lambda: json.loads(text), repeat) * 1e6,
+            },
+            "json+zlib": {
+                "bytes": len(packed),
+                "encode_us": _timeit(lambda: zlib.compress(encode_message(msg).encode(), 6), repeat) * 1e6,
+                "decode_us": _timeit(lambda: json.loads(zlib.decompress(packed)), repeat) * 1e6,
+            },
+        }
+        for payload_format in ("bin1", "cjson"):
+            for codec in codecs:
+                frame = encode_frame(msg, codec, payload_format)
+                assert decode_frame(frame) == msg, "кадр должен восстанавливать сообщение побайтно"
+                row[payload_format + (f"+{codec}" if codec else "")] = {
+                    "bytes": len(frame),
+                    "encode_us": _timeit(lambda: encode_frame(msg, codec, payload_format), repeat) * 1e6,
+                    "decode_us": _timeit(lambda: decode_frame(frame), repeat) * 1e6,
+                }
+        results[name] = row
+    return {"tx_count": tx_count, "repeat": repeat, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--txs", type=int, default=200, help="транзакций в синтетическом блоке")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", dest="json_out", default=None, help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    report = run(args.txs, args.repeat)
+    for name, row in report["results"].items():
+        print(f"\n{name} ({report['tx_count']} tx в блоке)")
+        print(f"{'формат':<14}{'байт':>10}{'encode, мкс':>14}{'decode, мкс':>14}")
+        for fmt, r in row.items():
+            print(f"{fmt:<14}{r['bytes']:>10}{r['encode_us']:>14.1f}{r['decode_us']:>14.1f}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Общие средства измерения для бенчмарков: калиброванные повторы (как в timeit),
+пик памяти через tracemalloc и метаданные окружения для сравнения запусков.
+"""
+
+import gc
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+MIN_REPEAT_TIME = 0.05  # сек. на один повтор при автоподборе числа вызовов
+
+
+def _calibrate(fn: Callable[[], object], max_time: float) -> int:
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - started >= max_time or number >= 1 << 20:
+            return number
+        number *= 2
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, number: Optional[int] = None,
+            setup: Optional[Callable[[], object]] = None, memory: bool = True) -> dict:
+    """
+    Время одного вызова fn по `repeat` повторам (каждый — `number` вызовов подряд,
+    GC выключен) и пик выделенной памяти за один вызов. setup() выполняется
+    перед каждым повтором и в замер не входит.
+    """
+    if setup:
+        setup()
+    if number is None:
+        number = _calibrate(fn, MIN_REPEAT_TIME)
+    times = []
+    gc_enabled = gc.isenabled()
+    try:
+        for _ in range(repeat):
+            if setup:
+                setup()
+            gc.disable()
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            times.append((time.perf_counter() - started) / number)
+            if gc_enabled:
+                gc.enable()
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    result = {
+        "number": number,
+        "repeat": repeat,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+    if memory:
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result["peak_kb"] = round(peak / 1024, 1)
+    return result
+
+
+def environment() -> dict:
+    """Версия кода и окружения: без них результаты разных запусков нельзя сравнивать"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit or None,
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": int(time.time()),
+    }
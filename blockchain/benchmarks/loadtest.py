@@ -0,0 +1,447 @@
+"""
+Нагрузочный стенд: N узлов decentralized_node.py на localhost, каждый со своим
+каталогом данных, связанные через bootstrap-адреса (узел i знает узел 0 и i-1,
+остальных находит обменом адресами).
+
+Нагрузка:
+  майнинг   — каждый узел периодически майнит блок (POST /api/mining/start);
+  транзакции — с заданной частотой через REST (/api/transaction/send) и/или
+               как P2P-сообщение new_transaction по /ws (подпись на стороне стенда).
+
+Отчёт: задержка распространения блоков (по событиям tip с /ws/events каждого
+узла), пропускная способность (отправлено/подтверждено транзакций в секунду,
+блоков в секунду), доля форков (блоки, замеченные хоть одним узлом, но не
+попавшие в итоговую цепочку), сходимость вершин, CPU и RSS каждого процесса
+(/proc, только Linux).
+
+    python -m benchmarks.loadtest [--nodes 3] [--duration 30] [--tx-rate 5] [--tx-via rest,ws]
+                                  [--mine-interval 3] [--base-port 18400] [--json out.json] [--keep]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Optional
+
+import websockets
+
+from anoncoin_core import COIN, Transaction, Wallet, generate_transaction_id
+from benchmarks.synthetic import build_wallets
+
+NODE_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "decentralized_node.py")
+STARTUP_TIMEOUT = 60.0
+SETTLE_TIME = 5.0       # сек. после нагрузки, чтобы последние блоки успели разойтись
+SAMPLE_INTERVAL = 1.0   # сек. между замерами CPU/RSS
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# ==========================
+# ПРОЦЕССЫ УЗЛОВ
+# ==========================
+@dataclass
+class NodeProcess:
+    index: int
+    port: int
+    data_dir: str
+    proc: Optional[subprocess.Popen] = None
+    wallet: Optional[Wallet] = None
+    rss_samples: list = field(default_factory=list)
+    cpu_start: float = 0.0
+    wall_start: float = 0.0
+
+    @property
+    def http_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/ws"
+
+    def cpu_seconds(self) -> float:
+        """utime + stime процесса из /proc/<pid>/stat"""
+        try:
+            with open(f"/proc/{self.proc.pid}/stat", encoding="ascii") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / _CLK_TCK
+        except (OSError, IndexError, ValueError):
+            return 0.0
+
+    def rss_kb(self) -> int:
+        try:
+            with open(f"/proc/{self.proc.pid}/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+
+def launch_nodes(count: int, base_port: int, root: str) -> list[NodeProcess]:
+    nodes = []
+    for i in range(count):
+        node = NodeProcess(i, base_port + i, os.path.join(root, f"node{i}"))
+        os.makedirs(node.data_dir, exist_ok=True)
+        bootstrap = sorted({nodes[0].ws_url, nodes[-1].ws_url}) if nodes else []
+        log = open(os.path.join(node.data_dir, "node.log"), "wb")
+        node.proc = subprocess.Popen(
+            [sys.executable, NODE_SCRIPT, "--host", "127.0.0.1", "--port", str(node.port),
+             "--data-dir", node.data_dir, "--bootstrap", ",".join(bootstrap)],
+            cwd=os.path.dirname(NODE_SCRIPT), stdout=log, stderr=subprocess.STDOUT,
+        )
+        log.close()
+        nodes.append(node)
+    return nodes
+
+
+def stop_nodes(nodes: list[NodeProcess]):
+    for node in nodes:
+        if node.proc and node.proc.poll() is None:
+            node.proc.terminate()
+    for node in nodes:
+        if node.proc:
+            try:
+                node.proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                node.proc.kill()
+
+
+# ==========================
+# HTTP (stdlib, в потоке)
+# ==========================
+def _request(method: str, url: str, body: Optional[dict] = None, timeout: float = 30.0):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        raw = resp.read()
+        is_json = resp.headers.get_content_type() == "application/json"
+    return json.loads(raw) if is_json else raw
+
+
+async def http(method: str, url: str, body: Optional[dict] = None):
+    return await asyncio.to_thread(_request, method, url, body)
+
+
+async def wait_ready(node: NodeProcess):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if node.proc.poll() is not None:
+            raise RuntimeError(f"узел {node.index} завершился при старте (см. {node.data_dir}/node.log)")
+        try:
+            await http("GET", node.http_url + "/api/blockchain/info")
+            return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"узел {node.index} не поднялся за {STARTUP_TIMEOUT} с")
+
+
+# ==========================
+# НАБЛЮДЕНИЕ ЗА ВЕРШИНАМИ
+# ==========================
+class TipObserver:
+    """Подписка на "tip" каждого узла: хеш блока -> {узел: время появления}"""
+
+    def __init__(self):
+        self.arrivals: dict[str, dict[int, float]] = {}
+        self.heights: dict[str, int] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self, nodes: list[NodeProcess]):
+        self._tasks = [asyncio.create_task(self._watch(node)) for node in nodes]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _watch(self, node: NodeProcess):
+        url = f"ws://127.0.0.1:{node.port}/ws/events"
+        while True:
+            try:
+                async with websockets.connect(url, max_size=None) as ws:
+                    await ws.send(json.dumps({"op": "subscribe", "topics": ["tip"]}))
+                    async for raw in ws:
+                        msg = json.loads(raw)
+                        if msg.get("type") == "tip":
+                            self.arrivals.setdefault(msg["hash"], {}).setdefault(node.index, time.monotonic())
+                            self.heights[msg["hash"]] = msg["height"]
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await asyncio.sleep(0.5)
+
+
+# ==========================
+# НАГРУЗКА
+# ==========================
+class Workload:
+    def __init__(self, nodes: list[NodeProcess], tx_rate: float, tx_via: list[str],
+                 mine_interval: float, seed: int):
+        self.nodes = nodes
+        self.tx_rate = tx_rate
+        self.tx_via = tx_via
+        self.mine_interval = mine_interval
+        self.rng = random.Random(seed)
+        self.submitted: dict[str, str] = {}   # txid -> путь (только ws: REST-транзакции подписывает узел)
+        self.rest_ok = 0
+        self.rest_failed = 0
+        self.mine_requests = 0
+        self._ws: dict[int, object] = {}
+        self._drainers: list[asyncio.Task] = []
+
+    async def setup(self, seed: int):
+        # Ключи генерирует стенд: по REST кошелёк регистрируется на узле (для майнинга и /send),
+        # а по /ws транзакции подписываются здесь же
+        for node, wallet in zip(self.nodes, build_wallets(len(self.nodes), seed)):
+            node.wallet = wallet
+            await http("POST", node.http_url + "/api/wallet/recover",
+                       {"private_key_hex": wallet.private_key.to_string().hex()})
+        if "ws" in self.tx_via:
+            for node in self.nodes:
+                ws = await websockets.connect(node.ws_url, max_size=None)
+                self._ws[node.index] = ws
+                self._drainers.append(asyncio.create_task(self._drain(ws)))
+
+    async def close(self):
+        for task in self._drainers:
+            task.cancel()
+        for ws in self._ws.values():
+            await ws.close()
+
+    @staticmethod
+    async def _drain(ws):
+        # Узел шлёт нам как пиру hello, цепочку и рассылки — читаем, чтобы не копилось
+        try:
+            async for _ in ws:
+                pass
+        except Exception:
+            pass
+
+    async def mine_loop(self, node: NodeProcess, until: float):
+        # Случайный сдвиг, чтобы узлы не майнили синхронно
+        await asyncio.sleep(self.rng.uniform(0, self.mine_interval))
+        while time.monotonic() < until:
+            try:
+                await http("POST", node.http_url + "/api/mining/start", {"miner_address": node.wallet.get_address()})
+                self.mine_requests += 1
+            except (urllib.error.URLError, OSError):
+                pass
+            await asyncio.sleep(self.rng.expovariate(1 / self.mine_interval))
+
+    async def tx_loop(self, until: float):
+        if self.tx_rate <= 0:
+            return
+        pending: set[asyncio.Task] = set()
+        while time.monotonic() < until:
+            sender, receiver = self.rng.sample(self.nodes, 2) if len(self.nodes) > 1 else (self.nodes[0],) * 2
+            amount = self.rng.randrange(COIN // 1000, COIN // 100)   # в единицах
+            via = self.rng.choice(self.tx_via)
+            task = asyncio.create_task(self._send(sender, receiver, amount, via))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            await asyncio.sleep(self.rng.expovariate(self.tx_rate))
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _send(self, sender: NodeProcess, receiver: NodeProcess, amount: int, via: str):
+        if via == "ws":
+            tx = Transaction(sender.wallet.public_key_hex, receiver.wallet.get_address(), amount)
+            tx.sign_transaction(sender.wallet)
+            self.submitted[generate_transaction_id(tx)] = "ws"
+            try:
+                await self._ws[sender.index].send(json.dumps({"type": "new_transaction", "transaction": tx.to_dict()}))
+            except Exception:
+                pass
+            return
+        try:
+            await http("POST", sender.http_url + "/api/transaction/send",
+                       {"sender": sender.wallet.get_address(), "receiver": receiver.wallet.get_address(),
+                        "amount_units": amount})
+            self.rest_ok += 1
+        except (urllib.error.URLError, OSError):
+            self.rest_failed += 1
+
+
+async def sample_resources(nodes: list[NodeProcess], until: float):
+    while time.monotonic() < until:
+        for node in nodes:
+            node.rss_samples.append(node.rss_kb())
+        await asyncio.sleep(SAMPLE_INTERVAL)
+
+
+# ==========================
+# ОТЧЁТ
+# ==========================
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {
+        "count": len(values),
+        "p50_ms": round(pick(0.5) * 1000, 2),
+        "p90_ms": round(pick(0.9) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(values) * 1000, 2),
+    }
+
+
+async def collect_report(nodes, observer: TipObserver, workload: Workload, duration: float) -> dict:
+    infos = [await http("GET", node.http_url + "/api/blockchain/info") for node in nodes]
+    tips = {info["tip_hash"] for info in infos}
+
+    # Итоговая цепочка — самая длинная из узлов; читаем её потоковым экспортом
+    best = max(range(len(nodes)), key=lambda i: infos[i]["height"])
+    raw = await http("GET", nodes[best].http_url + "/api/chain/export?from=0")
+    canonical_blocks = [json.loads(line) for line in raw.decode().splitlines() if line.strip()]
+    canonical = {b["hash"] for b in canonical_blocks}
+    confirmed = set()
+    for block in canonical_blocks:
+        for tx in block["transactions"]:
+            if tx.get("tx_type") != "coinbase":
+                confirmed.add(generate_transaction_id(Transaction.from_dict(tx)))
+
+    # Распространение: от первого узла, увидевшего блок, до каждого из остальных
+    delays, full_spread = [], []
+    for block_hash, seen in observer.arrivals.items():
+        if block_hash not in canonical or observer.heights.get(block_hash, 0) == 0 or len(seen) < 2:
+            continue
+        first = min(seen.values())
+        delays.extend(t - first for t in seen.values() if t != first)
+        if len(seen) == len(nodes):
+            full_spread.append(max(seen.values()) - first)
+
+    observed = {h for h in observer.arrivals if observer.heights.get(h, 0) > 0}
+    orphaned = observed - canonical
+    submitted_confirmed = sum(1 for txid in workload.submitted if txid in confirmed)
+
+    per_node = []
+    for node in nodes:
+        wall = time.monotonic() - node.wall_start
+        cpu = node.cpu_seconds() - node.cpu_start
+        per_node.append({
+            "node": node.index,
+            "port": node.port,
+            "height": infos[node.index]["height"],
+            "cpu_seconds": round(cpu, 2),
+            "cpu_percent": round(cpu / wall * 100, 1) if wall else 0.0,
+            "rss_peak_mb": round(max(node.rss_samples, default=0) / 1024, 1),
+            "rss_end_mb": round(node.rss_kb() / 1024, 1),
+        })
+
+    return {
+        "duration_s": duration,
+        "converged": len(tips) == 1,
+        "final_height": infos[best]["height"],
+        "propagation": _percentiles(delays),
+        "propagation_all_nodes": _percentiles(full_spread),
+        "blocks": {
+            "observed": len(observed),
+            "canonical": len(canonical) - 1,
+            "orphaned": len(orphaned),
+            "fork_rate": round(len(orphaned) / len(observed), 4) if observed else 0.0,
+            "per_second": round((len(canonical) - 1) / duration, 3),
+            "mine_requests": workload.mine_requests,
+        },
+        "transactions": {
+            "rest_ok": workload.rest_ok,
+            "rest_failed": workload.rest_failed,
+            "ws_sent": sum(1 for via in workload.submitted.values() if via == "ws"),
+            "confirmed_total": len(confirmed),
+            "confirmed_ws": submitted_confirmed,
+            "submitted_per_second": round((workload.rest_ok + workload.rest_failed
+                                           + len(workload.submitted)) / duration, 2),
+            "confirmed_per_second": round(len(confirmed) / duration, 2),
+        },
+        "nodes": per_node,
+    }
+
+
+async def run(nodes_count: int = 3, duration: float = 30.0, tx_rate: float = 5.0, tx_via=("rest", "ws"),
+              mine_interval: float = 3.0, base_port: int = 18400, seed: int = 1,
+              root: Optional[str] = None) -> dict:
+    root = root or tempfile.mkdtemp(prefix="anoncoin-loadtest-")
+    nodes = launch_nodes(nodes_count, base_port, root)
+    observer = TipObserver()
+    workload = Workload(nodes, tx_rate, list(tx_via), mine_interval, seed)
+    try:
+        for node in nodes:
+            await wait_ready(node)
+        now = time.monotonic()
+        for node in nodes:
+            node.cpu_start, node.wall_start = node.cpu_seconds(), now
+        observer.start(nodes)
+        await workload.setup(seed)
+
+        started = time.monotonic()
+        until = started + duration
+        await asyncio.gather(
+            workload.tx_loop(until),
+            sample_resources(nodes, until + SETTLE_TIME),
+            *(workload.mine_loop(node, until) for node in nodes),
+        )
+        elapsed = time.monotonic() - started
+        report = await collect_report(nodes, observer, workload, elapsed)
+        report["params"] = {"nodes": nodes_count, "duration": duration, "tx_rate": tx_rate,
+                            "tx_via": list(tx_via), "mine_interval": mine_interval, "seed": seed,
+                            "data_root": root}
+        return report
+    finally:
+        await observer.stop()
+        await workload.close()
+        stop_nodes(nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=30.0, help="сек. нагрузки")
+    parser.add_argument("--tx-rate", type=float, default=5.0, help="транзакций в секунду на весь стенд")
+    parser.add_argument("--tx-via", default="rest,ws", help="rest, ws или оба через запятую")
+    parser.add_argument("--mine-interval", type=float, default=3.0, help="средний интервал майнинга одного узла, сек.")
+    parser.add_argument("--base-port", type=int, default=18400)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_out", default=None)
+    parser.add_argument("--keep", action="store_true", help="не удалять каталоги данных и логи узлов")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="anoncoin-loadtest-")
+    try:
+        report = asyncio.run(run(args.nodes, args.duration, args.tx_rate, args.tx_via.split(","),
+                                 args.mine_interval, args.base_port, args.seed, root))
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    p, b, t = report["propagation"], report["blocks"], report["transactions"]
+    print(f"узлов: {args.nodes}, {report['duration_s']:.1f} с, высота {report['final_height']}, "
+          f"вершины сошлись: {report['converged']}")
+    if p["count"]:
+        print(f"распространение блока: p50 {p['p50_ms']} мс, p90 {p['p90_ms']} мс, max {p['max_ms']} мс")
+    print(f"блоки: {b['canonical']} в цепочке, {b['orphaned']} в форках (доля {b['fork_rate']}), {b['per_second']}/с")
+    print(f"транзакции: отправлено {t['submitted_per_second']}/с, подтверждено {t['confirmed_per_second']}/с "
+          f"(REST ok {t['rest_ok']}, ошибок {t['rest_failed']}, WS {t['ws_sent']})")
+    print(f"{'узел':>6}{'CPU, %':>10}{'RSS пик, МБ':>14}{'высота':>9}")
+    for n in report["nodes"]:
+        print(f"{n['node']:>6}{n['cpu_percent']:>10}{n['rss_peak_mb']:>14}{n['height']:>9}")
+    if args.keep:
+        print(f"данные и логи узлов: {root}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Воспроизводимый набор бенчмарков горячих путей ядра.
+
+Данные синтетические и детерминированные (seed): одинаковые параметры дают
+одинаковые цепочки, кошельки и число хешей при майнинге, так что разница между
+запусками — это разница в коде или машине. Результат — JSON с метаданными
+окружения; --compare печатает отношение к прошлому результату.
+
+    python -m benchmarks.suite [--blocks 1000] [--txs 2] [--difficulty 3]
+                               [--only calculate_balance,mine_block] [--json out.json]
+                               [--compare old.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+
+from anoncoin_core import (Block, RING_SIZE, Transaction, TxInput, calculate_balance, compute_key_image,
+                           create_ring_signature, is_duplicate_transaction, serialize_transaction,
+                           verify_ring_signature)
+from benchmarks.harness import environment, measure
+from benchmarks.synthetic import GENESIS_TIME, build_chain, build_wallets
+
+
+def _chain_benchmarks(chain, repeat: int) -> dict:
+    tip = chain.get_latest_block()
+    # Самый частый получатель — самый «тяжёлый» баланс; отсутствующий txid — полный проход
+    address = tip.transactions[-1].receiver_address
+    missing_txid = "f" * 64
+    return {
+        "calculate_balance": measure(lambda: calculate_balance(chain, address), repeat),
+        "is_duplicate_transaction": measure(lambda: is_duplicate_transaction(chain, missing_txid), repeat),
+        "calculate_hash": measure(tip.calculate_hash, repeat),
+        "is_chain_valid": measure(chain.is_chain_valid, repeat),
+        "rebuild_state": measure(chain.rebuild_state, repeat),
+    }
+
+
+def _mine_benchmark(chain, difficulty: int, repeat: int) -> dict:
+    # Блок фиксированного содержимого: nonce найдётся за одно и то же число хешей
+    tip = chain.get_latest_block()
+    txs = [Transaction(None, "0" * 64, 50, tx_type="coinbase", timestamp=GENESIS_TIME)]
+    state = {}
+
+    def setup():
+        state["block"] = Block(tip.index + 1, tip.hash, GENESIS_TIME, txs)
+
+    result = measure(lambda: state["block"].mine_block(difficulty), repeat, number=1, setup=setup)
+    setup()
+    state["block"].mine_block(difficulty)
+    result["difficulty"] = difficulty
+    result["hashes"] = state["block"].nonce
+    result["hashrate"] = round(result["hashes"] / result["median_s"]) if result["median_s"] else None
+    return result
+
+
+def _persistence_benchmarks(chain, repeat: int) -> dict:
+    import decentralized_node as node  # FastAPI-модуль узла: импортируем только для этого замера
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        node.configure_data_dir(data_dir)
+        node.blockchain = chain
+        save = measure(node.save_blockchain, repeat)
+        save["bytes"] = os.path.getsize(node.BLOCKCHAIN_FILE)
+        load = measure(node.load_blockchain, repeat)
+    return {"save_blockchain": save, "load_blockchain": load}
+
+
+def _ring_benchmarks(ring_size: int, repeat: int, seed: int) -> dict:
+    members = build_wallets(ring_size, seed)
+    signer_pos = random.Random(seed).randrange(ring_size)
+    signer = members[signer_pos]
+    ring = [w.public_key_hex for w in members]
+    message = serialize_transaction({"receiver_address": "0" * 64, "amount": 1.0, "timestamp": GENESIS_TIME})
+    # Кольцо по выходам: у каждого участника свой выход
+    inputs = [TxInput(f"{i:064x}", 0) for i in range(len(ring))]
+    key_image = compute_key_image(signer.private_key.to_string(), inputs[signer_pos])
+
+    signature = create_ring_signature(message, signer.private_key, ring, inputs, key_image)
+    create = measure(lambda: create_ring_signature(message, signer.private_key, ring, inputs, key_image), repeat)
+    verify = measure(lambda: verify_ring_signature(message, signature, key_image, inputs), repeat)
+    verify["valid"] = bool(verify_ring_signature(message, signature, key_image, inputs))
+    create["ring_size"] = verify["ring_size"] = ring_size
+    return {"ring_signature_create": create, "ring_signature_verify": verify}
+
+
+GROUPS = {
+    "chain": ("calculate_balance", "is_duplicate_transaction", "calculate_hash", "is_chain_valid", "rebuild_state"),
+    "mine": ("mine_block",),
+    "persistence": ("save_blockchain", "load_blockchain"),
+    "ring": ("ring_signature_create", "ring_signature_verify"),
+}
+
+
+def run(blocks: int = 1000, txs_per_block: int = 2, difficulty: int = 3, ring_size: int = RING_SIZE,
+        repeat: int = 5, seed: int = 1, only: set[str] | None = None) -> dict:
+    logging.disable(logging.WARNING)
+    wanted = lambda group: only is None or bool(only & set(GROUPS[group]))
+    chain = build_chain(blocks, txs_per_block, seed=seed)
+    results = {}
+    if wanted("chain"):
+        results.update(_chain_benchmarks(chain, repeat))
+    if wanted("mine"):
+        results["mine_block"] = _mine_benchmark(chain, difficulty, repeat)
+    if wanted("persistence"):
+        results.update(_persistence_benchmarks(chain, repeat))
+    if wanted("ring"):
+        results.update(_ring_benchmarks(ring_size, repeat, seed))
+    if only is not None:
+        results = {k: v for k, v in results.items() if k in only}
+    return {
+        "environment": environment(),
+        "params": {"blocks": blocks, "txs_per_block": txs_per_block, "difficulty": difficulty,
+                   "ring_size": ring_size, "repeat": repeat, "seed": seed},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=1000)
+    parser.add_argument("--txs", type=int, default=2, help="обычных транзакций в блоке")
+    parser.add_argument("--difficulty", type=int, default=3)
+    parser.add_argument("--ring-size", type=int, default=RING_SIZE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", default=None, help="имена бенчмарков через запятую")
+    parser.add_argument("--json", dest="json_out", default=None)
+    parser.add_argument("--compare", default=None, help="JSON прошлого запуска")
+    args = parser.parse_args()
+
+    only = set(args.only.split(",")) if args.only else None
+    report = run(args.blocks, args.txs, args.difficulty, args.ring_size, args.repeat, args.seed, only)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+    print(f"{'бенчмарк':>26}{'медиана, мс':>14}{'мин, мс':>12}{'пик, КБ':>12}" + ("{:>10}".format("к базе") if baseline else ""))
+    for name, r in report["results"].items():
+        line = f"{name:>26}{r['median_s'] * 1000:>14.4f}{r['min_s'] * 1000:>12.4f}{r.get('peak_kb', 0):>12.1f}"
+        if name in baseline:
+            line += f"{r['median_s'] / baseline[name]['median_s']:>9.2f}x"
+        print(line)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
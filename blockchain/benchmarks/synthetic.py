@@ -0,0 +1,56 @@
+"""
+Генераторы синтетических данных для бенчмарков: цепочки и кошельки заданного
+размера с детерминированным содержимым (одинаковый seed -> одинаковые данные).
+"""
+
+import logging
+import random
+
+from ecdsa import NIST384p, SigningKey
+
+from anoncoin_core import COIN, Block, Blockchain, Transaction, Wallet
+
+GENESIS_TIME = 1_700_000_000
+
+
+def synthetic_address(rng: random.Random) -> str:
+    return "%064x" % rng.getrandbits(256)
+
+
+def build_chain(blocks: int, txs_per_block: int = 2, seed: int = 1, addresses: int = 100) -> Blockchain:
+    """
+    Цепочка из `blocks` блоков (включая генезис) без PoW (difficulty=0).
+    Транзакции не подписаны: подключение блока подписи не проверяет,
+    а стоимость хеширования/сериализации та же, что у настоящих.
+    """
+    logging.disable(logging.INFO)
+    rng = random.Random(seed)
+    pool = [synthetic_address(rng) for _ in range(addresses)]
+    chain = Blockchain(difficulty=0)
+
+    for height in range(1, blocks):
+        ts = GENESIS_TIME + height * 60
+        txs = [Transaction(None, rng.choice(pool), 50 * COIN, tx_type="coinbase", timestamp=ts)]
+        for i in range(txs_per_block):
+            txs.append(Transaction(
+                sender_pubkey_hex="%0192x" % rng.getrandbits(768),
+                receiver_address=rng.choice(pool),
+                amount=rng.randrange(COIN // 10, 10 * COIN),
+                signature="c2lnbmF0dXJl" * 8,
+                timestamp=ts + i,
+            ))
+        block = Block(height, chain.get_latest_block().hash, ts, txs)
+        if not chain.connect_block(block):
+            raise RuntimeError(f"синтетический блок {height} не подключился")
+    return chain
+
+
+def build_wallets(count: int, seed: int = 1) -> list[Wallet]:
+    """Кошельки с ключами из seed (без сид-фраз): одинаковые адреса от запуска к запуску"""
+    rng = random.Random(seed)
+    order = NIST384p.order
+    return [
+        Wallet.from_private_key_hex(
+            SigningKey.from_secret_exponent(rng.randrange(1, order), curve=NIST384p).to_string().hex())
+        for _ in range(count)
+    ]
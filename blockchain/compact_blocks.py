@@ -0,0 +1,113 @@
+"""
+Компактная ретрансляция блоков (по мотивам BIP152).
+
+Вместо полного block.to_dict() пиру отправляется заголовок и короткие
+идентификаторы транзакций. Получатель собирает блок из своего мемпула
+и запрашивает только недостающие транзакции (get_block_txn / block_txn).
+"""
+
+import hashlib
+import os
+from typing import Optional
+
+from anoncoin_core import Block, Transaction, generate_transaction_id
+
+SHORT_ID_BYTES = 6
+
+
+def short_txid(key: bytes, txid: str) -> str:
+    """Короткий ID: keyed BLAKE2b от txid, ключ зависит от блока и случайного nonce"""
+    return hashlib.blake2b(txid.encode(), key=key, digest_size=SHORT_ID_BYTES).hexdigest()
+
+
+def _short_id_key(block_hash: str, nonce: str) -> bytes:
+    # Ключ привязан к конкретному блоку, чтобы нельзя было заранее подобрать коллизии
+    return hashlib.sha256(f"{block_hash}{nonce}".encode()).digest()[:16]
+
+
+def block_header(block: Block) -> dict:
+    return {
+        "index": block.index,
+        "previous_hash": block.previous_hash,
+        "timestamp": block.timestamp,
+        "nonce": block.nonce,
+        "manifest": block.manifest,
+        "hash": block.hash,
+    }
+
+
+def make_compact_block(block: Block) -> dict:
+    """
+    Сообщение cmpct_block. Coinbase-транзакции передаются целиком (prefilled):
+    в мемпуле получателя их заведомо нет.
+    """
+    nonce = os.urandom(8).hex()
+    key = _short_id_key(block.hash, nonce)
+    short_ids, prefilled = [], []
+    for i, tx in enumerate(block.transactions):
+        if tx.tx_type == "coinbase":
+            prefilled.append({"index": i, "tx": tx.to_dict()})
+        else:
+            short_ids.append(short_txid(key, generate_transaction_id(tx)))
+    return {
+        "type": "cmpct_block",
+        "header": block_header(block),
+        "short_id_nonce": nonce,
+        "tx_count": len(block.transactions),
+        "short_ids": short_ids,
+        "prefilled": prefilled,
+    }
+
+
+class PartialBlock:
+    """Блок, собираемый из cmpct_block + мемпула + block_txn"""
+
+    def __init__(self, msg: dict, mempool: list[Transaction]):
+        self.header = msg["header"]
+        self.hash = self.header["hash"]
+        tx_count = int(msg["tx_count"])
+        short_ids = list(msg["short_ids"])
+        prefilled = msg.get("prefilled", [])
+        if len(short_ids) + len(prefilled) != tx_count:
+            raise ValueError("tx_count не совпадает с числом short_ids + prefilled")
+
+        self.slots: list[Optional[Transaction]] = [None] * tx_count
+        for p in prefilled:
+            self.slots[int(p["index"])] = Transaction.from_dict(p["tx"])
+
+        # short id -> транзакция мемпула; коллизии внутри мемпула считаем отсутствием
+        key = _short_id_key(self.hash, msg["short_id_nonce"])
+        by_short: dict[str, Optional[Transaction]] = {}
+        for tx in mempool:
+            sid = short_txid(key, generate_transaction_id(tx))
+            by_short[sid] = None if sid in by_short else tx
+
+        ids = iter(short_ids)
+        for i in range(tx_count):
+            if self.slots[i] is None:
+                self.slots[i] = by_short.get(next(ids))
+
+    def missing(self) -> list[int]:
+        return [i for i, tx in enumerate(self.slots) if tx is None]
+
+    def fill(self, transactions: list[dict]):
+        """Подставить транзакции из block_txn в порядке запрошенных индексов"""
+        missing = self.missing()
+        if len(transactions) != len(missing):
+            raise ValueError("block_txn: число транзакций не совпадает с запрошенным")
+        for i, tx_data in zip(missing, transactions):
+            self.slots[i] = Transaction.from_dict(tx_data)
+
+    def to_block(self) -> Block:
+        """
+        Собранный блок. Если хеш не сходится (коллизия short id или иная версия
+        транзакции в мемпуле) — ValueError, вызывающий запрашивает блок целиком.
+        """
+        if self.missing():
+            raise ValueError("блок собран не полностью")
+        h = self.header
+        block = Block(h["index"], h["previous_hash"], h["timestamp"], list(self.slots),
+                      nonce=h["nonce"], manifest=h["manifest"])
+        if block.hash != h["hash"]:
+            raise ValueError("хеш собранного блока не совпадает с заголовком")
+        return block
@@ -1,16 +1,34 @@
 import os
+import argparse
 import asyncio
 import json
 import logging
+import time
 import uvicorn
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
 from typing import List, Optional, Any
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException, Query
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # Импорт из твоего ядра
-from anoncoin_core import Blockchain, Wallet, Transaction, Block
+from anoncoin_core import (Blockchain, Wallet, Transaction, Block, CoinTracker, HDWallet, HD_GAP_LIMIT,
+                           english_mnemonic, format_amount, format_hd_path, generate_transaction_id, generate_wallets,
+                           parse_amount, strict_units, to_coins)
+from peers import PeerSession, PeerManager
+from compact_blocks import PartialBlock, make_compact_block
+from wire import supported_features
+from persistence import WriteBehind, atomic_write
+from indexes import AddressIndex, ChainIndex
+from key_image_store import KeyImageStore
+from wallet_store import WalletStore
+from export import EXPORT_FORMATS, stream_chain
+from subscriptions import EventHub
+from response_cache import ResponseCache
+import metrics
+import tracing
 
 # ==========================
 # ЛОГИ
@@ -34,73 +52,84 @@ app.add_middleware(
 # ==========================
 # ПУТИ ДАННЫХ
 # ==========================
-DATA_DIR = "data"
+DATA_DIR = os.environ.get("ANONCOIN_DATA_DIR", "data")
 BLOCKCHAIN_FILE = os.path.join(DATA_DIR, "blockchain.json")
-WALLETS_FILE   = os.path.join(DATA_DIR, "wallets.json")
+WALLETS_FILE   = os.path.join(DATA_DIR, "wallets.json")   # прежний формат, импортируется в хранилище
+WALLET_STORE_FILE = os.path.join(DATA_DIR, "wallets.dat")
+ADDRESS_INDEX_FILE = os.path.join(DATA_DIR, "address_index.jsonl")
+HD_ACCOUNTS_FILE = os.path.join(DATA_DIR, "hd_accounts.json")
+HD_PUBKEYS_FILE = os.path.join(DATA_DIR, "hd_pubkeys.jsonl")
+KEY_IMAGES_FILE = os.path.join(DATA_DIR, "key_images.dat")
+
+def configure_data_dir(path: str):
+    """Переназначить каталог данных (несколько узлов на одной машине)"""
+    global DATA_DIR, BLOCKCHAIN_FILE, WALLETS_FILE, WALLET_STORE_FILE, ADDRESS_INDEX_FILE, HD_ACCOUNTS_FILE, \
+        HD_PUBKEYS_FILE, KEY_IMAGES_FILE
+    DATA_DIR = path
+    BLOCKCHAIN_FILE = os.path.join(DATA_DIR, "blockchain.json")
+    WALLETS_FILE   = os.path.join(DATA_DIR, "wallets.json")
+    WALLET_STORE_FILE = os.path.join(DATA_DIR, "wallets.dat")
+    ADDRESS_INDEX_FILE = os.path.join(DATA_DIR, "address_index.jsonl")
+    HD_ACCOUNTS_FILE = os.path.join(DATA_DIR, "hd_accounts.json")
+    HD_PUBKEYS_FILE = os.path.join(DATA_DIR, "hd_pubkeys.jsonl")
+    KEY_IMAGES_FILE = os.path.join(DATA_DIR, "key_images.dat")
 
 # ==========================
 # BOOTSTRAP НОДЫ
 # ==========================
 # ВАЖНО: указывай именно WS-эндпоинт /ws
+# Это только стартовые адреса: остальные узлы находятся через обмен адресами (getaddr/addr).
+# Переопределяется переменной ANONCOIN_BOOTSTRAP="ws://a:8000/ws,ws://b:8001/ws"
 BOOTSTRAP_NODES = [
     "ws://127.0.0.1:8000/ws",
     # сюда можно добавить публичные адреса других нод, например:
     # "ws://example.com:8000/ws",
 ]
+if os.environ.get("ANONCOIN_BOOTSTRAP") is not None:
+    BOOTSTRAP_NODES = [u.strip() for u in os.environ["ANONCOIN_BOOTSTRAP"].split(",") if u.strip()]
 
 # ==========================
 # ГЛОБАЛЫ
 # ==========================
 blockchain: Optional[Blockchain] = None
-wallets: dict = {}  # адрес -> Wallet
-connected_peers: List[WebSocket] = []
+# адрес -> Wallet; записи на диске, объекты Wallet создаются по запросу (wallet_store.py)
+wallets = WalletStore(WALLET_STORE_FILE)
+# HD-счета: отпечаток -> {"hd": HDWallet, "next_index": int, "registered": int, "saved_keys": int};
+# адрес -> (отпечаток, индекс)
+hd_accounts: dict = {}
+hd_addresses: dict[str, tuple[str, int]] = {}
+# Учёт монет кошельков, которые недавно тратили: адрес -> CoinTracker (слушатель цепочки)
+coin_trackers: "OrderedDict[str, CoinTracker]" = OrderedDict()
+MAX_COIN_TRACKERS = 256
+# адрес -> [(высота, позиция tx)]; обновляется по событиям цепочки, журнал рядом с блоками
+address_index = AddressIndex()
+# хеш блока -> высота, txid -> (высота, позиция); только в памяти
+chain_index = ChainIndex()
 
-# ==========================
-# HELPERS (ключи кошельков)
-# ==========================
-def _wallet_priv_hex(w: Wallet) -> Optional[str]:
-    """
-    Аккуратно достаём приватный ключ в hex из разных возможных форматов Wallet,
-    не падая, если нет нужных полей.
-    """
-    # 1) Если есть строковый атрибут private_key_hex
-    if hasattr(w, "private_key_hex"):
-        val = getattr(w, "private_key_hex")
-        if isinstance(val, str):
-            return val
+# Кэш ответов read-эндпоинтов, сбрасывается по событиям цепочки и мемпула
+response_cache = ResponseCache()
 
-    # 2) Если есть метод export_private_key_hex()
-    if hasattr(w, "export_private_key_hex"):
-        try:
-            return w.export_private_key_hex()
-        except Exception:
-            pass
+# Подписки клиентов (фронтенд, интеграторы) на /ws/events
+event_hub = EventHub()
+MAX_EVENT_CLIENTS = 10000
 
-    # 3) Если есть объект private_key (например, ecdsa.SigningKey)
-    if hasattr(w, "private_key"):
-        pk = getattr(w, "private_key")
-        # Попробуем получить сырые байты
-        try:
-            # ecdsa.SigningKey -> to_string()
-            raw = pk.to_string()
-            return raw.hex()
-        except Exception:
-            pass
-        # Если вдруг это bytes
-        try:
-            if isinstance(pk, (bytes, bytearray)):
-                return bytes(pk).hex()
-        except Exception:
-            pass
-        # Если вдруг у него есть .hex()
-        try:
-            return pk.hex()
-        except Exception:
-            pass
+# Данные глубже стольких блоков считаются подтверждёнными и кэшируются прокси (см. _cache_control)
+FINAL_CONFIRMATIONS = 6
+FINAL_MAX_AGE = 60  # сек; для ответов по высоте/txid, содержимое которых меняется при смене цепочки
+BLOCKS_PAGE_LIMIT = 100
+# Менеджер пиров ведёт и входящие, и исходящие сессии; connected_peers — тот же список
+peer_manager = PeerManager(bootstrap=BOOTSTRAP_NODES)
+connected_peers: List[PeerSession] = peer_manager.sessions
+# Компактные блоки (cmpct_block) + бинарный формат кадров со сжатием (wire.py)
+peer_manager.features = ["cmpct"] + supported_features()
 
-    # 4) Ничего не нашли
-    return None
+# Компактные блоки, ожидающие недостающих транзакций: хеш -> (пир, у которого запрошены, PartialBlock)
+partial_blocks: dict = {}
+MAX_PARTIAL_BLOCKS = 16
 
+# ==========================
+# HELPERS (ключи кошельков)
+# ==========================
 def _wallet_pub_hex(w: Wallet) -> Optional[str]:
     if hasattr(w, "public_key_hex"):
         val = getattr(w, "public_key_hex")
@@ -117,68 +146,89 @@ def _wallet_pub_hex(w: Wallet) -> Optional[str]:
 # ==========================
 # ЗАГРУЗКА/СОХРАНЕНИЕ
 # ==========================
+SAVE_SECONDS = metrics.histogram("anoncoin_save_blockchain_seconds", "Сериализация и запись цепочки на диск")
+SAVE_BYTES = metrics.counter("anoncoin_save_blockchain_bytes_total", "Байт записано в файл цепочки")
+SAVE_LAST_BYTES = metrics.gauge("anoncoin_save_blockchain_last_bytes", "Размер последнего снимка цепочки")
+
+def _write_blockchain_snapshot(blocks: List[Block]) -> int:
+    """Сериализация и атомарная запись цепочки (выполняется вне event loop)"""
+    with SAVE_SECONDS.time(), tracing.span("save_blockchain", blocks=len(blocks)):
+        with tracing.span("serialize"):
+            data = json.dumps([block.to_dict() for block in blocks], ensure_ascii=False).encode("utf-8")
+        with tracing.span("atomic_write", bytes=len(data)):
+            atomic_write(BLOCKCHAIN_FILE, data)
+    SAVE_BYTES.inc(len(data))
+    SAVE_LAST_BYTES.set(len(data))
+    return len(data)
+
 def save_blockchain():
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-    with open(BLOCKCHAIN_FILE, "w", encoding="utf-8") as f:
-        json.dump([block.to_dict() for block in blockchain.chain], f, ensure_ascii=False, indent=2)
+    """Синхронная запись — для старта/остановки; в обработчиках используйте mark_chain_dirty()"""
+    _write_blockchain_snapshot(list(blockchain.chain))
     logging.info("Блокчейн сохранён")
 
+def _snapshot_node_state():
+    return list(blockchain.chain), address_index.drain_journal()
+
+def _write_node_state(snapshot) -> int:
+    blocks, index_lines = snapshot
+    written = _write_blockchain_snapshot(blocks)
+    # Журнал индекса — после цепочки: записи о блоках, которых нет в файле цепочки,
+    # при загрузке отбрасываются по несовпадению хеша
+    written += address_index.append_journal(index_lines)
+    return written
+
+# Фоновая запись цепочки и журнала индекса адресов: снимок — поверхностная копия
+# списка блоков (подключённые блоки не изменяются), сериализация и диск — в отдельном потоке.
+chain_writer = WriteBehind("blockchain", snapshot=_snapshot_node_state, write=_write_node_state)
+
+def mark_chain_dirty():
+    chain_writer.mark_dirty()
+
 def load_blockchain():
     if os.path.exists(BLOCKCHAIN_FILE):
-        with open(BLOCKCHAIN_FILE, "r", encoding="utf-8") as f:
-            blocks_data = json.load(f)
-            blockchain.chain = [Block.from_dict(b) for b in blocks_data]
+        fresh = list(blockchain.chain)
+        try:
+            with open(BLOCKCHAIN_FILE, "r", encoding="utf-8") as f:
+                blocks_data = json.load(f)
+            blockchain.load_chain([Block.from_dict(b) for b in blocks_data])
+        except Exception as e:
+            # Повреждённый/несогласованный файл не должен мешать старту: откладываем его
+            # в сторону и начинаем с нового генезиса, цепочку догрузим у пиров
+            aside = f"{BLOCKCHAIN_FILE}.corrupt-{int(time.time())}"
+            logging.error(f"Не удалось загрузить блокчейн из {BLOCKCHAIN_FILE}: {e}; файл сохранён как {aside}")
+            os.replace(BLOCKCHAIN_FILE, aside)
+            blockchain.load_chain(fresh)
+            return
         logging.info(f"Загружен блокчейн из файла, блоков: {len(blockchain.chain)}")
     else:
         logging.info("Файл блокчейна не найден, создаём новый")
-
-def save_wallets():
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-    wallets_data = {
-        addr: {
-            "private_key_hex": _wallet_priv_hex(w),
-            "public_key_hex":  _wallet_pub_hex(w),
-        }
-        for addr, w in wallets.items()
-    }
-    with open(WALLETS_FILE, "w", encoding="utf-8") as f:
-        json.dump(wallets_data, f, ensure_ascii=False, indent=2)
-    logging.info(f"Сохранено кошельков: {len(wallets)}")
+        # Новый генезис: хранилище key images от прежней цепочки очищается при сверке
+        blockchain.rebuild_state()
 
 def load_wallets():
-    global wallets
+    """Открыть хранилище кошельков; wallets.json прежнего формата импортируется один раз"""
+    wallets.path = WALLET_STORE_FILE
+    wallets.index_path = os.path.splitext(WALLET_STORE_FILE)[0] + ".idx"
+    wallets.open()
     if not os.path.exists(WALLETS_FILE):
-        logging.info("Файл кошельков не найден — создаём пустой")
-        wallets = {}
         return
     try:
         with open(WALLETS_FILE, "r", encoding="utf-8") as f:
             raw = f.read().strip()
-        if not raw:
-            logging.warning("Файл кошельков пустой — создаём пустой")
-            wallets = {}
-            return
-        wallets_data = json.loads(raw)
-        out = {}
+        wallets_data = json.loads(raw) if raw else {}
+        imported = []
         for addr, info in wallets_data.items():
             priv_hex = info.get("private_key_hex")
-            if not priv_hex:
+            if not priv_hex or addr in wallets:
                 # если приватника нет — пропускаем, чтобы не падать
                 continue
-            # стандартный путь
-            if hasattr(Wallet, "from_private_key_hex"):
-                w = Wallet.from_private_key_hex(priv_hex)
-            else:
-                # если в твоём Wallet другой метод, можно добавить ещё веток
-                w = Wallet.from_private_key_hex(priv_hex)  # оставляем как есть
-            out[addr] = w
-        wallets = out
-        logging.info(f"Загружено кошельков: {len(wallets)}")
+            pub_hex = info.get("public_key_hex")
+            imported.append(Wallet.from_keys(priv_hex, pub_hex) if pub_hex else Wallet.from_private_key_hex(priv_hex))
+        wallets.add_many(imported)
+        os.replace(WALLETS_FILE, WALLETS_FILE + ".imported")
+        logging.info(f"Импортировано кошельков из {WALLETS_FILE}: {len(imported)}")
     except Exception as e:
-        logging.error(f"Не удалось загрузить кошельки: {e} — создаём пустой список")
-        wallets = {}
+        logging.error(f"Не удалось импортировать кошельки из {WALLETS_FILE}: {e}")
 
 # ==========================
 # P2P WS: СЕРВЕР
@@ -186,66 +236,179 @@ def load_wallets():
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    connected_peers.append(websocket)
-    logging.info(f"Подключён новый пир: {websocket.client.host}:{websocket.client.port}")
+    session = PeerSession(
+        f"{websocket.client.host}:{websocket.client.port}",
+        send_text=websocket.send_text,
+        send_bytes=websocket.send_bytes,
+        close_transport=websocket.close,
+        direction="inbound",
+    ).start()
+    if not peer_manager.accept_inbound(session):
+        logging.info(f"Входящее соединение от {session.address} отклонено (лимит или бан)")
+        session.close("отклонено")
+        return
+    logging.info(f"Подключён новый пир: {session.address}")
     try:
         # При подключении отправляем текущий блокчейн
-        await websocket.send_json({
+        session.enqueue_message({
             "type": "blockchain",
             "chain": [block.to_dict() for block in blockchain.chain]
         })
-        while True:
-            data = await websocket.receive_text()
-            msg = json.loads(data)
-            await handle_p2p_message(websocket, msg)
+        while not session.closed:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            data = frame.get("text")
+            await peer_manager.dispatch(session, data if data is not None else frame.get("bytes"))
     except WebSocketDisconnect:
-        if websocket in connected_peers:
-            connected_peers.remove(websocket)
-        logging.info(f"Пир отключился: {websocket.client.host}:{websocket.client.port}")
+        logging.info(f"Пир отключился: {session.address}")
+    finally:
+        session.close("соединение закрыто")
 
-async def handle_p2p_message(websocket: Optional[Any], msg: dict):
+@app.websocket("/ws/events")
+async def events_endpoint(websocket: WebSocket):
     """
-    websocket может быть:
-      - starlette.websockets.WebSocket (входящее соединение /ws)
-      - websockets.client.WebSocketClientProtocol (исходящее подключение к bootstrap)
-      - или None
+    Клиентские подписки. Запросы: {"op": "subscribe"|"unsubscribe", "topics": [...]},
+    темы: "tip", "mempool", "address:<адрес>". Ответ на подписку — {"type": "subscribed"},
+    затем текущее состояние каждой темы и далее события.
+    """
+    await websocket.accept()
+    if event_hub.stats()["clients"] >= MAX_EVENT_CLIENTS:
+        await websocket.close(code=1013)
+        return
+    session = PeerSession(
+        f"{websocket.client.host}:{websocket.client.port}",
+        send_text=websocket.send_text,
+        close_transport=websocket.close,
+        direction="client",
+        on_close=event_hub.unsubscribe,
+    ).start()
+    try:
+        while not session.closed:
+            try:
+                msg = json.loads(await websocket.receive_text())
+                op, topics = msg.get("op"), msg.get("topics") or []
+                if not isinstance(topics, list):
+                    raise ValueError("topics")
+            except (ValueError, AttributeError):
+                session.enqueue_message({"type": "error", "detail": "ожидается {op, topics: [...]}"})
+                continue
+            if op == "subscribe":
+                accepted = event_hub.subscribe(session, topics)
+                session.enqueue_message({"type": "subscribed", "topics": accepted})
+                for topic in accepted:
+                    initial = event_hub.initial_event(topic)
+                    if initial is not None:
+                        session.enqueue_message(initial)
+            elif op == "unsubscribe":
+                event_hub.unsubscribe(session, topics)
+                session.enqueue_message({"type": "unsubscribed", "topics": topics})
+            else:
+                session.enqueue_message({"type": "error", "detail": f"неизвестная операция {op!r}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.close("клиент отключился")
+
+@tracing.traced("handle_p2p_message", args=lambda peer, msg: {"type": str(msg.get("type"))})
+async def handle_p2p_message(peer: Optional[PeerSession], msg: dict):
+    """
+    peer — сессия пира (входящего или исходящего), от которого пришло сообщение;
+    ответы ставятся в её очередь. None — сообщение из локального источника.
+    Служебные hello/getaddr/addr обрабатывает peer_manager до вызова этой функции.
     """
     msg_type = msg.get("type")
 
     if msg_type == "new_block":
         block_data = msg.get("block")
-        block = Block.from_dict(block_data)
+        try:
+            block = Block.from_dict(block_data)
+        except Exception:
+            peer_manager.misbehaving(peer, 20, "некорректный формат блока")
+            return
+        await _accept_block(peer, block)
 
-        # Проверка валидности нового блока
-        if hasattr(blockchain, "is_valid_new_block"):
-            valid = blockchain.is_valid_new_block(block)
-        else:
-            prev = blockchain.get_latest_block()
-            valid = (block.previous_hash == prev.hash and block.hash == block.calculate_hash())
-
-        if valid:
-            blockchain.chain.append(block)
-            blockchain.pending_transactions.clear()
-            save_blockchain()
-            logging.info(f"Добавлен новый блок {block.index} от пира")
-            await broadcast_p2p({"type": "new_block", "block": block.to_dict()},
-                                exclude=[websocket] if websocket else [])
-        else:
-            logging.warning("Получен некорректный блок — отклонён.")
+    elif msg_type == "cmpct_block":
+        try:
+            header = msg["header"]
+            if _find_block(header["hash"]) is not None or header["hash"] in partial_blocks:
+                return
+            if header["previous_hash"] != blockchain.get_latest_block().hash:
+                # Не продолжает нашу вершину — собирать из мемпула бессмысленно
+                if header["index"] >= len(blockchain.chain) and peer:
+                    peer.enqueue_message({"type": "request_blockchain"})
+                return
+            partial = PartialBlock(msg, blockchain.pending_transactions)
+        except Exception:
+            peer_manager.misbehaving(peer, 20, "некорректный cmpct_block")
+            return
+
+        missing = partial.missing()
+        if not missing:
+            await _accept_partial_block(peer, partial)
+        elif peer:
+            if len(partial_blocks) >= MAX_PARTIAL_BLOCKS:
+                partial_blocks.pop(next(iter(partial_blocks)))
+            partial_blocks[partial.hash] = (peer, partial)
+            logging.info(f"Компактный блок {header['index']}: не хватает {len(missing)} транзакций, запрашиваем")
+            peer.enqueue_message({"type": "get_block_txn", "hash": partial.hash, "indexes": missing})
+
+    elif msg_type == "get_block_txn":
+        block_hash, indexes = msg.get("hash"), msg.get("indexes", [])
+        if not isinstance(block_hash, str) or not isinstance(indexes, list):
+            peer_manager.misbehaving(peer, 20, "некорректный get_block_txn")
+            return
+        block = _find_block(block_hash)
+        if peer and block is not None:
+            count = len(block.transactions)
+            if not all(type(i) is int and 0 <= i < count for i in indexes):
+                peer_manager.misbehaving(peer, 20, "некорректные индексы в get_block_txn")
+                return
+            txs = [block.transactions[i].to_dict() for i in indexes]
+            peer.enqueue_message({"type": "block_txn", "hash": block.hash, "transactions": txs})
+
+    elif msg_type == "block_txn":
+        block_hash = msg.get("hash")
+        if not isinstance(block_hash, str):
+            peer_manager.misbehaving(peer, 20, "некорректный block_txn")
+            return
+        requested_from, partial = partial_blocks.get(block_hash, (None, None))
+        if partial is None or peer is not requested_from:
+            # Не запрашивали (или запрашивали у другого пира) — ответ не принимаем
+            return
+        del partial_blocks[block_hash]
+        try:
+            partial.fill(msg.get("transactions", []))
+        except Exception:
+            peer_manager.misbehaving(peer, 20, "некорректный block_txn")
+            return
+        await _accept_partial_block(peer, partial)
+
+    elif msg_type == "get_block":
+        block = _find_block(msg.get("hash"))
+        if peer and block is not None:
+            peer.enqueue_message({"type": "new_block", "block": block.to_dict()})
 
     elif msg_type == "new_transaction":
         tx_data = msg.get("transaction")
-        tx = Transaction.from_dict(tx_data)
+        try:
+            tx = Transaction.from_dict(tx_data)
+        except Exception:
+            peer_manager.misbehaving(peer, 20, "некорректный формат транзакции")
+            return
         if blockchain.add_transaction(tx):
             logging.info("Добавлена новая транзакция от пира")
             await broadcast_p2p({"type": "new_transaction", "transaction": tx.to_dict()},
-                                exclude=[websocket] if websocket else [])
+                                exclude=[peer] if peer else [])
         else:
             logging.warning("Транзакция от пира отклонена")
+            # Дубликаты при рассылке — норма, штрафуем только за неверную подпись
+            if not tx.verify_signature():
+                peer_manager.misbehaving(peer, 10, "неверная подпись транзакции")
 
     elif msg_type == "request_blockchain":
-        if websocket and hasattr(websocket, "send_json"):
-            await websocket.send_json({
+        if peer:
+            peer.enqueue_message({
                 "type": "blockchain",
                 "chain": [block.to_dict() for block in blockchain.chain]
             })
@@ -254,30 +417,83 @@ async def handle_p2p_message(websocket: Optional[Any], msg: dict):
         incoming = msg.get("chain", [])
         try:
             foreign_chain = [Block.from_dict(b) for b in incoming]
-            temp = Blockchain()
-            temp.chain = foreign_chain
-            if temp.is_chain_valid() and len(foreign_chain) > len(blockchain.chain):
-                blockchain.chain = foreign_chain
-                blockchain.pending_transactions.clear()
-                save_blockchain()
+            if not blockchain.is_chain_valid(foreign_chain):
+                peer_manager.misbehaving(peer, 50, "невалидная цепочка")
+                return
+            if len(foreign_chain) > len(blockchain.chain) and blockchain.replace_chain(foreign_chain):
+                mark_chain_dirty()
                 logging.info(f"Принята более длинная цепочка от пира: длина={len(foreign_chain)}")
             else:
                 logging.info("Цепочка от пира короче/невалидна — оставляем свою")
         except Exception as e:
             logging.warning(f"Не удалось обработать присланную цепочку: {e}")
 
+def _find_block(block_hash: Optional[str]) -> Optional[Block]:
+    if not isinstance(block_hash, str):
+        return None
+    height = chain_index.block_height(block_hash)
+    return blockchain.chain[height] if height is not None else None
+
+async def _accept_partial_block(peer: Optional[PeerSession], partial: PartialBlock):
+    try:
+        block = partial.to_block()
+    except ValueError as e:
+        # Коллизия short id или другая версия транзакции — просим блок целиком
+        logging.info(f"Компактный блок не собран ({e}), запрашиваем полный")
+        if peer:
+            peer.enqueue_message({"type": "get_block", "hash": partial.hash})
+        return
+    await _accept_block(peer, block)
+
+async def _accept_block(peer: Optional[PeerSession], block: Block):
+    """Проверка и подключение блока, полученного от пира (целиком или собранного)"""
+    if block.hash != block.calculate_hash():
+        peer_manager.misbehaving(peer, 50, "хеш блока не совпадает с содержимым")
+        return
+
+    # Проверка валидности нового блока
+    valid = blockchain.is_valid_new_block(block)
+
+    if not valid and block.index >= len(blockchain.chain) and peer:
+        # Блок не продолжает нашу вершину — возможно, мы отстали: просим цепочку целиком
+        peer.enqueue_message({"type": "request_blockchain"})
+        return
+
+    if valid and blockchain.connect_block(block):
+        mark_chain_dirty()
+        logging.info(f"Добавлен новый блок {block.index} от пира")
+        await broadcast_block(block, exclude=[peer] if peer else [])
+    else:
+        logging.warning("Получен некорректный блок — отклонён.")
+
+async def broadcast_block(block: Block, exclude: List[Any] = []):
+    """
+    Рассылка нового блока: пирам с поддержкой cmpct — заголовок + короткие ID,
+    остальным — полный блок, как раньше.
+    """
+    compact, compact_cache = None, {}
+    full, full_cache = None, {}
+    for peer in list(connected_peers):
+        if peer in exclude:
+            continue
+        if "cmpct" in peer.features:
+            compact = compact or make_compact_block(block)
+            peer.enqueue_message(compact, compact_cache)
+        else:
+            full = full or {"type": "new_block", "block": block.to_dict()}
+            peer.enqueue_message(full, full_cache)
+
 async def broadcast_p2p(message: dict, exclude: List[Any] = []):
-    disconnected = []
-    for peer in connected_peers:
-        if peer and peer in exclude:
+    """
+    Неблокирующая рассылка: сообщение сериализуется один раз на каждый формат
+    (JSON / бинарный) и ставится в очередь каждого пира; отправкой занимаются
+    писатели сессий (см. peers.py).
+    """
+    cache = {}
+    for peer in list(connected_peers):
+        if peer in exclude:
             continue
-        try:
-            await peer.send_json(message)
-        except Exception:
-            disconnected.append(peer)
-    for d in disconnected:
-        if d in connected_peers:
-            connected_peers.remove(d)
+        peer.enqueue_message(message, cache)
 
 # ==========================
 # API
@@ -291,36 +507,321 @@ async def root():
         """
     )
 
+def _balance_fields(units: int) -> dict:
+    # Баланс в монетах (прежнее поле, для фронта) и точно — в единицах
+    return {"balance": to_coins(units), "balance_units": units}
+
 @app.get("/api/blockchain/info")
 async def api_blockchain_info():
+    # Сводка поддерживается ядром инкрементально — O(1), без пересчёта цепочки.
     # Совместимость и с твоими ключами, и с фронтом (totalBlocks/totalSupply)
-    info = {
-        "blocks_count": len(blockchain.chain),
-        "total_supply": blockchain.get_total_supply(),
-        "pending_transactions": len(blockchain.pending_transactions),
-        "is_valid": blockchain.is_chain_valid()
-    }
-    # дубликаты под фронт
+    return response_cache.get_or_compute("blockchain_info", (), _blockchain_info)
+
+def _blockchain_info() -> dict:
+    info = blockchain.get_summary()
+    # Суммы в ядре — целые единицы; прежние поля отдаются в монетах, точные — в *_units
     return {
         **info,
+        "total_supply": to_coins(info["total_supply"]),
+        "total_supply_units": info["total_supply"],
+        "next_reward": to_coins(info["next_reward"]),
+        "next_reward_units": info["next_reward"],
+        # дубликаты под фронт
         "totalBlocks": info["blocks_count"],
-        "totalSupply": str(info["total_supply"]),
-        "difficulty": getattr(blockchain, "difficulty", None),
+        "totalSupply": format_amount(info["total_supply"]),
+    }
+
+@app.get("/api/blockchain/verify")
+async def api_blockchain_verify():
+    # Сверка накопителей (выпуск, награда, халвинг) с полным пересчётом — O(длина цепочки)
+    return {"consistent": blockchain.verify_stats(), "state": blockchain.stats.to_dict()}
+
+@app.get("/api/node/persistence")
+async def api_node_persistence():
+    # Отставание диска от памяти и длительность последних сбросов
+    return chain_writer.stats()
+
+@app.get("/api/p2p/peers")
+async def api_p2p_peers():
+    # Глубина очередей и задержки отправки по каждому пиру + адресная книга
+    return {
+        "peers_count": len(connected_peers),
+        "peers": [peer.stats() for peer in connected_peers],
+        **peer_manager.stats(),
+    }
+
+# Размеры состояния считаются при экспорте /metrics
+metrics.gauge("anoncoin_chain_height", "Высота вершины").set_function(lambda: len(blockchain.chain) - 1)
+metrics.gauge("anoncoin_mempool_size", "Транзакций в пуле ожидания").set_function(
+    lambda: len(blockchain.pending_transactions))
+metrics.gauge("anoncoin_utxo_set_size", "Непотраченных выходов").set_function(lambda: len(blockchain.utxo_set))
+metrics.gauge("anoncoin_key_images", "Потраченных key images").set_function(
+    lambda: len(blockchain.seen_key_images))
+metrics.gauge("anoncoin_decoy_outputs", "Выходов в индексе приманок").set_function(
+    lambda: len(blockchain.output_index))
+metrics.gauge("anoncoin_peers", "Подключённых пиров").set_function(lambda: len(connected_peers))
+metrics.gauge("anoncoin_response_cache_hit_ratio", "Доля попаданий кэша ответов").set_function(
+    lambda: response_cache.stats()["hit_rate"])
+
+def _register_hd_account(hd: HDWallet, next_index: int, saved_keys: int = 0) -> dict:
+    """Счёт + адреса до next_index; регистрируются только ещё не зарегистрированные индексы"""
+    account = hd_accounts.setdefault(hd.fingerprint,
+                                     {"hd": hd, "next_index": 0, "registered": 0, "saved_keys": saved_keys})
+    account["next_index"] = max(account["next_index"], next_index)
+    for index in range(account["registered"], account["next_index"]):
+        hd_addresses[account["hd"].address(index)] = (hd.fingerprint, index)
+        blockchain.output_index.learn(account["hd"].public_key_hex(index))
+    account["registered"] = account["next_index"]
+    return account
+
+def _hd_pubkeys_line(fp: str, account: dict, start: int) -> str:
+    keys = [account["hd"].public_key_hex(i) for i in range(start, account["next_index"])]
+    return json.dumps({"id": fp, "from": start, "keys": keys}, separators=(",", ":"))
+
+def save_hd_accounts():
+    """
+    hd_accounts.json — только сиды и next_index (O(числа счетов)); публичные ключи
+    выданных адресов дописываются в журнал hd_pubkeys.jsonl, чтобы при старте не
+    считать их заново, — запись адреса стоит O(1), а не O(адресов счёта)
+    """
+    lines = []
+    for fp, acc in hd_accounts.items():
+        if acc["saved_keys"] < acc["next_index"]:
+            lines.append(_hd_pubkeys_line(fp, acc, acc["saved_keys"]))
+            acc["saved_keys"] = acc["next_index"]
+    if lines:
+        with open(HD_PUBKEYS_FILE, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    data = {
+        fp: {"seed_hex": acc["hd"].seed.hex(), "account": acc["hd"].account, "next_index": acc["next_index"]}
+        for fp, acc in hd_accounts.items()
+    }
+    atomic_write(HD_ACCOUNTS_FILE, json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8"))
+
+def _read_hd_pubkeys() -> tuple[dict[str, dict[int, str]], int]:
+    """Журнал ключей: отпечаток -> {индекс: ключ}, число строк; обрезанная последняя строка пропускается"""
+    known: dict[str, dict[int, str]] = {}
+    lines = 0
+    if os.path.exists(HD_PUBKEYS_FILE):
+        with open(HD_PUBKEYS_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    keys = known.setdefault(entry["id"], {})
+                    for index, pub_hex in enumerate(entry["keys"], int(entry["from"])):
+                        keys[index] = pub_hex
+                    lines += 1
+                except (ValueError, KeyError, TypeError):
+                    continue
+    return known, lines
+
+def load_hd_accounts():
+    hd_accounts.clear()
+    hd_addresses.clear()
+    if not os.path.exists(HD_ACCOUNTS_FILE):
+        return
+    try:
+        with open(HD_ACCOUNTS_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        known, lines = _read_hd_pubkeys()
+        for fp, info in data.items():
+            hd = HDWallet(bytes.fromhex(info["seed_hex"]), int(info.get("account", 0)))
+            journaled = known.get(fp, {})
+            saved = 0
+            while saved in journaled:
+                saved += 1
+            # Прежний формат: ключи лежали в самом hd_accounts.json (в журнал попадут при компакции)
+            hd.preload(info.get("public_keys", []))
+            hd.preload([journaled[i] for i in range(saved)])
+            _register_hd_account(hd, int(info.get("next_index", 0)), saved_keys=saved)
+        if lines > len(hd_accounts) or any(acc["saved_keys"] < acc["next_index"] for acc in hd_accounts.values()):
+            # Журнал — одной строкой на счёт (и ключи, которых в нём не было)
+            compacted = [_hd_pubkeys_line(fp, acc, 0) for fp, acc in hd_accounts.items()]
+            atomic_write(HD_PUBKEYS_FILE, ("\n".join(compacted) + "\n").encode("utf-8"))
+            for acc in hd_accounts.values():
+                acc["saved_keys"] = acc["next_index"]
+            save_hd_accounts()
+        logging.info(f"Загружено HD-счетов: {len(hd_accounts)}, адресов: {len(hd_addresses)}")
+    except Exception as e:
+        logging.error(f"Не удалось загрузить HD-счета: {e}")
+
+def _find_wallet(address: str) -> Optional[Wallet]:
+    """Кошелёк для подписи: отдельный ключ или адрес одного из HD-счетов"""
+    w = wallets.get(address)
+    if w is None and address in hd_addresses:
+        fp, index = hd_addresses[address]
+        w = hd_accounts[fp]["hd"].wallet(index)
+    return w
+
+def _coins_for(address: str) -> CoinTracker:
+    """
+    Монеты адреса: при первом обращении сканируются только блоки из индекса
+    адресов, дальше учёт ведётся по событиям цепочки. Редко используемые
+    учёты вытесняются (и отписываются от цепочки).
+    """
+    tracker = coin_trackers.get(address)
+    if tracker is not None:
+        coin_trackers.move_to_end(address)
+        return tracker
+    # Свой кошелёк — траты кольцом видны по key image монет
+    wallet = _find_wallet(address)
+    key_image_of = wallet.output_key_image if wallet is not None else None
+    tracker = CoinTracker([address], key_image_of=key_image_of).rescan(
+        blockchain, heights=address_index.heights(address))
+    blockchain.add_listener(tracker, replay=False)
+    coin_trackers[address] = tracker
+    if len(coin_trackers) > MAX_COIN_TRACKERS:
+        _, evicted = coin_trackers.popitem(last=False)
+        blockchain.remove_listener(evicted)
+    return tracker
+
+def _hd_account_info(account: dict) -> dict:
+    hd = account["hd"]
+    return {
+        "id": hd.fingerprint,
+        "account": hd.account,
+        "next_index": account["next_index"],
+        "addresses": [
+            {"index": i, "path": format_hd_path(hd.path(i)), "address": hd.address(i)}
+            for i in range(account["next_index"])
+        ],
     }
 
+def _get_hd_account(account_id: str) -> dict:
+    account = hd_accounts.get(account_id)
+    if account is None:
+        raise HTTPException(status_code=404, detail="HD account not found")
+    return account
+
+@app.post("/api/hd/account")
+async def api_hd_account(req: Request):
+    """
+    {"seed_phrase"?, "passphrase"?, "account"?, "gap_limit"?} — подключить HD-счёт.
+    Без seed_phrase создаётся новая фраза (возвращается один раз). Существующий
+    счёт сканируется по индексу адресов до gap_limit неиспользованных подряд.
+    """
+    data = await req.json()
+    phrase = data.get("seed_phrase")
+    generated = not phrase
+    if generated:
+        phrase = english_mnemonic().generate(strength=256)
+    try:
+        gap_limit = int(data.get("gap_limit", HD_GAP_LIMIT))
+        hd = HDWallet.from_mnemonic(phrase, data.get("passphrase", ""), int(data.get("account", 0)))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not 1 <= gap_limit <= 1000:
+        raise HTTPException(status_code=400, detail="gap_limit must be in 1..1000")
+
+    if generated:
+        used, next_index = [], 1
+    else:
+        used, next_index = await asyncio.to_thread(hd.scan, lambda a: address_index.count(a) > 0, gap_limit)
+        next_index = max(next_index, 1)
+    account = _register_hd_account(hd, next_index)
+    save_hd_accounts()
+    info = _hd_account_info(account)
+    info["used"] = used
+    if generated:
+        info["seed_phrase"] = phrase
+    return info
+
+@app.get("/api/hd/{account_id}")
+async def api_hd_account_info(account_id: str):
+    account = _get_hd_account(account_id)
+    info = _hd_account_info(account)
+    for item in info["addresses"]:
+        item.update(_balance_fields(blockchain.get_balance(item["address"])))
+    return info
+
+@app.post("/api/hd/{account_id}/address")
+async def api_hd_next_address(account_id: str):
+    # Следующий адрес счёта: один HMAC от закешированного родителя и одно умножение точки
+    account = _get_hd_account(account_id)
+    hd, index = account["hd"], account["next_index"]
+    _register_hd_account(hd, index + 1)
+    save_hd_accounts()
+    return {"index": index, "path": format_hd_path(hd.path(index)), "address": hd.address(index)}
+
+@app.post("/api/hd/{account_id}/scan")
+async def api_hd_scan(account_id: str, req: Request):
+    """{"gap_limit"?} — пересканировать счёт (например, после синхронизации цепочки)"""
+    account = _get_hd_account(account_id)
+    data = await req.json() if await req.body() else {}
+    try:
+        gap_limit = int(data.get("gap_limit", HD_GAP_LIMIT))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="gap_limit must be an integer")
+    if not 1 <= gap_limit <= 1000:
+        raise HTTPException(status_code=400, detail="gap_limit must be in 1..1000")
+    used, next_index = await asyncio.to_thread(account["hd"].scan, lambda a: address_index.count(a) > 0, gap_limit)
+    _register_hd_account(account["hd"], next_index)
+    save_hd_accounts()
+    return {"id": account_id, "used": used, "next_index": account["next_index"]}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/node/cache")
+async def api_node_cache():
+    # Попадания/промахи кэша ответов по эндпоинтам
+    return response_cache.stats()
+
+@app.get("/api/events/stats")
+async def api_events_stats():
+    return event_hub.stats()
+
 @app.post("/api/wallet/create")
 async def api_create_wallet():
     w = Wallet()
     addr = w.get_address()
-    wallets[addr] = w
-    save_wallets()
-    balance = blockchain.get_balance(addr)
+    wallets.add(w)
+    blockchain.output_index.learn(w.public_key_hex)
     return {
         "address": addr,
-        "balance": balance,
+        **_balance_fields(blockchain.get_balance(addr)),
         "public_key": _wallet_pub_hex(w),
     }
 
+MAX_BULK_WALLETS = 10000
+_key_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_key_pool() -> Optional[ProcessPoolExecutor]:
+    """Пул процессов для генерации ключей; на одноядерной машине не нужен"""
+    global _key_pool
+    if _key_pool is None and (os.cpu_count() or 1) > 1:
+        _key_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _key_pool
+
+@app.post("/api/wallet/create/bulk")
+async def api_create_wallets_bulk(req: Request):
+    """{"count": N} — N кошельков: ключи в пуле процессов, одна запись хранилища на весь пакет"""
+    data = await req.json()
+    try:
+        count = int(data.get("count", 0))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="count must be an integer")
+    if not 1 <= count <= MAX_BULK_WALLETS:
+        raise HTTPException(status_code=400, detail=f"count must be in 1..{MAX_BULK_WALLETS}")
+
+    started = time.perf_counter()
+    created = await asyncio.to_thread(generate_wallets, count, _get_key_pool())
+    wallets.add_many(created)
+    for w in created:
+        blockchain.output_index.learn(w.public_key_hex)
+    if wallets.needs_compaction():
+        wallets.compact()
+    elapsed = time.perf_counter() - started
+    # Новые ключи: баланс заведомо нулевой, цепочку не сканируем
+    return {
+        "created": len(created),
+        "seconds": round(elapsed, 3),
+        "wallets": [{"address": w.get_address(), **_balance_fields(0), "public_key": w.public_key_hex} for w in created],
+    }
+
 @app.post("/api/wallet/recover")
 async def api_recover_wallet(req: Request):
     data = await req.json()
@@ -333,42 +834,181 @@ async def api_recover_wallet(req: Request):
         # если у тебя другая сигнатура, тут можно добавить альтернативы
         w = Wallet.from_private_key_hex(priv_hex)
     addr = w.get_address()
-    wallets[addr] = w
-    save_wallets()
-    balance = blockchain.get_balance(addr)
+    wallets.add(w)
+    blockchain.output_index.learn(w.public_key_hex)
     return {
         "address": addr,
-        "balance": balance,
+        **_balance_fields(blockchain.get_balance(addr)),
         "public_key": _wallet_pub_hex(w),
     }
 
+@app.get("/api/address/{address}/transactions")
+async def api_address_transactions(address: str, cursor: Optional[str] = None, limit: int = 50):
+    # История адреса по индексу, от новых к старым; next_cursor — для следующей страницы
+    try:
+        page, next_cursor = address_index.history(address, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    tip_height = len(blockchain.chain) - 1
+    items = []
+    for height, position in page:
+        block = blockchain.chain[height]
+        tx = block.transactions[position]
+        items.append({
+            "height": height,
+            "position": position,
+            "block_hash": block.hash,
+            "confirmations": tip_height - height + 1,
+            "txid": generate_transaction_id(tx),
+            "transaction": tx.to_dict(),
+        })
+    return {
+        "address": address,
+        "total": address_index.count(address),
+        "transactions": items,
+        "next_cursor": next_cursor,
+    }
+
+def _cacheable(request: Request, payload: Any, etag: str, cache_control: str):
+    """JSON с ETag и Cache-Control из _cache_control; совпавший If-None-Match — 304"""
+    etag = f'"{etag}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+def _is_final(height: int) -> bool:
+    return len(blockchain.chain) - height >= FINAL_CONFIRMATIONS
+
+def _cache_control(height: int, by_hash: bool = False) -> str:
+    """
+    Неподтверждённое — no-cache (только ревалидация). Подтверждённый блок по хешу —
+    immutable: хеш определяет содержимое. Высота и txid — лишь короткий max-age:
+    replace_chain принимает любую более длинную цепочку (даже с другим генезисом),
+    а txid coinbase-транзакций могут совпадать, так что по ним может прийти другое.
+    """
+    if not _is_final(height):
+        return "no-cache"
+    return "public, max-age=31536000, immutable" if by_hash else f"public, max-age={FINAL_MAX_AGE}"
+
+@app.get("/api/block/{ref}")
+async def api_block(ref: str, request: Request):
+    # ref — высота (число) или хеш блока
+    by_hash = not (ref.isdigit() and len(ref) < 64)
+    height = chain_index.block_height(ref) if by_hash else int(ref)
+    if height is None or not 0 <= height < len(blockchain.chain):
+        raise HTTPException(status_code=404, detail="Block not found")
+    block = blockchain.chain[height]
+    return _cacheable(request, {"height": height, "block": block.to_dict()},
+                      etag=block.hash, cache_control=_cache_control(height, by_hash))
+
+@app.get("/api/tx/{txid}")
+async def api_tx(txid: str, request: Request):
+    location = chain_index.tx_location(txid)
+    if location is None:
+        # Неподтверждённая — ищем в мемпуле, без кэширования
+        for tx in blockchain.pending_transactions:
+            if generate_transaction_id(tx) == txid:
+                return JSONResponse({"txid": txid, "height": None, "block_hash": None,
+                                     "transaction": tx.to_dict()},
+                                    headers={"Cache-Control": "no-store"})
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    height, position = location
+    block = blockchain.chain[height]
+    payload = {
+        "txid": txid,
+        "height": height,
+        "position": position,
+        "block_hash": block.hash,
+        "transaction": block.transactions[position].to_dict(),
+    }
+    return _cacheable(request, payload, etag=f"{block.hash}:{position}", cache_control=_cache_control(height))
+
+@app.get("/api/blocks")
+async def api_blocks(request: Request, limit: int = 20, start: int = Query(0, alias="from")):
+    limit = max(1, min(limit, BLOCKS_PAGE_LIMIT))
+    if start < 0:
+        raise HTTPException(status_code=400, detail="from must be >= 0")
+    blocks = blockchain.chain[start:start + limit]
+    payload = {
+        "from": start,
+        "blocks": [block.to_dict() for block in blocks],
+        "next": start + len(blocks) if start + len(blocks) < len(blockchain.chain) else None,
+    }
+    # Полная страница подтверждённых блоков меняется только при смене цепочки
+    last = blocks[-1] if blocks else None
+    final = last is not None and len(blocks) == limit
+    return _cacheable(request, payload,
+                      etag=f"{start}-{limit}-{last.hash if last else blockchain.stats.tip_hash}",
+                      cache_control=_cache_control(last.index) if final else "no-cache")
+
+@app.get("/api/chain/export")
+async def api_chain_export(start: int = Query(0, alias="from"), format: str = "ndjson",
+                           compression: Optional[str] = None):
+    """Вся цепочка от высоты from потоком (chunked), память не зависит от длины цепочки"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format: {', '.join(EXPORT_FORMATS)}")
+    if compression not in (None, "zlib", "zstd") or (compression and format != "bin1"):
+        raise HTTPException(status_code=400, detail="compression: zlib|zstd, только для bin1")
+    if start < 0:
+        raise HTTPException(status_code=400, detail="from must be >= 0")
+    return StreamingResponse(
+        stream_chain(blockchain, start, format, compression),
+        media_type=EXPORT_FORMATS[format],
+        headers={"X-Chain-Height": str(len(blockchain.chain) - 1)},
+    )
+
 @app.post("/api/wallet/{address}")
 async def api_wallet_info(address: str):
-    bal = blockchain.get_balance(address)
-    return {"address": address, "balance": bal}
+    bal = response_cache.get_or_compute("wallet_info", address, lambda: blockchain.get_balance(address))
+    return {"address": address, **_balance_fields(bal)}
+
+@app.get("/api/wallet/{address}/utxos")
+async def api_wallet_utxos(address: str):
+    # Монеты адреса из его учёта (курсор — лучший блок, до которого учёт актуален)
+    tracker = _coins_for(address)
+    return {
+        "address": address,
+        **_balance_fields(tracker.balance()),
+        "best_height": tracker.best_height,
+        "best_hash": tracker.best_hash,
+        "utxos": [out.to_dict() for out in tracker.available()],
+    }
 
 @app.post("/api/transaction/send")
 async def api_send_transaction(req: Request):
     data = await req.json()
     sender_addr = data.get("sender")
     receiver    = data.get("receiver")
-    amount      = float(data.get("amount"))
     anonymous   = data.get("anonymous", False)
+    # amount — в монетах (как вводит пользователь), amount_units — точно в единицах
+    try:
+        if data.get("amount_units") is not None:
+            amount = strict_units(data["amount_units"])   # 1.9 — ошибка, а не 1
+        else:
+            amount = parse_amount(data.get("amount"))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"invalid amount: {e}")
+    if amount <= 0:
+        raise HTTPException(status_code=400, detail="amount must be positive")
 
     if not sender_addr or not receiver:
         raise HTTPException(status_code=400, detail="sender and receiver required")
 
-    if sender_addr not in wallets:
+    sender_wallet = _find_wallet(sender_addr)
+    if sender_wallet is None:
         raise HTTPException(status_code=400, detail="Sender wallet not found")
 
-    sender_wallet = wallets[sender_addr]
     balance = blockchain.get_balance(sender_addr)
     if balance < amount:
         raise HTTPException(status_code=400, detail="Insufficient funds")
 
     try:
         if anonymous and hasattr(sender_wallet, "create_anonymous_transaction"):
-            tx = sender_wallet.create_anonymous_transaction(receiver, amount)
+            sender_wallet.coins = _coins_for(sender_addr)
+            tx = sender_wallet.create_anonymous_transaction(receiver, amount, blockchain=blockchain)
+            if tx is None:
+                raise HTTPException(status_code=400, detail="No unspent coin covers the amount")
         else:
             tx = Transaction(sender_wallet.public_key_hex, receiver, amount)
             # Подписываем транзакцию кошельком (поддержка твоего Wallet)
@@ -376,10 +1016,12 @@ async def api_send_transaction(req: Request):
                 tx.sign_transaction(sender_wallet)
         if blockchain.add_transaction(tx):
             await broadcast_p2p({"type": "new_transaction", "transaction": tx.to_dict()})
-            save_blockchain()
+            mark_chain_dirty()
             return {"success": True}
         else:
             raise HTTPException(status_code=500, detail="Failed to add transaction")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -387,10 +1029,10 @@ async def api_send_transaction(req: Request):
 async def api_start_mining(req: Request):
     data = await req.json()
     miner_addr = data.get("miner_address")
-    if miner_addr not in wallets:
+    miner_wallet = _find_wallet(miner_addr)
+    if miner_wallet is None:
         raise HTTPException(status_code=400, detail="Miner wallet not found")
 
-    miner_wallet = wallets[miner_addr]
     # Запускаем майнинг асинхронно, чтобы не блокировать сервер
     asyncio.create_task(run_mining(miner_wallet))
     return {"success": True, "message": "Mining started", "difficulty": getattr(blockchain, "difficulty", None)}
@@ -399,66 +1041,139 @@ async def run_mining(miner_wallet: Wallet):
     try:
         blockchain.mine_pending_transactions(miner_wallet.get_address())
         latest_block = blockchain.get_latest_block()
-        await broadcast_p2p({"type": "new_block", "block": latest_block.to_dict()})
-        save_blockchain()
+        await broadcast_block(latest_block)
+        mark_chain_dirty()
         logging.info(f"Замайнен новый блок {latest_block.index} майнером {miner_wallet.get_address()[:16]}")
     except Exception as e:
         logging.error(f"Ошибка майнинга: {e}")
 
 # ==========================
-# АВТОПОДКЛЮЧЕНИЕ К BOOTSTRAP-НОДАМ
+# ТРАССИРОВКА (по запросу)
 # ==========================
-# Требуется библиотека:
-#    pip install websockets
-import websockets  # клиент для исходящих WS-подключений
+stack_sampler: Optional[tracing.StackSampler] = None
+# Эндпоинты /api/debug/trace/* (частое сэмплирование, запись файлов) выключены,
+# пока узел не запущен с ANONCOIN_DEBUG_API=1; ANONCOIN_TRACE от них не зависит
+DEBUG_API_ENABLED = os.environ.get("ANONCOIN_DEBUG_API", "") not in ("", "0")
 
-async def _peer_loop(node_ws_url: str):
-    """Постоянно поддерживаем подключение к bootstrap-ноде и обрабатываем сообщения."""
-    while True:
-        try:
-            async with websockets.connect(node_ws_url, ping_interval=20, ping_timeout=20) as ws:
-                logging.info(f"Подключено к bootstrap ноде: {node_ws_url}")
-                # Запрашиваем у узла их текущую цепочку
-                await ws.send(json.dumps({"type": "request_blockchain"}))
-
-                while True:
-                    raw = await ws.recv()  # строка
-                    try:
-                        msg = json.loads(raw)
-                    except Exception:
-                        if isinstance(raw, dict):
-                            msg = raw
-                        else:
-                            logging.warning("Получено не-JSON сообщение от пира — игнор")
-                            continue
-                    await handle_p2p_message(None, msg)
-        except Exception as e:
-            logging.warning(f"Связь с {node_ws_url} потеряна/не установлена: {e}. Повтор через 5с")
-            await asyncio.sleep(5)
+def _require_debug_api():
+    if not DEBUG_API_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/api/debug/trace")
+async def api_trace_status():
+    _require_debug_api()
+    return {**tracing.stats(), "sampling": bool(stack_sampler and stack_sampler.running),
+            "samples": stack_sampler.samples if stack_sampler else 0}
+
+@app.post("/api/debug/trace/start")
+async def api_trace_start(req: Request):
+    """{"sampling": bool, "interval_ms": float} — включить спаны и (опционально) сэмплирование стеков"""
+    global stack_sampler
+    _require_debug_api()
+    data = await req.json() if await req.body() else {}
+    tracing.clear()
+    tracing.enable()
+    if data.get("sampling"):
+        if stack_sampler:
+            stack_sampler.stop()
+        interval = float(data.get("interval_ms", tracing.SAMPLE_INTERVAL * 1000)) / 1000
+        stack_sampler = tracing.StackSampler(max(interval, 0.001)).start()
+    return await api_trace_status()
 
-async def connect_bootstrap_nodes():
-    tasks = []
-    for node in BOOTSTRAP_NODES:
-        tasks.append(asyncio.create_task(_peer_loop(node)))
-    # держим задачи активными
-    await asyncio.gather(*tasks)
+@app.post("/api/debug/trace/stop")
+async def api_trace_stop():
+    """Выключить трассировку и записать trace-*.json (Chrome) и trace-*.folded (flamegraph) в DATA_DIR/traces"""
+    global stack_sampler
+    _require_debug_api()
+    tracing.disable()
+    out_dir = os.path.join(DATA_DIR, "traces")
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    result = {"chrome_trace": os.path.join(out_dir, f"trace-{stamp}.json")}
+    result["spans"] = await asyncio.to_thread(tracing.write_chrome_trace, result["chrome_trace"])
+    if stack_sampler:
+        stack_sampler.stop()
+        result["folded"] = os.path.join(out_dir, f"trace-{stamp}.folded")
+        result["samples"] = tracing.write_folded(result["folded"], stack_sampler)
+        stack_sampler = None
+    return result
 
+# ==========================
+# ИСХОДЯЩИЕ ПОДКЛЮЧЕНИЯ
+# ==========================
 @app.on_event("startup")
 async def _startup_connect_peers():
-    # не блокируем сервер — соединения к bootstrap пойдут в фоне
-    asyncio.create_task(connect_bootstrap_nodes())
+    # не блокируем сервер — менеджер пиров подключается к bootstrap и найденным адресам в фоне
+    peer_manager.handle_message = handle_p2p_message
+    asyncio.create_task(peer_manager.run())
+    chain_writer.start()
+    if address_index.pending_journal:
+        chain_writer.mark_dirty()
+    # ANONCOIN_TRACE=1 включает спаны с самого старта, ANONCOIN_TRACE_SAMPLING=1 — ещё и сэмплер
+    global stack_sampler
+    if tracing.is_enabled() and os.environ.get("ANONCOIN_TRACE_SAMPLING", "") not in ("", "0"):
+        stack_sampler = tracing.StackSampler().start()
+
+@app.on_event("shutdown")
+async def _shutdown_flush():
+    # дописываем всё, что не успел сбросить фоновый писатель
+    await chain_writer.close()
+    if _key_pool is not None:
+        _key_pool.shutdown(cancel_futures=True)
+    wallets.close()
+    if blockchain is not None:
+        blockchain.seen_key_images.close()
 
 # ==========================
 # СТАРТ УЗЛА
 # ==========================
-def start_node(host="0.0.0.0", port=8000):
+def start_node(host="0.0.0.0", port=8000, data_dir: Optional[str] = None,
+               bootstrap: Optional[List[str]] = None, public_url: Optional[str] = None):
     global blockchain
+    if data_dir:
+        configure_data_dir(data_dir)
+    if bootstrap is not None:
+        peer_manager.book.clear()
+        for url in bootstrap:
+            peer_manager.add_address(url, source="bootstrap")
+    # Адрес, который сообщаем пирам в hello (и по которому отсекаем подключение к себе)
+    public_host = "127.0.0.1" if host in ("0.0.0.0", "::") else host
+    peer_manager.listen_url = public_url or os.environ.get("ANONCOIN_PUBLIC_URL") or f"ws://{public_host}:{port}/ws"
+    peer_manager.book.pop(peer_manager.listen_url, None)
+
     blockchain = Blockchain()  # твой PoW уже внутри ядра
+    # Потраченные key images на диске; сверяются с цепочкой при её загрузке
+    blockchain.seen_key_images = KeyImageStore(KEY_IMAGES_FILE).open()
+    address_index.path = ADDRESS_INDEX_FILE
+    address_index.load()
+    blockchain.add_listener(address_index)
+    blockchain.add_listener(chain_index)
+    event_hub.blockchain = blockchain
+    response_cache.blockchain = blockchain
+    blockchain.add_listener(response_cache, replay=False)
+    blockchain.add_listener(event_hub, replay=False)
     load_blockchain()
+    if address_index.needs_compaction(len(blockchain.chain)):
+        address_index.compact(blockchain.chain)
     load_wallets()
+    load_hd_accounts()
     logging.info("anonCoin узел запущен")
     uvicorn.run(app, host=host, port=port)
 
 if __name__ == "__main__":
-    start_node()
+    parser = argparse.ArgumentParser(description="anonCoin Full Node")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data-dir", default=None, help="каталог данных (по умолчанию ./data)")
+    parser.add_argument("--bootstrap", default=None,
+                        help="WS-адреса bootstrap-нод через запятую (пусто — без bootstrap)")
+    parser.add_argument("--public-url", default=None, help="WS-адрес этого узла для других пиров")
+    args = parser.parse_args()
+    start_node(
+        host=args.host,
+        port=args.port,
+        data_dir=args.data_dir,
+        bootstrap=[u.strip() for u in args.bootstrap.split(",") if u.strip()] if args.bootstrap is not None else None,
+        public_url=args.public_url,
+    )
 
@@ -0,0 +1,67 @@
+"""
+Потоковый экспорт цепочки anonCoin (GET /api/chain/export).
+
+Блоки отдаются по одному, начиная с заданной высоты, без построения общего
+списка: память не зависит от длины цепочки. Форматы:
+
+  ndjson — одна строка JSON (Block.to_dict()) на блок;
+  bin1   — последовательность кадров wire.py с сообщением {"type": "block", "block": ...}.
+
+Если во время экспорта произошла реорганизация, поток обрывается на последнем
+блоке, продолжающем уже отданную часть: клиент докачивает с новой высоты.
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator, BinaryIO, Iterator
+
+from anoncoin_core import Block
+from wire import decode_frame, encode_frame, read_frame
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "bin1": "application/octet-stream",
+}
+EXPORT_BATCH = 64  # блоков на один chunk ответа
+
+
+def encode_block_record(block: Block, fmt: str, compression: str | None = None) -> bytes:
+    if fmt == "bin1":
+        return encode_frame({"type": "block", "block": block.to_dict()}, compression)
+    return json.dumps(block.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+async def stream_chain(blockchain, start: int = 0, fmt: str = "ndjson",
+                       compression: str | None = None) -> AsyncIterator[bytes]:
+    """
+    Чанки экспорта от высоты start до текущей вершины. Между чанками
+    управление возвращается event loop, так что долгий экспорт не блокирует узел.
+    """
+    height, prev_hash = start, None
+    while True:
+        chain = blockchain.chain
+        if height >= len(chain):
+            return
+        batch = []
+        for block in chain[height:height + EXPORT_BATCH]:
+            if prev_hash is not None and block.previous_hash != prev_hash:
+                # Цепочка сменилась под экспортом — отданное уже не продолжается
+                if batch:
+                    yield b"".join(batch)
+                return
+            batch.append(encode_block_record(block, fmt, compression))
+            prev_hash = block.hash
+        height += len(batch)
+        yield b"".join(batch)
+        await asyncio.sleep(0)
+
+
+def read_export(stream: BinaryIO, fmt: str = "ndjson") -> Iterator[Block]:
+    """Блоки из потока экспорта (файл или тело HTTP-ответа) — для массового импорта"""
+    if fmt == "bin1":
+        while (frame := read_frame(stream)) is not None:
+            yield Block.from_dict(decode_frame(frame)["block"])
+        return
+    for line in stream:
+        if line.strip():
+            yield Block.from_dict(json.loads(line))
@@ -0,0 +1,204 @@
+"""
+Индексы поверх цепочки anonCoin, обновляемые по событиям подключения/отключения
+блоков (см. Blockchain.add_listener).
+
+ChainIndex: хеш блока -> высота, txid -> (высота, позиция), только в памяти.
+
+AddressIndex: адрес -> [(высота, позиция транзакции в блоке), ...] по возрастанию.
+На диске хранится журнал (JSON Lines) с записью на каждый подключённый блок.
+При загрузке записи с совпадающим хешем блока берутся из журнала, остальные
+пересчитываются по цепочке — поэтому устаревший или оборванный журнал безопасен.
+"""
+
+import json
+import logging
+import os
+from bisect import bisect_left
+from typing import Optional
+
+from anoncoin_core import generate_transaction_id
+from persistence import atomic_write
+
+HISTORY_PAGE_LIMIT = 100  # максимум записей на страницу истории адреса
+
+
+def tx_addresses(tx) -> list[str]:
+    """
+    Адреса, затронутые транзакцией. Для анонимных — только получатель и выходы:
+    отправитель скрыт и в индекс не попадает.
+    """
+    seen = []
+    if tx.tx_type != "anonymous":
+        sender = tx.get_sender_address()
+        if sender:
+            seen.append(sender)
+    if tx.receiver_address and tx.receiver_address not in seen:
+        seen.append(tx.receiver_address)
+    for out in tx.outputs or []:
+        if out.address and out.address not in seen:
+            seen.append(out.address)
+    return seen
+
+
+def encode_cursor(height: int, position: int) -> str:
+    return f"{height}:{position}"
+
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    height, position = cursor.split(":", 1)
+    return int(height), int(position)
+
+
+class AddressIndex:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._map: dict[str, list[tuple[int, int]]] = {}
+        self._cache: dict[int, dict[str, list]] = {}   # высота -> {хеш блока: записи} из журнала
+        self._journal: list[str] = []                  # ещё не записанные строки журнала
+        self.journal_lines = 0                         # строк в файле журнала
+        self.cache_hits = 0
+
+    # ---------- события цепочки ----------
+    def on_chain_reset(self):
+        self._map = {}
+
+    def on_block_connected(self, block):
+        entries = self._cache.get(block.index, {}).pop(block.hash, None)
+        if entries is not None:
+            self.cache_hits += 1
+        else:
+            entries = [[addr, pos] for pos, tx in enumerate(block.transactions) for addr in tx_addresses(tx)]
+            self._journal.append(json.dumps({"h": block.index, "hash": block.hash, "e": entries},
+                                            separators=(",", ":")))
+        height = block.index
+        for addr, pos in entries:
+            self._map.setdefault(addr, []).append((height, pos))
+
+    def on_block_disconnected(self, block):
+        height = block.index
+        for pos, tx in enumerate(block.transactions):
+            for addr in tx_addresses(tx):
+                items = self._map.get(addr)
+                while items and items[-1][0] == height:
+                    items.pop()
+                if items is not None and not items:
+                    del self._map[addr]
+
+    # ---------- запросы ----------
+    def count(self, address: str) -> int:
+        return len(self._map.get(address, ()))
+
+    def heights(self, address: str, start_height: int = 0) -> list[int]:
+        """Высоты блоков, затрагивающих адрес (по возрастанию, без повторов)"""
+        items = self._map.get(address, [])
+        result = []
+        for height, _ in items[bisect_left(items, (start_height, -1)):]:
+            if not result or result[-1] != height:
+                result.append(height)
+        return result
+
+    def history(self, address: str, cursor: Optional[str] = None,
+                limit: int = 50) -> tuple[list[tuple[int, int]], Optional[str]]:
+        """
+        Страница истории от новых к старым. cursor — значение next_cursor прошлой
+        страницы. O(log n + limit) на любой длине цепочки.
+        """
+        items = self._map.get(address, [])
+        limit = max(1, min(limit, HISTORY_PAGE_LIMIT))
+        end = len(items) if cursor is None else bisect_left(items, decode_cursor(cursor))
+        start = max(0, end - limit)
+        page = items[start:end][::-1]
+        next_cursor = encode_cursor(*items[start]) if start > 0 else None
+        return page, next_cursor
+
+    # ---------- хранение ----------
+    def load(self):
+        """Прочитать журнал в кэш; применится при последующей пересборке состояния цепочки"""
+        self._cache = {}
+        if not self.path or not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    rec = json.loads(line)
+                    self._cache.setdefault(int(rec["h"]), {})[rec["hash"]] = rec["e"]
+                except (ValueError, KeyError, TypeError):
+                    continue  # оборванная последняя строка после сбоя
+        self.journal_lines = lines
+        logging.info(f"Индекс адресов: в журнале {len(self._cache)} блоков ({lines} строк)")
+
+    @property
+    def pending_journal(self) -> int:
+        return len(self._journal)
+
+    def drain_journal(self) -> list[str]:
+        lines, self._journal = self._journal, []
+        return lines
+
+    def append_journal(self, lines: list[str]) -> int:
+        """Дописать строки журнала (вызывается из потока фоновой записи)"""
+        if not self.path or not lines:
+            return 0
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_lines += len(lines)
+        return len(data)
+
+    def needs_compaction(self, chain_length: int) -> bool:
+        """После реорганизаций в журнале копятся записи отключённых блоков"""
+        return self.journal_lines > 2 * chain_length + 100
+
+    def compact(self, chain: list):
+        """Переписать журнал только актуальными блоками цепочки (из индекса в памяти)"""
+        if not self.path:
+            return
+        by_height: dict[int, list] = {}
+        for addr, items in self._map.items():
+            for height, pos in items:
+                by_height.setdefault(height, []).append([addr, pos])
+        lines = []
+        for block in chain:
+            entries = sorted(by_height.get(block.index, []), key=lambda e: e[1])
+            lines.append(json.dumps({"h": block.index, "hash": block.hash, "e": entries}, separators=(",", ":")))
+        atomic_write(self.path, ("\n".join(lines) + "\n").encode("utf-8"))
+        self._cache = {}
+        self._journal = []
+        self.journal_lines = len(lines)
+
+
+class ChainIndex:
+    """
+    Хеш блока -> высота и txid -> (высота, позиция). Для совпадающих txid
+    (одинаковые coinbase в одну секунду) хранится последнее вхождение.
+    """
+
+    def __init__(self):
+        self._blocks: dict[str, int] = {}
+        self._txs: dict[str, tuple[int, int]] = {}
+
+    def on_chain_reset(self):
+        self._blocks = {}
+        self._txs = {}
+
+    def on_block_connected(self, block):
+        self._blocks[block.hash] = block.index
+        for pos, tx in enumerate(block.transactions):
+            self._txs[generate_transaction_id(tx)] = (block.index, pos)
+
+    def on_block_disconnected(self, block):
+        self._blocks.pop(block.hash, None)
+        for pos, tx in enumerate(block.transactions):
+            txid = generate_transaction_id(tx)
+            if self._txs.get(txid) == (block.index, pos):
+                del self._txs[txid]
+
+    def block_height(self, block_hash: str) -> Optional[int]:
+        return self._blocks.get(block_hash)
+
+    def tx_location(self, txid: str) -> Optional[tuple[int, int]]:
+        return self._txs.get(txid)
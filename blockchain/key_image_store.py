@@ -0,0 +1,228 @@
+"""
+Множество потраченных key images: компактно и (по желанию) на диске.
+
+Key image хранится как sha256 своей hex-строки — 32 байта вместо объекта str
+в set. Основная часть — отсортированный массив дайджестов (в файле — mmap,
+без пути — bytes в памяти), перед ним фильтр Блума: отсутствующий key image
+(обычный случай для новой транзакции) отсекается без поиска по массиву.
+Свежие изменения копятся в двух небольших множествах: добавленные и
+удалённые из массива (откат блоков при реорганизации). После
+COMPACT_THRESHOLD изменений они сливаются с массивом в новый файл.
+
+Файл описывает вершину цепочки, для которой он записан (высота и хеш блока).
+При пересборке состояния Blockchain сверяет её с загруженной цепочкой
+(resume): если блок на месте, key images до него уже в хранилище и заново
+не вставляются, иначе хранилище очищается и заполняется с генезиса.
+
+    key_images.dat: заголовок | count × 32 байта (по возрастанию) | фильтр Блума
+"""
+
+import logging
+import mmap
+import os
+import struct
+from hashlib import sha256
+from heapq import merge
+from typing import Optional
+
+from persistence import atomic_write
+
+HEADER = struct.Struct(">4sIq32sI")    # магия, число дайджестов, высота вершины, хеш вершины, байт фильтра
+MAGIC = b"AKI1"
+DIGEST_SIZE = 32
+COMPACT_THRESHOLD = 50_000   # изменений вне массива — пора переписать файл
+BLOOM_BITS_PER_ITEM = 10     # ~1% ложных срабатываний при BLOOM_HASHES = 7
+BLOOM_HASHES = 7
+BLOOM_MIN_ITEMS = 1 << 16
+_BLOOM_SLICES = struct.Struct(f">{BLOOM_HASHES}I")
+
+
+def digest(text: str) -> bytes:
+    return sha256(text.encode("utf-8")).digest()
+
+
+class KeyImageStore:
+    """
+    Замена set[str] для Blockchain.seen_key_images: add / discard / in / len / clear,
+    плюс вершина цепочки, которой соответствует содержимое (commit / resume).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.height = -1                   # вершина, которой соответствует содержимое
+        self._tip = b""
+        self._base: bytes | mmap.mmap = b""
+        self._offset = 0                   # начало массива в _base (у файла — после заголовка)
+        self._count = 0                    # дайджестов в массиве
+        self._added: set[bytes] = set()    # вне массива
+        self._removed: set[bytes] = set()  # есть в массиве, но удалены
+        self._bloom = bytearray()
+        self._bloom_bits = 0
+        self._dirty = False
+        self._reset_bloom(BLOOM_MIN_ITEMS)
+
+    # ---------- открытие / закрытие ----------
+    def open(self):
+        """Отобразить файл в память; повреждённый или чужой файл игнорируется"""
+        self._release()
+        if not self.path or not os.path.exists(self.path) or os.path.getsize(self.path) < HEADER.size:
+            return self
+        with open(self.path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, height, tip, bloom_bytes = HEADER.unpack_from(data)
+        end = HEADER.size + count * DIGEST_SIZE
+        if magic != MAGIC or len(data) != end + bloom_bytes or not bloom_bytes:
+            logging.warning("Хранилище key images повреждено, будет заполнено заново по цепочке")
+            data.close()
+            return self
+        self._base, self._offset, self._count = data, HEADER.size, count
+        self.height, self._tip = height, tip
+        self._bloom = bytearray(data[end:])
+        self._bloom_bits = bloom_bytes * 8
+        logging.info(f"Хранилище key images: {count} на высоте {height}")
+        return self
+
+    def close(self):
+        self.flush()
+        self._release()
+
+    def _release(self):
+        if isinstance(self._base, mmap.mmap):
+            self._base.close()
+        self._base, self._offset, self._count = b"", 0, 0
+        self._added, self._removed = set(), set()
+
+    # ---------- фильтр Блума ----------
+    def _reset_bloom(self, items: int):
+        size = max(items, BLOOM_MIN_ITEMS) * BLOOM_BITS_PER_ITEM // 8
+        self._bloom = bytearray(size)
+        self._bloom_bits = size * 8
+
+    def _bloom_add(self, key: bytes):
+        bloom, bits = self._bloom, self._bloom_bits
+        for h in _BLOOM_SLICES.unpack_from(key):
+            bit = h % bits
+            bloom[bit >> 3] |= 1 << (bit & 7)
+
+    def _bloom_may_contain(self, key: bytes) -> bool:
+        bloom, bits = self._bloom, self._bloom_bits
+        for h in _BLOOM_SLICES.unpack_from(key):
+            bit = h % bits
+            if not bloom[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    # ---------- поиск ----------
+    def _in_base(self, key: bytes) -> bool:
+        base, lo, hi = self._base, 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self._offset + mid * DIGEST_SIZE
+            probe = base[offset:offset + DIGEST_SIZE]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def _contains(self, key: bytes) -> bool:
+        if not self._bloom_may_contain(key):
+            return False
+        if key in self._added:
+            return True
+        return key not in self._removed and self._in_base(key)
+
+    def __contains__(self, key_image: str) -> bool:
+        return self._contains(digest(key_image))
+
+    def __len__(self) -> int:
+        return self._count - len(self._removed) + len(self._added)
+
+    # ---------- изменения ----------
+    def add(self, key_image: str):
+        key = digest(key_image)
+        if key in self._removed:
+            self._removed.discard(key)
+        elif not self._contains(key):
+            self._added.add(key)
+            self._bloom_add(key)
+        self._dirty = True
+
+    def discard(self, key_image: str):
+        """Удаление (откат блока); биты фильтра остаются до следующей перестройки"""
+        key = digest(key_image)
+        if key in self._added:
+            self._added.discard(key)
+        elif key not in self._removed and self._bloom_may_contain(key) and self._in_base(key):
+            self._removed.add(key)
+        self._dirty = True
+
+    def clear(self):
+        self._release()
+        self.height, self._tip = -1, b""
+        self._reset_bloom(BLOOM_MIN_ITEMS)
+        self._dirty = True
+
+    # ---------- вершина цепочки ----------
+    def commit(self, height: int, block_hash: str):
+        """Содержимое соответствует блоку height; при накоплении изменений — компакция"""
+        self.height, self._tip = height, digest(block_hash)
+        self._dirty = True
+        if len(self._added) + len(self._removed) > COMPACT_THRESHOLD:
+            self.compact()
+
+    def resume(self, chain) -> int:
+        """
+        Высота, до которой содержимое совпадает с цепочкой (блоки до неё не
+        вставлять заново); если вершины хранилища нет в цепочке — очистка и -1
+        """
+        if 0 <= self.height < len(chain) and digest(chain[self.height].hash) == self._tip:
+            return self.height
+        if self.height >= 0 or len(self):
+            logging.info("Хранилище key images не совпадает с цепочкой, заполняется заново")
+        self.clear()
+        return -1
+
+    # ---------- компакция ----------
+    def _base_keys(self):
+        base, offset = self._base, self._offset
+        for i in range(self._count):
+            start = offset + i * DIGEST_SIZE
+            yield base[start:start + DIGEST_SIZE]
+
+    def flush(self):
+        if self._dirty and self.path:
+            self.compact()
+
+    def compact(self):
+        """Слить изменения с массивом; с путём — атомарно переписать файл и отобразить заново"""
+        removed = self._removed
+        body = b"".join(k for k in merge(self._base_keys(), sorted(self._added)) if k not in removed)
+        count = len(body) // DIGEST_SIZE
+        if count * BLOOM_BITS_PER_ITEM > self._bloom_bits or len(removed) > count // 4:
+            # Фильтр переполнен или в нём много удалённых — перестраиваем с запасом
+            self._reset_bloom(2 * count)
+            for i in range(count):
+                self._bloom_add(body[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE])
+        if not self.path:
+            self._base, self._offset, self._count = body, 0, count
+            self._added, self._removed = set(), set()
+            self._dirty = False
+            return
+        header = HEADER.pack(MAGIC, count, self.height, self._tip.ljust(DIGEST_SIZE, b"\0"), len(self._bloom))
+        atomic_write(self.path, header + body + bytes(self._bloom))
+        self._dirty = False
+        self.open()
+
+    def stats(self) -> dict:
+        return {
+            "key_images": len(self),
+            "array": self._count,
+            "added": len(self._added),
+            "removed": len(self._removed),
+            "height": self.height,
+            "bloom_bytes": len(self._bloom),
+            "data_bytes": self._count * DIGEST_SIZE,
+        }
@@ -0,0 +1,570 @@
+"""
+P2P-сессии и менеджер пиров узла anonCoin.
+
+У каждого пира своя ограниченная очередь исходящих сообщений и отдельная
+задача-писатель. Рассылка только кладёт уже сериализованное сообщение в очереди,
+поэтому медленный или зависший пир не задерживает остальных.
+
+PeerManager держит входящие и исходящие сессии в одном списке, ведёт адресную
+книгу (обмен адресами через getaddr/addr), поддерживает целевое число исходящих
+соединений с экспоненциальной задержкой переподключения и банит пиров,
+присылающих некорректные данные.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import urlsplit
+
+import websockets  # клиент для исходящих WS-подключений
+
+from metrics import counter
+from wire import WireError, decode_frame, encode_frame
+
+# ==========================
+# НАСТРОЙКИ
+# ==========================
+PEER_QUEUE_SIZE = 256          # максимум сообщений в очереди одного пира
+PEER_SEND_TIMEOUT = 10.0       # сек. на одну отправку, дольше — пир считается зависшим
+
+# Политика для переполненной очереди:
+#   "shed" — выбрасываем низкоприоритетные сообщения, отключаем только если выбросить нечего
+#   "drop" — сразу отключаем пира
+SLOW_PEER_POLICY = "shed"
+
+# Эти сообщения можно потерять без вреда: пир получит их позже вместе с блоком/цепочкой
+LOW_PRIORITY_TYPES = {"new_transaction", "addr"}
+
+TARGET_OUTBOUND = 8            # сколько исходящих соединений держим
+MAX_INBOUND = 64               # сколько входящих принимаем
+MAINTENANCE_INTERVAL = 2.0     # сек. между проверками числа соединений
+BACKOFF_BASE = 1.0             # сек., первая задержка переподключения
+BACKOFF_MAX = 300.0            # сек., потолок задержки
+BAN_THRESHOLD = 100            # штрафных очков до бана пира (listen-URL и host:порт)
+HOST_BAN_THRESHOLD = 1000      # штрафных очков всех сессий с хоста до бана хоста целиком
+BAN_DURATION = 24 * 3600       # сек.
+MAX_ADDR_PER_MSG = 100
+
+# Типы сообщений протокола; остальные считаются в метриках как "other"
+MESSAGE_TYPES = {
+    "hello", "getaddr", "addr", "new_block", "cmpct_block", "get_block_txn", "block_txn",
+    "get_block", "new_transaction", "request_blockchain", "blockchain",
+}
+P2P_MESSAGES = counter("anoncoin_p2p_messages_total", "P2P-сообщения по направлению и типу",
+                       labels=("direction", "type"))
+P2P_BYTES = counter("anoncoin_p2p_bytes_total", "Байт P2P-сообщений по направлению", labels=("direction",))
+
+
+def count_message(direction: str, msg_type: Any, size: int):
+    P2P_MESSAGES.labels(direction, msg_type if msg_type in MESSAGE_TYPES else "other").inc()
+    P2P_BYTES.labels(direction).inc(size)
+
+
+def encode_message(message: dict) -> str:
+    """Сериализация P2P-сообщения (один раз на всю рассылку)"""
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+class PeerSession:
+    """
+    Исходящая сторона соединения с пиром: очередь + задача-писатель.
+
+    send_text — корутина отправки строки (WebSocket.send_text у входящих,
+    websockets-клиент .send у исходящих), send_bytes — то же для бинарных кадров
+    (по умолчанию send_text), close_transport — закрытие сокета.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        send_text: Callable[[str], Awaitable[Any]],
+        close_transport: Optional[Callable[[], Awaitable[Any]]] = None,
+        direction: str = "inbound",
+        max_queue: int = PEER_QUEUE_SIZE,
+        policy: str = SLOW_PEER_POLICY,
+        on_close: Optional[Callable[["PeerSession"], None]] = None,
+        send_bytes: Optional[Callable[[bytes], Awaitable[Any]]] = None,
+    ):
+        self.address = address
+        self.direction = direction
+        self.max_queue = max_queue
+        self.policy = policy
+        self._send_text = send_text
+        self._send_bytes = send_bytes or send_text
+        self._close_transport = close_transport
+        self._on_close = on_close
+        self._queue: deque = deque()     # [кадр, низкий приоритет, время постановки, ключ слияния]
+        self._coalesced: dict = {}       # ключ слияния -> элемент очереди с этим ключом
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.close_reason: Optional[str] = None
+
+        # Заполняется при рукопожатии (hello)
+        self.node_id: Optional[str] = None
+        self.listen_url: Optional[str] = None
+        self.features: set[str] = set()        # объявлены пиром
+        self.local_features: set[str] = set()  # объявлены нами
+        self.misbehavior = 0
+
+        # Метрики
+        self.connected_at = time.time()
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.shed_messages = 0
+        self.last_send_latency = 0.0
+        self.avg_send_latency = 0.0   # EWMA
+        self.max_send_latency = 0.0
+        self.avg_queue_wait = 0.0     # EWMA времени в очереди
+
+    # ---------- жизненный цикл ----------
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer())
+        return self
+
+    def close(self, reason: str = "закрыто"):
+        """Закрыть сессию: останавливаем писателя и закрываем сокет в фоне"""
+        if self.closed:
+            return
+        self.closed = True
+        self.close_reason = reason
+        self._queue.clear()
+        self._coalesced.clear()
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+        if self._close_transport:
+            asyncio.create_task(self._safe_close_transport())
+        if self._on_close:
+            self._on_close(self)
+        logging.info(f"Сессия с пиром {self.address} закрыта: {reason}")
+
+    async def _safe_close_transport(self):
+        try:
+            await asyncio.wait_for(self._close_transport(), timeout=PEER_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    # ---------- постановка в очередь ----------
+    def enqueue(self, payload: str | bytes, low_priority: bool = False, coalesce: Optional[str] = None) -> bool:
+        """
+        Неблокирующая постановка готового кадра (JSON-строка или бинарный) в очередь пира.
+        coalesce — ключ состояния (вершина, баланс адреса): ещё не отправленный кадр
+        с тем же ключом заменяется новым, а не копится в очереди.
+        Возвращает False, если пир закрыт или был отключён из-за переполнения.
+        """
+        if self.closed:
+            return False
+
+        queued = self._coalesced.get(coalesce) if coalesce is not None else None
+        if queued is not None:
+            queued[0] = payload
+            return True
+
+        if len(self._queue) >= self.max_queue:
+            if low_priority:
+                self.shed_messages += 1
+                return True
+            if self.policy != "shed" or not self._shed_one():
+                self.close("очередь переполнена")
+                return False
+
+        item = [payload, low_priority, time.monotonic(), coalesce]
+        self._queue.append(item)
+        if coalesce is not None:
+            self._coalesced[coalesce] = item
+        self._wakeup.set()
+        return True
+
+    def enqueue_message(self, message: dict, cache: Optional[dict] = None) -> bool:
+        """
+        Сериализовать в формате, согласованном с пиром, и поставить в очередь.
+        cache — общий словарь на одну рассылку: каждый формат кодируется один раз.
+        """
+        fmt = self.wire_format()
+        payload = cache.get(fmt) if cache is not None else None
+        if payload is None:
+            try:
+                payload = encode_message(message) if fmt[0] == "json" else encode_frame(message, fmt[1], fmt[0])
+            except WireError:
+                # Не представимо в bin1 (длинный ключ, огромное целое) — текстом, его понимает любой пир
+                payload = encode_message(message)
+            if cache is not None:
+                cache[fmt] = payload
+        if self.direction != "client":
+            count_message("out", message.get("type"), len(payload))
+        return self.enqueue(payload, message.get("type") in LOW_PRIORITY_TYPES)
+
+    def wire_format(self) -> tuple[str, Optional[str]]:
+        """
+        ("cjson", сжатие) — сжатый JSON в кадре, если он и алгоритм сжатия общие;
+        ("bin1", сжатие) — для пиров без "cjson": bin1 медленнее json и окупается
+        только размером, поэтому без общего сжатия — ("json", None), как старым пирам.
+        """
+        common = self.features & self.local_features
+        codec = next((c for c in ("zstd", "zlib") if c in common), None)
+        if codec is None:
+            return ("json", None)
+        for payload_format in ("cjson", "bin1"):
+            if payload_format in common:
+                return (payload_format, codec)
+        return ("json", None)
+
+    def _shed_one(self) -> bool:
+        """Выбросить самое старое низкоприоритетное сообщение, чтобы освободить место"""
+        for i, item in enumerate(self._queue):
+            if item[1]:
+                del self._queue[i]
+                self._coalesced.pop(item[3], None)
+                self.shed_messages += 1
+                return True
+        return False
+
+    # ---------- писатель ----------
+    async def _writer(self):
+        try:
+            while True:
+                while not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                payload, _, enqueued_at, coalesce = self._queue.popleft()
+                if coalesce is not None:
+                    del self._coalesced[coalesce]
+                send = self._send_bytes if isinstance(payload, bytes) else self._send_text
+
+                started = time.monotonic()
+                await asyncio.wait_for(send(payload), timeout=PEER_SEND_TIMEOUT)
+                finished = time.monotonic()
+
+                latency = finished - started
+                self.sent_messages += 1
+                self.sent_bytes += len(payload)
+                self.last_send_latency = latency
+                self.max_send_latency = max(self.max_send_latency, latency)
+                self.avg_send_latency += 0.1 * (latency - self.avg_send_latency)
+                self.avg_queue_wait += 0.1 * ((started - enqueued_at) - self.avg_queue_wait)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.close("таймаут отправки")
+        except Exception as e:
+            self.close(f"ошибка отправки: {e}")
+
+    # ---------- метрики ----------
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        return {
+            "address": self.address,
+            "direction": self.direction,
+            "listen_url": self.listen_url,
+            "wire_format": "+".join(f for f in self.wire_format() if f),
+            "misbehavior": self.misbehavior,
+            "connected_at": int(self.connected_at),
+            "queue_depth": self.queue_depth,
+            "queue_limit": self.max_queue,
+            "sent_messages": self.sent_messages,
+            "sent_bytes": self.sent_bytes,
+            "shed_messages": self.shed_messages,
+            "send_latency_last_ms": round(self.last_send_latency * 1000, 3),
+            "send_latency_avg_ms": round(self.avg_send_latency * 1000, 3),
+            "send_latency_max_ms": round(self.max_send_latency * 1000, 3),
+            "queue_wait_avg_ms": round(self.avg_queue_wait * 1000, 3),
+            "closed": self.closed,
+        }
+
+
+# ==========================
+# МЕНЕДЖЕР ПИРОВ
+# ==========================
+@dataclass
+class PeerAddress:
+    """Запись адресной книги: WS-адрес пира и состояние переподключения"""
+    url: str
+    source: str = "addr"
+    failures: int = 0
+    next_attempt: float = 0.0
+    last_success: float = 0.0
+    banned_until: float = 0.0
+
+    def schedule_retry(self):
+        """Экспоненциальная задержка с джиттером: base * 2^failures, в пределах [d/2, d]"""
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** min(self.failures, 16)))
+        self.next_attempt = time.time() + delay * (0.5 + random.random() / 2)
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "source": self.source,
+            "failures": self.failures,
+            "next_attempt": int(self.next_attempt),
+            "last_success": int(self.last_success),
+            "banned_until": int(self.banned_until),
+        }
+
+
+def _valid_peer_url(url: Any) -> bool:
+    return isinstance(url, str) and url.startswith(("ws://", "wss://")) and len(url) <= 256
+
+
+def peer_host(address: str) -> str:
+    """
+    Хост пира из адреса сессии: URL исходящего подключения или host:порт входящего.
+    За одним хостом может быть несколько узлов (localhost, NAT), поэтому хост банится
+    только по суммарному штрафу выше HOST_BAN_THRESHOLD.
+    """
+    if "://" in address:
+        return urlsplit(address).hostname or address
+    return address.rsplit(":", 1)[0] if ":" in address else address
+
+
+class PeerManager:
+    """
+    Единый учёт входящих и исходящих сессий + адресная книга.
+
+    handle_message — корутина узла (session, msg) для всех типов сообщений,
+    кроме служебных hello/getaddr/addr, которые менеджер обрабатывает сам.
+    """
+
+    def __init__(
+        self,
+        bootstrap: list[str] = (),
+        listen_url: Optional[str] = None,
+        target_outbound: int = TARGET_OUTBOUND,
+        max_inbound: int = MAX_INBOUND,
+    ):
+        self.sessions: list[PeerSession] = []
+        self.book: dict[str, PeerAddress] = {}
+        self.banned: dict[str, float] = {}  # listen-URL, host:порт или хост -> время окончания бана
+        self.host_misbehavior: dict[str, int] = {}  # хост -> сумма штрафов всех его сессий
+        self.node_id = os.urandom(8).hex()
+        self.listen_url = listen_url
+        self.target_outbound = target_outbound
+        self.max_inbound = max_inbound
+        self.handle_message: Optional[Callable[[PeerSession, dict], Awaitable[Any]]] = None
+        self.features: list[str] = []  # возможности узла, объявляемые в hello
+        self._dialing: set[str] = set()
+        for url in bootstrap:
+            self.add_address(url, source="bootstrap")
+
+    # ---------- адресная книга ----------
+    def add_address(self, url: str, source: str = "addr") -> bool:
+        if not _valid_peer_url(url) or url == self.listen_url or url in self.book:
+            return False
+        self.book[url] = PeerAddress(url, source)
+        return True
+
+    def is_banned(self, key: Optional[str]) -> bool:
+        if not key:
+            return False
+        until = self.banned.get(key)
+        if until is None:
+            return False
+        if until < time.time():
+            del self.banned[key]
+            return False
+        return True
+
+    def _connected_urls(self) -> set[str]:
+        return {s.listen_url for s in self.sessions if s.listen_url}
+
+    def outbound_count(self) -> int:
+        return sum(1 for s in self.sessions if s.direction == "outbound")
+
+    def inbound_count(self) -> int:
+        return sum(1 for s in self.sessions if s.direction == "inbound")
+
+    # ---------- сессии ----------
+    def register(self, session: PeerSession) -> PeerSession:
+        session._on_close = self._on_close
+        session.local_features = set(self.features)
+        self.sessions.append(session)
+        return session
+
+    def accept_inbound(self, session: PeerSession) -> bool:
+        """Проверка лимита входящих; при успехе сессия регистрируется"""
+        # Бан по listen-URL проверяется в hello; здесь — host:порт и хост целиком
+        if (self.inbound_count() >= self.max_inbound or self.is_banned(session.address)
+                or self.is_banned(peer_host(session.address))):
+            return False
+        self.register(session)
+        session.enqueue_message(self.hello_message())
+        return True
+
+    def _on_close(self, session: PeerSession):
+        if session in self.sessions:
+            self.sessions.remove(session)
+
+    def hello_message(self) -> dict:
+        return {"type": "hello", "node_id": self.node_id, "listen": self.listen_url,
+                "features": self.features}
+
+    # ---------- оценка пиров ----------
+    def misbehaving(self, session: Optional[PeerSession], points: int, reason: str):
+        """Начислить штраф; при достижении порога пир банится и отключается"""
+        if session is None:
+            return
+        session.misbehavior += points
+        host = peer_host(session.address)
+        self.host_misbehavior[host] = self.host_misbehavior.get(host, 0) + points
+        logging.warning(f"Пир {session.address}: +{points} штрафа ({reason}), всего {session.misbehavior}")
+        keys = []
+        if session.misbehavior >= BAN_THRESHOLD:
+            keys += [session.listen_url, session.address]
+        if self.host_misbehavior[host] >= HOST_BAN_THRESHOLD:
+            logging.warning(f"Хост {host} забанен целиком: суммарный штраф {self.host_misbehavior.pop(host)}")
+            keys.append(host)
+        if keys:
+            until = time.time() + BAN_DURATION
+            for key in keys:
+                if key:
+                    self.banned[key] = until
+                    if key in self.book:
+                        self.book[key].banned_until = until
+            session.close(f"бан: {reason}")
+
+    # ---------- приём сообщений ----------
+    async def dispatch(self, session: PeerSession, raw: Any):
+        """Разбор входящего кадра (JSON-текст или бинарный wire-кадр) и маршрутизация по типу"""
+        if isinstance(raw, (bytes, bytearray)):
+            try:
+                msg = decode_frame(raw)
+            except WireError as e:
+                self.misbehaving(session, 10, f"некорректный бинарный кадр: {e}")
+                return
+        else:
+            try:
+                msg = json.loads(raw) if isinstance(raw, str) else raw
+                if not isinstance(msg, dict):
+                    raise ValueError("сообщение не является объектом")
+            except Exception:
+                self.misbehaving(session, 10, "не-JSON сообщение")
+                return
+
+        msg_type = msg.get("type")
+        count_message("in", msg_type, len(raw) if isinstance(raw, (str, bytes, bytearray)) else 0)
+        if msg_type == "hello":
+            self._on_hello(session, msg)
+        elif msg_type == "getaddr":
+            session.enqueue_message(self.addr_message())
+        elif msg_type == "addr":
+            self._on_addr(session, msg)
+        elif self.handle_message:
+            await self.handle_message(session, msg)
+
+    def _on_hello(self, session: PeerSession, msg: dict):
+        node_id = msg.get("node_id")
+        if node_id == self.node_id:
+            # Подключились сами к себе (например, свой адрес в BOOTSTRAP_NODES)
+            if session.listen_url in self.book:
+                self.book.pop(session.listen_url)
+            session.close("соединение с самим собой")
+            return
+        session.node_id = node_id
+        features = msg.get("features")
+        if isinstance(features, list):
+            session.features = {f for f in features if isinstance(f, str)}
+        listen = msg.get("listen")
+        if _valid_peer_url(listen):
+            if self.is_banned(listen):
+                session.close("пир забанен")
+                return
+            session.listen_url = listen
+            self.add_address(listen, source="hello")
+
+    def addr_message(self) -> dict:
+        now = time.time()
+        urls = [a.url for a in self.book.values() if a.banned_until < now]
+        if self.listen_url:
+            urls.append(self.listen_url)
+        random.shuffle(urls)
+        return {"type": "addr", "addrs": urls[:MAX_ADDR_PER_MSG]}
+
+    def _on_addr(self, session: PeerSession, msg: dict):
+        addrs = msg.get("addrs")
+        if not isinstance(addrs, list) or len(addrs) > MAX_ADDR_PER_MSG:
+            self.misbehaving(session, 20, "некорректное addr-сообщение")
+            return
+        added = sum(1 for url in addrs if self.add_address(url))
+        if added:
+            logging.info(f"Получено {added} новых адресов от {session.address}")
+
+    # ---------- исходящие соединения ----------
+    async def run(self):
+        """Фоновый цикл: поддерживаем целевое число исходящих соединений"""
+        while True:
+            try:
+                self._fill_outbound()
+            except Exception as e:
+                logging.error(f"Ошибка менеджера пиров: {e}")
+            await asyncio.sleep(MAINTENANCE_INTERVAL)
+
+    def _fill_outbound(self):
+        missing = self.target_outbound - self.outbound_count() - len(self._dialing)
+        if missing <= 0:
+            return
+        now = time.time()
+        connected = self._connected_urls()
+        candidates = [
+            a for a in self.book.values()
+            if a.next_attempt <= now and a.banned_until < now
+            and a.url not in connected and a.url not in self._dialing
+        ]
+        # Сначала проверенные адреса, потом с меньшим числом неудач
+        candidates.sort(key=lambda a: (-a.last_success, a.failures))
+        for addr in candidates[:missing]:
+            self._dialing.add(addr.url)
+            asyncio.create_task(self._dial(addr))
+
+    async def _dial(self, addr: PeerAddress):
+        session: Optional[PeerSession] = None
+        try:
+            async with websockets.connect(addr.url, ping_interval=20, ping_timeout=20, open_timeout=10) as ws:
+                session = self.register(PeerSession(
+                    addr.url, send_text=ws.send, close_transport=ws.close, direction="outbound",
+                ).start())
+                session.listen_url = addr.url
+                self._dialing.discard(addr.url)
+                logging.info(f"Подключено к пиру: {addr.url}")
+
+                session.enqueue_message(self.hello_message())
+                session.enqueue_message({"type": "getaddr"})
+                # Запрашиваем у узла их текущую цепочку
+                session.enqueue_message({"type": "request_blockchain"})
+
+                async for raw in ws:
+                    await self.dispatch(session, raw)
+                    if session.closed:
+                        break
+        except Exception as e:
+            logging.warning(f"Связь с {addr.url} потеряна/не установлена: {e}")
+        finally:
+            self._dialing.discard(addr.url)
+            if session:
+                session.close("соединение закрыто")
+            # Успех — состоявшийся обмен hello; обычное закрытие после него не неудача
+            if session and session.node_id:
+                addr.failures = 0
+                addr.last_success = time.time()
+            else:
+                addr.failures += 1
+            addr.schedule_retry()
+
+    def stats(self) -> dict:
+        return {
+            "node_id": self.node_id,
+            "listen_url": self.listen_url,
+            "inbound": self.inbound_count(),
+            "outbound": self.outbound_count(),
+            "target_outbound": self.target_outbound,
+            "known_addresses": [a.to_dict() for a in self.book.values()],
+            "banned": {k: int(v) for k, v in self.banned.items() if v > time.time()},
+        }
@@ -0,0 +1,172 @@
+"""
+Отложенная (write-behind) запись состояния узла на диск.
+
+Обработчики запросов только помечают состояние «грязным»; фоновая задача
+объединяет изменения и сбрасывает их по таймеру или по порогу числа изменений.
+Снимок берётся в потоке event loop (дёшево), сериализация и запись — в отдельном
+потоке. Файлы пишутся атомарно: временный файл -> fsync -> rename -> fsync каталога.
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Optional
+
+FLUSH_INTERVAL = 5.0    # сек. — максимальная задержка записи
+FLUSH_THRESHOLD = 10    # изменений — сбросить раньше таймера
+
+
+def atomic_write(path: str, data: bytes):
+    """
+    Crash-safe запись: после сбоя на диске либо старая, либо новая версия файла,
+    но не обрезанная.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    # rename должен пережить сбой питания — синхронизируем каталог
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class WriteBehind:
+    """
+    snapshot() -> объект — вызывается в event loop, должен быть быстрым
+    (например, поверхностная копия списка блоков).
+    write(объект) -> int — вызывается в отдельном потоке, возвращает число записанных байт.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        snapshot: Callable[[], Any],
+        write: Callable[[Any], int],
+        interval: float = FLUSH_INTERVAL,
+        threshold: int = FLUSH_THRESHOLD,
+    ):
+        self.name = name
+        self.interval = interval
+        self.threshold = threshold
+        self._snapshot = snapshot
+        self._write = write
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = 0
+        self._dirty_since: Optional[float] = None
+
+        # Метрики
+        self.flushes = 0
+        self.errors = 0
+        self.coalesced_changes = 0
+        self.last_flush_at = 0.0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.last_flush_bytes = 0
+        self.last_flush_lag = 0.0   # от первого изменения до окончания записи
+
+    def mark_dirty(self):
+        """Отметить изменение; сама запись произойдёт в фоне"""
+        self._dirty += 1
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+        if self._dirty >= self.threshold:
+            self._wake.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def close(self):
+        """Остановить фоновую задачу и записать всё, что осталось"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._dirty:
+                await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._dirty:
+                return
+            dirty, since = self._dirty, self._dirty_since
+            self._dirty, self._dirty_since = 0, None
+            snap = self._snapshot()
+
+            started = time.monotonic()
+            try:
+                written = await asyncio.to_thread(self._write, snap)
+            except Exception as e:
+                # Вернём пометку, чтобы повторить при следующем цикле
+                self._dirty += dirty
+                self._dirty_since = min(since, self._dirty_since or since)
+                self.errors += 1
+                logging.error(f"Ошибка фоновой записи {self.name}: {e}")
+                return
+            finished = time.monotonic()
+
+            self.flushes += 1
+            self.coalesced_changes += dirty
+            self.last_flush_at = time.time()
+            self.last_flush_seconds = finished - started
+            self.max_flush_seconds = max(self.max_flush_seconds, self.last_flush_seconds)
+            self.last_flush_bytes = written or 0
+            self.last_flush_lag = finished - since
+            logging.info(f"{self.name}: записано {self.last_flush_bytes} байт "
+                         f"({dirty} изменений) за {self.last_flush_seconds * 1000:.1f} мс")
+
+    @property
+    def lag_seconds(self) -> float:
+        """Сколько секунд самое старое незаписанное изменение ждёт диска"""
+        return time.monotonic() - self._dirty_since if self._dirty_since is not None else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "pending_changes": self._dirty,
+            "lag_seconds": round(self.lag_seconds, 3),
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "coalesced_changes": self.coalesced_changes,
+            "last_flush_at": int(self.last_flush_at),
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 3),
+            "last_flush_bytes": self.last_flush_bytes,
+            "last_flush_lag_ms": round(self.last_flush_lag * 1000, 3),
+        }
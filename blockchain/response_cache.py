@@ -0,0 +1,91 @@
+"""
+Кэш ответов read-эндпоинтов узла.
+
+Ключ — (эндпоинт, аргументы, хеш вершины, версия мемпула), поэтому после
+подключения/отключения блока или приёма транзакции старые записи просто
+перестают совпадать; кроме того, кэш подписан на события цепочки и очищается
+при смене вершины, чтобы не держать недостижимые записи. Вытеснение — LRU.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+RESPONSE_CACHE_SIZE = 4096  # записей
+
+
+class ResponseCache:
+    def __init__(self, blockchain=None, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.blockchain = blockchain
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self.mempool_version = 0
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._per_endpoint: dict[str, list[int]] = {}  # эндпоинт -> [hits, misses]
+
+    def get_or_compute(self, endpoint: str, args: Hashable, compute: Callable[[], Any]) -> Any:
+        """Значение из кэша или compute(); результат не должен изменяться вызывающим"""
+        key = (endpoint, args, self.blockchain.stats.tip_hash, self.mempool_version)
+        counters = self._per_endpoint.setdefault(endpoint, [0, 0])
+        try:
+            value = self._entries[key]
+        except KeyError:
+            pass
+        else:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            counters[0] += 1
+            return value
+
+        self.misses += 1
+        counters[1] += 1
+        value = compute()
+        self._entries[key] = value
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def invalidate(self):
+        if self._entries:
+            self._entries.clear()
+            self.invalidations += 1
+
+    # ---------- события цепочки (Blockchain.add_listener) ----------
+    def on_chain_reset(self):
+        self.invalidate()
+
+    def on_block_connected(self, block):
+        # Блок убирает свои транзакции из мемпула
+        self.mempool_version += 1
+        self.invalidate()
+
+    def on_block_disconnected(self, block):
+        # Транзакции отключённого блока возвращаются в мемпул
+        self.mempool_version += 1
+        self.invalidate()
+
+    def on_transaction_added(self, tx):
+        self.mempool_version += 1
+        self.invalidate()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "mempool_version": self.mempool_version,
+            "endpoints": {
+                name: {"hits": h, "misses": m, "hit_rate": round(h / (h + m), 4) if h + m else 0.0}
+                for name, (h, m) in self._per_endpoint.items()
+            },
+        }
@@ -0,0 +1,207 @@
+"""
+Клиентская подписка на события узла (WebSocket /ws/events, отдельно от P2P /ws).
+
+Темы:
+  "tip"                — новая вершина цепочки (в том числе после отката при реорганизации);
+  "mempool"            — транзакция принята в пул ожидания;
+  "address:<адрес>"    — изменился баланс адреса (по подключённым/отключённым блокам).
+
+Фильтрация на стороне сервера: для каждой темы хранится множество подписчиков,
+событие сериализуется один раз и одна и та же строка ставится в очереди
+подписчиков (PeerSession), поэтому рассылка тысячам клиентов не множит
+json.dumps. Медленные клиенты сначала теряют события mempool. События-состояния
+(вершина, баланс адреса) сливаются в очереди клиента: пока кадр не отправлен,
+новый заменяет его, поэтому синхронизация или пересборка цепочки на тысячи
+блоков не переполняет очередь и не отключает клиента.
+
+Балансы считаются только для адресов, на которые кто-то подписан: полный
+расчёт при первой подписке, дальше — приращения по блокам.
+"""
+
+from typing import Optional
+
+from anoncoin_core import calculate_balance, generate_transaction_id, to_coins
+from peers import PeerSession, encode_message
+
+TOPIC_TIP = "tip"
+TOPIC_MEMPOOL = "mempool"
+ADDRESS_PREFIX = "address:"
+MAX_TOPICS_PER_CLIENT = 100
+
+# Эти события можно выбросить из очереди медленного клиента
+LOW_PRIORITY_TOPICS = {TOPIC_MEMPOOL}
+
+
+def is_state_topic(topic: str) -> bool:
+    """Событие темы — текущее состояние: в очереди клиента важно только последнее"""
+    return topic == TOPIC_TIP or topic.startswith(ADDRESS_PREFIX)
+
+
+def is_valid_topic(topic: str) -> bool:
+    if topic in (TOPIC_TIP, TOPIC_MEMPOOL):
+        return True
+    return topic.startswith(ADDRESS_PREFIX) and len(topic) > len(ADDRESS_PREFIX)
+
+
+class EventHub:
+    def __init__(self, blockchain=None):
+        self.blockchain = blockchain
+        self._topics: dict[str, set[PeerSession]] = {}
+        self._clients: dict[PeerSession, set[str]] = {}
+        # адрес -> баланс; None — нужно пересчитать (после сброса цепочки)
+        self._balances: dict[str, Optional[int]] = {}
+
+        # Метрики
+        self.published = 0      # событий, у которых были подписчики
+        self.delivered = 0      # постановок в очереди клиентов
+        self.dropped = 0        # клиент закрыт/переполнен
+
+    # ---------- подписки ----------
+    def subscribe(self, session: PeerSession, topics: list[str]) -> list[str]:
+        """Подписать клиента; возвращает принятые темы (некорректные и сверх лимита отбрасываются)"""
+        current = self._clients.setdefault(session, set())
+        accepted = []
+        for topic in topics:
+            if not isinstance(topic, str) or not is_valid_topic(topic):
+                continue
+            if topic not in current and len(current) >= MAX_TOPICS_PER_CLIENT:
+                break
+            current.add(topic)
+            self._topics.setdefault(topic, set()).add(session)
+            if topic.startswith(ADDRESS_PREFIX):
+                self._balances.setdefault(topic[len(ADDRESS_PREFIX):], None)
+            accepted.append(topic)
+        return accepted
+
+    def unsubscribe(self, session: PeerSession, topics: Optional[list[str]] = None):
+        """Отписать от тем; topics=None — от всех (клиент отключился)"""
+        current = self._clients.get(session)
+        if current is None:
+            return
+        for topic in list(current if topics is None else topics):
+            if topic not in current:
+                continue
+            current.discard(topic)
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(session)
+                if not subscribers:
+                    del self._topics[topic]
+                    if topic.startswith(ADDRESS_PREFIX):
+                        self._balances.pop(topic[len(ADDRESS_PREFIX):], None)
+        if topics is None or not current:
+            self._clients.pop(session, None)
+
+    def balance(self, address: str) -> int:
+        cached = self._balances.get(address)
+        if cached is None:
+            cached = calculate_balance(self.blockchain, address)
+            if address in self._balances:
+                self._balances[address] = cached
+        return cached
+
+    def initial_event(self, topic: str) -> Optional[dict]:
+        """Текущее состояние темы — отправляется сразу после подписки"""
+        if topic == TOPIC_TIP and self.blockchain.chain:
+            return self._tip_event()
+        if topic.startswith(ADDRESS_PREFIX):
+            address = topic[len(ADDRESS_PREFIX):]
+            return self._balance_event(address, self.balance(address))
+        return None
+
+    # ---------- рассылка ----------
+    def publish(self, topic: str, message: dict) -> int:
+        """Сериализовать событие один раз и разложить по очередям подписчиков темы"""
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return 0
+        payload = encode_message(message)
+        low_priority = topic in LOW_PRIORITY_TOPICS
+        coalesce = topic if is_state_topic(topic) else None
+        delivered = 0
+        for session in list(subscribers):
+            if session.enqueue(payload, low_priority, coalesce):
+                delivered += 1
+            else:
+                self.dropped += 1
+        self.published += 1
+        self.delivered += delivered
+        return delivered
+
+    # ---------- события цепочки (Blockchain.add_listener) ----------
+    def on_chain_reset(self):
+        for address in self._balances:
+            self._balances[address] = None
+
+    def on_block_connected(self, block):
+        self._publish_tip()
+        self._apply_balances(block, +1)
+
+    def on_block_disconnected(self, block):
+        self._apply_balances(block, -1)
+        self._publish_tip()
+
+    def on_transaction_added(self, tx):
+        if TOPIC_MEMPOOL in self._topics:
+            self.publish(TOPIC_MEMPOOL, {
+                "type": "mempool_add",
+                "txid": generate_transaction_id(tx),
+                "transaction": tx.to_dict(),
+            })
+
+    def _publish_tip(self):
+        if TOPIC_TIP not in self._topics or not self.blockchain.chain:
+            return
+        self.publish(TOPIC_TIP, self._tip_event())
+
+    def _tip_event(self) -> dict:
+        tip = self.blockchain.get_latest_block()
+        return {
+            "type": "tip",
+            "height": tip.index,
+            "hash": tip.hash,
+            "previous_hash": tip.previous_hash,
+            "timestamp": tip.timestamp,
+            "tx_count": len(tip.transactions),
+            "total_supply": to_coins(self.blockchain.stats.total_supply),
+            "total_supply_units": self.blockchain.stats.total_supply,
+        }
+
+    def _balance_event(self, address: str, balance: int) -> dict:
+        return {
+            "type": "balance",
+            "address": address,
+            "balance": to_coins(balance),
+            "balance_units": balance,
+            "height": len(self.blockchain.chain) - 1,
+        }
+
+    def _apply_balances(self, block, sign: int):
+        if not self._balances:
+            return
+        # Та же логика, что в calculate_balance: +сумма получателю, -сумма отправителю
+        deltas: dict[str, int] = {}
+        for tx in block.transactions:
+            if tx.receiver_address in self._balances:
+                deltas[tx.receiver_address] = deltas.get(tx.receiver_address, 0) + tx.amount
+            sender = tx.get_sender_address()
+            if sender in self._balances:
+                deltas[sender] = deltas.get(sender, 0) - tx.amount
+        for address, delta in deltas.items():
+            if self._balances[address] is None:
+                value = self.balance(address)  # полный пересчёт уже учитывает этот блок
+            else:
+                value = self._balances[address] + sign * delta
+                self._balances[address] = value
+            if delta:
+                self.publish(ADDRESS_PREFIX + address, self._balance_event(address, value))
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "topics": len(self._topics),
+            "tracked_addresses": len(self._balances),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули узла импортируются как верхнеуровневые (как в benchmarks/): каталог blockchain в sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
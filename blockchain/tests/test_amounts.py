@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from anoncoin_core import (COIN, LEGACY_ANON_UNTIL, Block, Blockchain, Transaction, TxInput, TxOutput, UTXOSet,
+                           Wallet, calculate_balance, format_amount, generate_transaction_id, legacy_units,
+                           load_blockchain, parse_amount, save_blockchain)
+
+
+def _v1(sender, receiver, coins, **kwargs) -> Transaction:
+    """Транзакция прежнего формата: сумма — float в монетах, поля version нет"""
+    return Transaction(sender, receiver, legacy_units(coins), version=1, legacy_amount=coins, **kwargs)
+
+
+@pytest.fixture
+def legacy_file(tmp_path):
+    """Файл цепочки из транзакций версии 1 (float-суммы); (путь, исходные хеши блоков, кошельки)"""
+    alice, bob, carol = Wallet(), Wallet(), Wallet()
+    chain = Blockchain(difficulty=1)
+    blocks = [chain.chain[0]]
+
+    def add(txs):
+        block = Block(len(blocks), blocks[-1].hash, LEGACY_ANON_UNTIL - 100 + len(blocks), txs)
+        block.mine_block(1)
+        blocks.append(block)
+
+    def coinbase(height):
+        return _v1(None, alice.get_address(), 50.0, tx_type="coinbase", timestamp=LEGACY_ANON_UNTIL - 100 + height)
+
+    add([coinbase(1)])
+    payments = [_v1(alice.public_key_hex, bob.get_address(), coins) for coins in (0.1, 0.2, 0.123456789)]
+    for tx in payments:
+        tx.sign_transaction(alice)
+    add([coinbase(2)] + payments)
+
+    anon = _v1(None, carol.get_address(), 12.5, tx_type="anonymous", key_image="ab" * 49,
+               inputs=[TxInput(generate_transaction_id(blocks[1].transactions[0]), 0)],
+               outputs=[TxOutput("", 0, carol.get_address(), legacy_units(12.5), 12.5),
+                        TxOutput("", 1, alice.get_address(), legacy_units(37.5), 37.5)],
+               ring_signature={"ring": [], "c0": "00", "s": []})
+    add([coinbase(3), anon])
+
+    path = tmp_path / "blockchain_data.json"
+    path.write_text(json.dumps({"chain": [b.to_dict() for b in blocks], "pending_transactions": [],
+                                "difficulty": 1}), encoding="utf-8")
+    return str(path), [b.hash for b in blocks], (alice, bob, carol)
+
+
+def test_legacy_float_chain_loads_as_exact_units(legacy_file):
+    path, hashes, (alice, bob, carol) = legacy_file
+    assert '"amount": 0.1' in open(path, encoding="utf-8").read()
+
+    chain = load_blockchain(path)
+    assert chain is not None and chain.stats.is_valid
+    assert [b.hash for b in chain.chain] == hashes
+    assert all(type(tx.amount) is int for b in chain.chain for tx in b.transactions)
+
+    # 0.1 + 0.2 во float — 0.30000000000000004; в единицах — ровно, 0.123456789 округляется до 1e-8
+    assert calculate_balance(chain, bob.get_address()) == 30_000_000 + 12_345_679
+    assert format_amount(calculate_balance(chain, bob.get_address())) == "0.42345679"
+    assert [o.amount for o in chain.utxo_set.available_for(carol.get_address())] == [12 * COIN + COIN // 2]
+    assert chain.stats.total_supply == chain.recount_total_supply()
+
+
+def test_legacy_amounts_survive_resave(legacy_file, tmp_path):
+    path, hashes, _ = legacy_file
+    chain = load_blockchain(path)
+    resaved = str(tmp_path / "resaved.json")
+    assert save_blockchain(chain, resaved)
+
+    with open(resaved, encoding="utf-8") as f:
+        txs = [tx for block in json.load(f)["chain"][1:] for tx in block["transactions"]]
+    # Версия 1 пишется как была (float), иначе изменились бы txid и хеши блоков
+    assert all("version" not in tx for tx in txs)
+    assert [tx["amount"] for tx in txs[:4]] == [50.0, 50.0, 0.1, 0.2]
+    assert txs[-1]["outputs"][0]["amount"] == 12.5
+    assert [b.hash for b in load_blockchain(resaved).chain] == hashes
+
+
+def test_new_transactions_use_integer_units(legacy_file):
+    path, _, (alice, bob, _) = legacy_file
+    chain = load_blockchain(path)
+    tx = Transaction(alice.public_key_hex, bob.get_address(), parse_amount("0.3"))
+    tx.sign_transaction(alice)
+    assert tx.to_dict()["amount"] == 30_000_000 and tx.to_dict()["version"] == 2
+    assert chain.add_transaction(tx)
+    chain.mine_pending_transactions(alice.get_address())
+    assert calculate_balance(chain, bob.get_address()) == 60_000_000 + 12_345_679
+
+
+@pytest.mark.parametrize("index", [-1, 1 << 32, "0"])
+def test_utxo_rejects_unpackable_index(index):
+    utxo = UTXOSet()
+    with pytest.raises(ValueError):
+        utxo.add(TxOutput("11" * 32, index, "22" * 32, COIN))
+    assert len(utxo) == 0
@@ -0,0 +1,72 @@
+import pytest
+
+import compact_blocks
+from anoncoin_core import COIN, Blockchain, Transaction, Wallet
+from compact_blocks import PartialBlock, make_compact_block
+
+
+@pytest.fixture(scope="module")
+def mined():
+    """Блок из coinbase и трёх переводов; возвращает (блок, переводы)"""
+    chain = Blockchain(difficulty=1)
+    sender, receiver = Wallet(), Wallet()
+    txs = []
+    for i in range(3):
+        tx = Transaction(sender.public_key_hex, receiver.get_address(), (i + 1) * COIN, metadata=f"tx {i}")
+        tx.sign_transaction(sender)
+        chain.pending_transactions.append(tx)
+        txs.append(tx)
+    chain.mine_pending_transactions(sender.get_address())
+    return chain.get_latest_block(), txs
+
+
+def test_reconstruct_from_mempool(mined):
+    block, txs = mined
+    partial = PartialBlock(make_compact_block(block), list(reversed(txs)))
+    assert partial.missing() == []
+    assert partial.to_block().hash == block.hash
+
+
+def test_missing_transactions_filled_from_block_txn(mined):
+    block, txs = mined
+    partial = PartialBlock(make_compact_block(block), [txs[1]])
+    missing = partial.missing()
+    assert len(missing) == 2
+    assert all(block.transactions[i].signature != txs[1].signature for i in missing)
+    with pytest.raises(ValueError):
+        partial.to_block()
+    with pytest.raises(ValueError):
+        partial.fill([block.transactions[missing[0]].to_dict()])
+
+    partial.fill([block.transactions[i].to_dict() for i in missing])
+    assert partial.to_block().hash == block.hash
+
+
+def test_short_id_collision_in_mempool_is_treated_as_missing(mined, monkeypatch):
+    block, txs = mined
+    monkeypatch.setattr(compact_blocks, "short_txid", lambda key, txid: "00" * compact_blocks.SHORT_ID_BYTES)
+    partial = PartialBlock(make_compact_block(block), txs)
+    # Все short id совпали: ни одну транзакцию нельзя взять из мемпула
+    assert len(partial.missing()) == len(txs)
+    partial.fill([block.transactions[i].to_dict() for i in partial.missing()])
+    assert partial.to_block().hash == block.hash
+
+
+def test_wrong_mempool_match_fails_hash_check(mined, monkeypatch):
+    block, _ = mined
+    other = Wallet()
+    stranger = Transaction(other.public_key_hex, other.get_address(), COIN)
+    stranger.sign_transaction(other)
+    monkeypatch.setattr(compact_blocks, "short_txid", lambda key, txid: "00" * compact_blocks.SHORT_ID_BYTES)
+    partial = PartialBlock(make_compact_block(block), [stranger])
+    assert partial.missing() == []
+    with pytest.raises(ValueError):
+        partial.to_block()
+
+
+def test_inconsistent_tx_count_rejected(mined):
+    block, _ = mined
+    msg = make_compact_block(block)
+    msg["tx_count"] += 1
+    with pytest.raises(ValueError):
+        PartialBlock(msg, [])
@@ -0,0 +1,69 @@
+import asyncio
+import gc
+import io
+import os
+
+import pytest
+
+from benchmarks.bench_chain_export import rss_kb
+from benchmarks.synthetic import build_chain
+from export import read_export, stream_chain
+
+EXPORT_BLOCKS = 100_000
+RSS_GROWTH_LIMIT_KB = 8 * 1024   # весь экспорт — ~95 МБ ndjson; поток обязан держать порядка чанка
+RSS_DRIFT_LIMIT_KB = 2 * 1024
+
+
+@pytest.fixture(scope="module")
+def long_chain():
+    return build_chain(EXPORT_BLOCKS, txs_per_block=1)
+
+
+async def _drain_rss(chain, fmt: str) -> tuple[int, int, int]:
+    """(блоков, прирост RSS, дрейф RSS между первой четвертью и концом), КБ"""
+    base = peak = rss_kb()
+    samples, blocks = [], 0
+    async for chunk in stream_chain(chain, 0, fmt):
+        blocks += chunk.count(b"\n") if fmt == "ndjson" else 0
+        samples.append(rss_kb())
+        peak = max(peak, samples[-1])
+    return blocks, peak - base, samples[-1] - samples[len(samples) // 4]
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="RSS читается из /proc")
+@pytest.mark.parametrize("fmt", ["ndjson", "bin1"])
+def test_export_rss_stays_flat(long_chain, fmt):
+    gc.collect()
+    blocks, growth, drift = asyncio.run(_drain_rss(long_chain, fmt))
+    if fmt == "ndjson":
+        assert blocks == EXPORT_BLOCKS
+    assert growth < RSS_GROWTH_LIMIT_KB, f"RSS вырос на {growth} КБ за экспорт {EXPORT_BLOCKS} блоков"
+    assert drift < RSS_DRIFT_LIMIT_KB, f"RSS дрейфует на {drift} КБ"
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "bin1"])
+def test_export_round_trip(fmt):
+    chain = build_chain(300, txs_per_block=2)
+    buf = io.BytesIO()
+
+    async def drain():
+        async for chunk in stream_chain(chain, 0, fmt):
+            buf.write(chunk)
+
+    asyncio.run(drain())
+    buf.seek(0)
+    assert [b.hash for b in read_export(buf, fmt)] == [b.hash for b in chain.chain]
+
+
+def test_export_stops_at_reorg():
+    chain = build_chain(200, txs_per_block=0)
+    other = build_chain(200, txs_per_block=0, seed=2)
+    chunks = []
+
+    async def drain():
+        async for chunk in stream_chain(chain, 0, "ndjson"):
+            chunks.append(chunk)
+            chain.chain = other.chain  # реорганизация после первого чанка
+
+    asyncio.run(drain())
+    assert len(chunks) == 1
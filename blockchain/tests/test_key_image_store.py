@@ -0,0 +1,115 @@
+import pytest
+
+import key_image_store
+from anoncoin_core import (COIN, Block, Blockchain, Transaction, TxInput, TxOutput, Wallet, block_reward,
+                           compute_key_image, create_ring_signature, get_ring_outputs)
+from key_image_store import KeyImageStore
+
+
+def _spend(chain, wallet, receiver) -> Transaction:
+    coin = max(chain.utxo_set.available_for(wallet.get_address()), key=lambda o: o.amount)
+    keys, inputs = get_ring_outputs(coin, wallet.public_key_hex, blockchain=chain)
+    key_image = compute_key_image(wallet.private_key.to_string(), TxInput(coin.txid, coin.index))
+    tx = Transaction(None, receiver, COIN, tx_type="anonymous", inputs=inputs, key_image=key_image,
+                     outputs=[TxOutput("", 0, receiver, COIN), TxOutput("", 1, wallet.get_address(), coin.amount - COIN)])
+    tx.ring_signature = create_ring_signature(tx.signing_message(), wallet.private_key, keys, inputs, key_image)
+    return tx
+
+
+@pytest.fixture
+def spent(tmp_path):
+    """Цепочка с файловым хранилищем и одной добытой тратой кольцом; (цепочка, трата, путь файла)"""
+    path = str(tmp_path / "key_images.dat")
+    chain = Blockchain(difficulty=1)
+    chain.seen_key_images = KeyImageStore(path).open()
+    wallets = [Wallet() for _ in range(3)]
+    for wallet in wallets:
+        chain.output_index.learn(wallet.public_key_hex)
+        chain.mine_pending_transactions(wallet.get_address())
+    tx = _spend(chain, wallets[0], Wallet().get_address())
+    assert chain.add_transaction(tx)
+    chain.mine_pending_transactions(wallets[1].get_address())
+    chain.seen_key_images.close()
+    return chain, tx, path
+
+
+def test_add_discard_and_compaction():
+    store = KeyImageStore()
+    images = [f"{i:096x}" for i in range(100)]
+    for image in images[:60]:
+        store.add(image)
+    store.compact()
+    for image in images[60:]:
+        store.add(image)
+    store.discard(images[0])      # из массива
+    store.discard(images[99])     # из свежих добавлений
+    assert len(store) == 98
+    assert images[0] not in store and images[99] not in store and images[50] in store and images[70] in store
+
+    store.compact()
+    assert store.stats()["array"] == 98 and images[0] not in store
+    store.add(images[0])
+    assert images[0] in store
+
+
+def test_store_survives_restart_and_skips_reverification(spent, monkeypatch):
+    chain, tx, path = spent
+    reloaded = Blockchain(difficulty=1)
+    reloaded.seen_key_images = KeyImageStore(path).open()
+    assert reloaded.seen_key_images.height == len(chain.chain) - 1
+
+    # Блоки до вершины хранилища уже проверены: повторная проверка колец не нужна
+    def fail(self, spend):
+        raise AssertionError("кольцо проверено повторно")
+    monkeypatch.setattr(Blockchain, "_check_ring_spend", fail)
+    reloaded.load_chain(chain.chain)
+    monkeypatch.undo()
+
+    assert tx.key_image in reloaded.seen_key_images and len(reloaded.seen_key_images) == 1
+    assert not reloaded.add_transaction(tx)
+
+
+def test_store_of_another_chain_is_refilled(spent):
+    chain, tx, path = spent
+    other = Blockchain(difficulty=1)
+    other.seen_key_images = KeyImageStore(path).open()
+    other.load_chain(chain.chain[:-1])        # вершины хранилища в этой цепочке нет
+    assert tx.key_image not in other.seen_key_images and len(other.seen_key_images) == 0
+
+    other.seen_key_images.add("ff" * 49)
+    other.seen_key_images.commit(len(other.chain) - 1, other.chain[-1].hash)
+    other.seen_key_images.close()
+    assert "ff" * 49 in KeyImageStore(path).open()
+
+
+def test_corrupt_file_is_ignored(tmp_path):
+    path = tmp_path / "key_images.dat"
+    path.write_bytes(key_image_store.MAGIC + b"\0" * 60)
+    store = KeyImageStore(str(path)).open()
+    assert len(store) == 0 and store.height == -1
+
+
+def test_reorg_releases_key_image_and_persists(spent):
+    chain, tx, path = spent
+    chain.seen_key_images.open()
+    fork = len(chain.chain) - 1
+    # Конкурирующая ветка длиннее на блок и без траты
+    branch = list(chain.chain[:fork])
+    miner = Wallet().get_address()
+    for height in range(fork, fork + 2):
+        reward = Transaction(None, miner, block_reward(height), tx_type="coinbase", metadata=f"ветка {height}")
+        block = Block(height, branch[-1].hash, branch[-1].timestamp + 1, [reward])
+        block.mine_block(chain.difficulty)
+        branch.append(block)
+
+    assert chain.replace_chain(branch)
+    assert tx.key_image not in chain.seen_key_images
+    assert [t.key_image for t in chain.pending_transactions] == [tx.key_image]
+
+    chain.seen_key_images.close()
+    stored = KeyImageStore(path).open()
+    assert tx.key_image not in stored and stored.height == fork + 1
+    # Трата снова годится и попадает в новую ветку
+    chain.seen_key_images = stored
+    chain.mine_pending_transactions(miner)
+    assert tx.key_image in chain.seen_key_images
@@ -0,0 +1,91 @@
+import random
+
+from anoncoin_core import COIN, Blockchain, Transaction, TxInput, Wallet, get_ring_outputs
+
+
+def _chain(owners: int = 6):
+    """Каждый кошелёк добыл блок; первый ещё и получил перевод в 7 COIN"""
+    chain = Blockchain(difficulty=1)
+    wallets = [Wallet() for _ in range(owners)]
+    for wallet in wallets:
+        chain.output_index.learn(wallet.public_key_hex)
+        chain.mine_pending_transactions(wallet.get_address())
+    tx = Transaction(wallets[1].public_key_hex, wallets[0].get_address(), 7 * COIN)
+    tx.sign_transaction(wallets[1])
+    chain.add_transaction(tx)
+    chain.mine_pending_transactions(wallets[2].get_address())
+    return chain, wallets
+
+
+def test_decoys_are_unspent_outputs_of_other_owners_with_equal_amount():
+    chain, wallets = _chain()
+    sender = wallets[0]
+    reward = max(o.amount for o in chain.utxo_set.available_for(sender.get_address()))
+    picked = chain.output_index.sample_outputs(chain.chain, 5, reward, exclude=(sender.get_address(),),
+                                               rng=random.Random(3), utxo_set=chain.utxo_set)
+
+    owners = [pub for pub, _ in picked]
+    assert len(picked) == 5 and len(set(owners)) == 5
+    assert sender.public_key_hex not in owners
+    for public_key, outpoint in picked:
+        out = chain.utxo_set.get(outpoint.prev_txid, outpoint.output_index)
+        assert out.amount == reward
+        assert chain.output_index.public_key(out.address) == public_key
+
+
+def test_outpoint_resolves_index_position_to_chain_output():
+    chain, wallets = _chain()
+    index = chain.output_index
+    for position in range(len(index)):
+        outpoint = index.outpoint(position, chain.chain)
+        assert chain.utxo_set.get(outpoint.prev_txid, outpoint.output_index) is not None
+
+
+def test_spent_and_unknown_owners_are_skipped():
+    chain, wallets = _chain()
+    reward = max(o.amount for o in chain.utxo_set.available_for(wallets[0].get_address()))
+    spent = chain.utxo_set.available_for(wallets[3].get_address())[0]
+    chain.utxo_set.spend(spent.txid, spent.index)
+    stranger = Wallet()
+    chain.mine_pending_transactions(stranger.get_address())   # ключ выхода неизвестен
+
+    picked = chain.output_index.sample_outputs(chain.chain, 10, reward, rng=random.Random(5),
+                                               utxo_set=chain.utxo_set)
+    addresses = {chain.utxo_set.get(o.prev_txid, o.output_index).address for _, o in picked}
+    assert wallets[3].get_address() not in addresses
+    assert stranger.get_address() not in addresses
+
+
+def test_age_sampler_prefers_requested_block():
+    chain, wallets = _chain()
+    chain.output_index.age_sampler = lambda rng: 1   # блок перед вершиной: награда последнего кошелька
+    reward = max(o.amount for o in chain.utxo_set.available_for(wallets[0].get_address()))
+    picked = chain.output_index.sample_outputs(chain.chain, 1, reward, rng=random.Random(1),
+                                               utxo_set=chain.utxo_set)
+    assert [pub for pub, _ in picked] == [wallets[-1].public_key_hex]
+
+
+def test_wallet_ring_hides_coin_among_indexed_outputs():
+    chain, wallets = _chain()
+    coin = [o for o in chain.utxo_set.available_for(wallets[0].get_address()) if o.amount == 7 * COIN][0]
+    # Выход в 7 COIN единственный — кольцо из одной монеты; награды — кольцо полного размера
+    keys, inputs = get_ring_outputs(coin, wallets[0].public_key_hex, ring_size=5, blockchain=chain)
+    assert keys == [wallets[0].public_key_hex]
+    assert [i.to_dict() for i in inputs] == [TxInput(coin.txid, coin.index).to_dict()]
+
+    reward = [o for o in chain.utxo_set.available_for(wallets[0].get_address()) if o.amount != 7 * COIN][0]
+    keys, inputs = get_ring_outputs(reward, wallets[0].public_key_hex, ring_size=5, blockchain=chain)
+    assert len(keys) == 5 and keys.count(wallets[0].public_key_hex) == 1
+    real = keys.index(wallets[0].public_key_hex)
+    assert (inputs[real].prev_txid, inputs[real].output_index) == (reward.txid, reward.index)
+
+
+def test_disconnect_and_rebuild_keep_index_in_step_with_chain():
+    chain, wallets = _chain()
+    tip = chain.get_latest_block()
+    expected = len(chain.output_index) - sum(len(tx.outputs) if tx.outputs else 1 for tx in tip.transactions)
+    chain.disconnect_tip()
+    assert len(chain.output_index) == expected
+    chain.rebuild_state()
+    assert len(chain.output_index) == expected
+    assert chain.output_index.stats()["blocks"] == len(chain.chain)
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import peers
+from peers import BAN_THRESHOLD, HOST_BAN_THRESHOLD, PeerAddress, PeerManager, PeerSession
+
+
+async def _noop(_payload):
+    return None
+
+
+def _inbound(manager: PeerManager, address: str, listen: str = None) -> PeerSession:
+    session = PeerSession(address, send_text=_noop)
+    assert manager.accept_inbound(session)
+    session.listen_url = listen
+    return session
+
+
+def test_ban_does_not_spread_to_other_nodes_on_same_host():
+    manager = PeerManager()
+    bad = _inbound(manager, "127.0.0.1:50001", "ws://127.0.0.1:8001/ws")
+    manager.misbehaving(bad, BAN_THRESHOLD, "тест")
+
+    assert bad.closed
+    assert manager.is_banned("ws://127.0.0.1:8001/ws")
+    assert manager.is_banned("127.0.0.1:50001")
+    assert not manager.is_banned("127.0.0.1")
+    # Другой узел на том же хосте по-прежнему принимается
+    assert manager.accept_inbound(PeerSession("127.0.0.1:50002", send_text=_noop))
+
+
+def test_banned_listen_url_rejected_at_hello():
+    manager = PeerManager()
+    manager.misbehaving(_inbound(manager, "127.0.0.1:50001", "ws://127.0.0.1:8001/ws"), BAN_THRESHOLD, "тест")
+
+    again = _inbound(manager, "127.0.0.1:50003")
+    manager._on_hello(again, {"type": "hello", "node_id": "x", "listen": "ws://127.0.0.1:8001/ws"})
+    assert again.closed
+
+
+def test_host_banned_above_host_threshold():
+    manager = PeerManager(max_inbound=1000)
+    for port in range(HOST_BAN_THRESHOLD // BAN_THRESHOLD):
+        assert not manager.is_banned("10.0.0.1")
+        manager.misbehaving(_inbound(manager, f"10.0.0.1:{40000 + port}"), BAN_THRESHOLD, "тест")
+
+    assert manager.is_banned("10.0.0.1")
+    assert not manager.accept_inbound(PeerSession("10.0.0.1:49999", send_text=_noop))
+    assert manager.accept_inbound(PeerSession("10.0.0.2:40000", send_text=_noop))
+
+
+class _FakeSocket:
+    def __init__(self, frames):
+        self._frames = list(frames)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def send(self, _payload):
+        return None
+
+    async def close(self):
+        return None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._frames:
+            raise StopAsyncIteration
+        return self._frames.pop(0)
+
+
+def _dial(monkeypatch, frames) -> PeerAddress:
+    manager = PeerManager()
+    addr = PeerAddress("ws://127.0.0.1:8002/ws", "bootstrap")
+    addr.failures = 3
+    monkeypatch.setattr(peers.websockets, "connect", lambda *a, **kw: _FakeSocket(frames))
+    asyncio.run(manager._dial(addr))
+    return addr
+
+
+def test_normal_close_after_handshake_resets_failures(monkeypatch):
+    hello = json.dumps({"type": "hello", "node_id": "peer", "listen": "ws://127.0.0.1:8002/ws"})
+    addr = _dial(monkeypatch, [hello])
+    assert addr.failures == 0
+    assert addr.last_success > 0
+
+
+def test_close_without_handshake_counts_as_failure(monkeypatch):
+    addr = _dial(monkeypatch, [])
+    assert addr.failures == 4
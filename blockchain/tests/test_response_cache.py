@@ -0,0 +1,72 @@
+import logging
+
+import pytest
+
+from anoncoin_core import COIN, Blockchain, Transaction, Wallet
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def node():
+    logging.disable(logging.INFO)
+    chain = Blockchain(difficulty=1)
+    cache = ResponseCache(chain)
+    chain.add_listener(cache, replay=False)
+    return chain, cache, Wallet(), Wallet()
+
+
+def _balance(chain, cache, address):
+    return cache.get_or_compute("wallet_info", address, lambda: chain.get_balance(address))
+
+
+def test_hit_until_chain_changes(node):
+    chain, cache, miner, _ = node
+    address = miner.get_address()
+    assert _balance(chain, cache, address) == 0
+    assert _balance(chain, cache, address) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    chain.mine_pending_transactions(address)
+    assert _balance(chain, cache, address) == chain.get_balance(address) > 0
+    assert cache.invalidations >= 1
+
+
+def test_transaction_and_disconnect_invalidate(node):
+    chain, cache, miner, receiver = node
+    chain.mine_pending_transactions(miner.get_address())
+    calls = []
+
+    def pending_count():
+        calls.append(1)
+        return len(chain.pending_transactions)
+
+    assert cache.get_or_compute("pending", (), pending_count) == 0
+    tx = Transaction(miner.public_key_hex, receiver.get_address(), COIN)
+    tx.sign_transaction(miner)
+    assert chain.add_transaction(tx)
+    assert cache.get_or_compute("pending", (), pending_count) == 1
+
+    chain.mine_pending_transactions(miner.get_address())
+    assert cache.get_or_compute("pending", (), pending_count) == 0
+    chain.disconnect_tip()
+    assert cache.get_or_compute("pending", (), pending_count) == 1
+    assert len(calls) == 4
+
+
+def test_reset_on_load_chain(node):
+    chain, cache, miner, _ = node
+    chain.mine_pending_transactions(miner.get_address())
+    address = miner.get_address()
+    before = _balance(chain, cache, address)
+    chain.load_chain(chain.chain[:1])
+    assert _balance(chain, cache, address) == 0 != before
+
+
+def test_lru_eviction():
+    chain = Blockchain(difficulty=1)
+    cache = ResponseCache(chain, max_entries=2)
+    for key in ("a", "b", "a", "c"):
+        cache.get_or_compute("e", key, lambda: key)
+    assert cache.evictions == 1
+    assert cache.get_or_compute("e", "a", lambda: "recomputed") == "a"
+    assert cache.get_or_compute("e", "b", lambda: "recomputed") == "recomputed"
@@ -0,0 +1,173 @@
+import pytest
+
+from anoncoin_core import (COIN, LEGACY_ANON_UNTIL, Block, Blockchain, CoinTracker, Transaction, TxInput,
+                           TxOutput, Wallet, compute_key_image, create_ring_signature, generate_transaction_id,
+                           get_ring_outputs)
+
+
+def _funded(owners: int = 4):
+    """Цепочка, где каждый из owners кошельков добыл по блоку: выходы одной суммы для колец"""
+    chain = Blockchain(difficulty=1)
+    wallets = [Wallet() for _ in range(owners)]
+    for wallet in wallets:
+        chain.output_index.learn(wallet.public_key_hex)
+        chain.mine_pending_transactions(wallet.get_address())
+    return chain, wallets
+
+
+def _coin(chain, wallet) -> TxOutput:
+    return chain.utxo_set.available_for(wallet.get_address())[0]
+
+
+def _block(chain, txs, timestamp=None) -> Block:
+    tip = chain.get_latest_block()
+    block = Block(tip.index + 1, tip.hash, timestamp or tip.timestamp + 1, txs)
+    block.mine_block(chain.difficulty)
+    return block
+
+
+def _ring_spend(chain, wallet, coin, receiver, amount, ring=None) -> Transaction:
+    """Трата coin кольцом; ring — (ключи, выходы) вместо выбранного кошельком"""
+    keys, inputs = ring or get_ring_outputs(coin, wallet.public_key_hex, blockchain=chain)
+    key_image = compute_key_image(wallet.private_key.to_string(), TxInput(coin.txid, coin.index))
+    outputs = [TxOutput("", 0, receiver, amount)]
+    if coin.amount > amount:
+        outputs.append(TxOutput("", 1, wallet.get_address(), coin.amount - amount))
+    tx = Transaction(None, receiver, amount, tx_type="anonymous", inputs=inputs, outputs=outputs,
+                     key_image=key_image)
+    tx.ring_signature = create_ring_signature(tx.signing_message(), wallet.private_key, keys, inputs, key_image)
+    return tx
+
+
+def test_ring_spend_is_mined_and_links_by_key_image():
+    chain, wallets = _funded()
+    sender, receiver = wallets[0], Wallet()
+    coin = _coin(chain, sender)
+
+    tx = sender.create_anonymous_transaction(receiver.get_address(), 20 * COIN, blockchain=chain)
+    assert len(tx.inputs) == len(wallets)
+    assert TxInput(coin.txid, coin.index).to_dict() in [i.to_dict() for i in tx.inputs]
+    assert chain.add_transaction(tx)
+    chain.mine_pending_transactions(wallets[1].get_address())
+
+    assert tx.key_image in chain.seen_key_images
+    assert chain.utxo_set.get(generate_transaction_id(tx), 0).amount == 20 * COIN
+    # Монета остаётся в UTXO-наборе (кольцо её не называет), тратит её key image
+    assert chain.utxo_set.get(coin.txid, coin.index) is not None
+    assert sender.create_anonymous_transaction(receiver.get_address(), 50 * COIN, blockchain=chain) is None
+
+
+def test_key_image_does_not_depend_on_ring():
+    chain, wallets = _funded()
+    sender = wallets[0]
+    coin = _coin(chain, sender)
+    first = _ring_spend(chain, sender, coin, Wallet().get_address(), COIN)
+    other_ring = ([sender.public_key_hex, wallets[1].public_key_hex],
+                  [TxInput(coin.txid, coin.index), TxInput(_coin(chain, wallets[1]).txid, 0)])
+    second = _ring_spend(chain, sender, coin, Wallet().get_address(), 2 * COIN, ring=other_ring)
+    assert first.key_image == second.key_image
+
+    assert chain.add_transaction(first)
+    assert not chain.add_transaction(second)
+    chain.mine_pending_transactions(sender.get_address())
+    assert not chain.add_transaction(second)
+    assert not chain.connect_block(_block(chain, [second]))
+
+
+def test_ring_cannot_spend_someone_elses_output():
+    chain, wallets = _funded()
+    thief, victim = wallets[0], wallets[1]
+    stolen = _coin(chain, victim)
+    # Ключ вора на месте чужого выхода: владелец выхода не совпадает с ключом кольца
+    ring = ([thief.public_key_hex], [TxInput(stolen.txid, stolen.index)])
+    tx = _ring_spend(chain, thief, stolen, thief.get_address(), stolen.amount, ring=ring)
+    assert not chain.add_transaction(tx)
+    assert not chain.connect_block(_block(chain, [tx]))
+
+
+def test_tampered_outputs_break_signature():
+    chain, wallets = _funded()
+    sender = wallets[0]
+    tx = _ring_spend(chain, sender, _coin(chain, sender), Wallet().get_address(), COIN)
+    tx.outputs[1] = TxOutput("", 1, wallets[1].get_address(), tx.outputs[1].amount)
+    assert not chain.add_transaction(tx)
+
+
+def test_rings_use_equal_amounts_only():
+    chain, wallets = _funded()
+    sender, receiver = wallets[0], Wallet()
+    chain.pending_transactions.append(_ring_spend(chain, sender, _coin(chain, sender), receiver.get_address(), COIN))
+    chain.mine_pending_transactions(wallets[1].get_address())
+    # Выход в 1 COIN единственный: приманок той же суммы нет, а 50 COIN есть у всех
+    keys, inputs = get_ring_outputs(_coin(chain, receiver), receiver.public_key_hex, blockchain=chain)
+    assert len(inputs) == 1
+    keys, inputs = get_ring_outputs(_coin(chain, wallets[2]), wallets[2].public_key_hex, blockchain=chain)
+    assert len(inputs) == len(wallets)
+
+
+def test_disconnect_releases_key_image():
+    chain, wallets = _funded()
+    sender = wallets[0]
+    tx = _ring_spend(chain, sender, _coin(chain, sender), Wallet().get_address(), COIN)
+    chain.pending_transactions.append(tx)
+    chain.mine_pending_transactions(sender.get_address())
+
+    chain.disconnect_tip()
+    assert tx.key_image not in chain.seen_key_images
+    assert [t.key_image for t in chain.pending_transactions] == [tx.key_image]
+
+
+def test_tracker_sees_ring_spend_by_key_image():
+    chain, wallets = _funded()
+    sender = wallets[0]
+    tracker = CoinTracker([sender.get_address()], key_image_of=sender.output_key_image).rescan(chain)
+    chain.add_listener(tracker, replay=False)
+    coin = _coin(chain, sender)
+
+    chain.pending_transactions.append(_ring_spend(chain, sender, coin, Wallet().get_address(), COIN))
+    chain.mine_pending_transactions(wallets[1].get_address())
+    assert (coin.txid, coin.index) not in tracker.coins
+    assert tracker.balances[sender.get_address()] == coin.amount - COIN
+
+    chain.disconnect_tip()
+    assert (coin.txid, coin.index) in tracker.coins
+
+
+def _legacy_spend(coin, receiver) -> Transaction:
+    """Анонимная трата прежнего формата: явный вход и кольцо ключей без схемы"""
+    return Transaction(None, receiver, coin.amount, tx_type="anonymous", timestamp=LEGACY_ANON_UNTIL - 10,
+                       inputs=[TxInput(coin.txid, coin.index)],
+                       outputs=[TxOutput("", 0, receiver, coin.amount)],
+                       key_image="ab" * 49, ring_signature={"ring": [], "c0": "00", "s": []})
+
+
+def test_legacy_anonymous_blocks_stay_valid():
+    chain = Blockchain(difficulty=1)
+    miner = Wallet()
+    chain.mine_pending_transactions(miner.get_address())
+    tx = _legacy_spend(_coin(chain, miner), Wallet().get_address())
+
+    assert not chain.add_transaction(tx)
+    assert not chain.connect_block(_block(chain, [tx], timestamp=LEGACY_ANON_UNTIL))
+    assert chain.connect_block(_block(chain, [tx], timestamp=LEGACY_ANON_UNTIL - 1))
+    assert tx.key_image in chain.seen_key_images
+
+    blocks = list(chain.chain)
+    chain.load_chain(blocks)
+    assert len(chain.chain) == len(blocks) and chain.stats.is_valid
+
+
+@pytest.mark.parametrize("tx_type", ["standard", "anonymous"])
+def test_explicit_inputs_rejected_after_activation(tx_type):
+    chain = Blockchain(difficulty=1)
+    miner = Wallet()
+    chain.mine_pending_transactions(miner.get_address())
+    coin = _coin(chain, miner)
+    tx = Transaction(miner.public_key_hex if tx_type == "standard" else None, miner.get_address(), coin.amount,
+                     tx_type=tx_type, inputs=[TxInput(coin.txid, coin.index)],
+                     outputs=[TxOutput("", 0, miner.get_address(), coin.amount)])
+    if tx_type == "standard":
+        tx.sign_transaction(miner)
+    assert not chain.add_transaction(tx)
+    assert not chain.connect_block(_block(chain, [tx]))
+    assert chain.utxo_set.get(coin.txid, coin.index) is not None
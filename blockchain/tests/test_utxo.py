@@ -0,0 +1,90 @@
+import pytest
+
+from anoncoin_core import (COIN, LEGACY_ANON_UNTIL, MAX_SUPPLY, Block, Blockchain, Transaction, TxInput, TxOutput,
+                           UTXOSet, Wallet, generate_transaction_id, strict_units)
+
+
+def _funded():
+    chain = Blockchain(difficulty=1)
+    miner = Wallet()
+    chain.mine_pending_transactions(miner.get_address())
+    return chain, miner, chain.utxo_set.available_for(miner.get_address())[0]
+
+
+def _block(chain, txs) -> Block:
+    # Явные входы допустимы только в блоках до LEGACY_ANON_UNTIL
+    tip = chain.get_latest_block()
+    block = Block(tip.index + 1, tip.hash, LEGACY_ANON_UNTIL - 1, txs)
+    block.mine_block(chain.difficulty)
+    return block
+
+
+def _legacy_spend(coin, outputs, key_image="ab" * 49) -> Transaction:
+    return Transaction(None, outputs[0].address, outputs[0].amount, tx_type="anonymous",
+                       timestamp=LEGACY_ANON_UNTIL - 10, inputs=[TxInput(coin.txid, coin.index)],
+                       outputs=outputs, key_image=key_image, ring_signature={"ring": [], "c0": "00", "s": []})
+
+
+def _state(chain):
+    return len(chain.utxo_set), len(chain.seen_key_images), len(chain.chain)
+
+
+def test_add_spend_get_roundtrip():
+    utxo = UTXOSet()
+    txid, address = "11" * 32, "22" * 32
+    utxo.add(TxOutput(txid, 0, address, 5 * COIN))
+    utxo.add(TxOutput(txid, 1, address, MAX_SUPPLY))
+    utxo.add(TxOutput("genesis", 0, "GENESIS", 1))   # не hex — хранится как есть
+    assert len(utxo) == 3 and utxo.get(txid, 1).amount == MAX_SUPPLY
+    assert [o.amount for o in utxo.available_for(address)] == [5 * COIN, MAX_SUPPLY]
+    utxo.spend(txid, 0)
+    assert not utxo.has(txid, 0) and utxo.has(txid, 1) and len(utxo) == 2
+
+
+@pytest.mark.parametrize("amount", [-1, MAX_SUPPLY + 1, 2 ** 63, 2 ** 64, 1.5, True])
+def test_out_of_range_amount_is_value_error(amount):
+    utxo = UTXOSet()
+    with pytest.raises(ValueError):
+        utxo.add(TxOutput("11" * 32, 0, "22" * 32, amount))
+    with pytest.raises(ValueError):
+        utxo.add(TxOutput("genesis", 0, "GENESIS", amount))
+    assert len(utxo) == 0
+
+
+@pytest.mark.parametrize("amount", [-1, MAX_SUPPLY + 1, 2 ** 64])
+def test_strict_units_bounds(amount):
+    with pytest.raises(ValueError):
+        strict_units(amount)
+
+
+@pytest.mark.parametrize("amount", [MAX_SUPPLY + 1, 2 ** 64])
+def test_rejected_block_restores_spent_inputs(amount):
+    chain, miner, coin = _funded()
+    before = _state(chain)
+    thief = Wallet().get_address()
+    # Первая транзакция блока тратит монету, вторая создаёт выход с недопустимой суммой
+    ok = _legacy_spend(coin, [TxOutput("", 0, thief, coin.amount)])
+    bad = _legacy_spend(coin, [TxOutput("", 0, thief, amount)], key_image="cd" * 49)
+    bad.inputs = []
+
+    assert not chain.connect_block(_block(chain, [ok, bad]))
+    assert _state(chain) == before
+    assert chain.utxo_set.get(coin.txid, coin.index) is not None
+    assert chain.utxo_set.get(generate_transaction_id(ok), 0) is None
+    assert "ab" * 49 not in chain.seen_key_images
+
+    # После отказа тот же вход тратится корректным блоком
+    assert chain.connect_block(_block(chain, [ok]))
+    assert chain.utxo_set.get(coin.txid, coin.index) is None
+
+
+def test_mempool_rejects_out_of_range_amounts():
+    chain, miner, coin = _funded()
+    tx = Transaction(miner.public_key_hex, Wallet().get_address(), MAX_SUPPLY + 1)
+    tx.sign_transaction(miner)
+    assert not chain.add_transaction(tx)
+
+    tx = Transaction(miner.public_key_hex, Wallet().get_address(), COIN,
+                     outputs=[TxOutput("", 0, miner.get_address(), 2 ** 64)])
+    tx.sign_transaction(miner)
+    assert not chain.add_transaction(tx)
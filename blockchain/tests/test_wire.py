@@ -0,0 +1,132 @@
+import asyncio
+import io
+import struct
+import zlib
+
+import pytest
+
+import wire
+from anoncoin_core import COIN, Blockchain, Transaction, Wallet
+from peers import PeerManager, PeerSession
+from wire import WireError, decode_frame, encode_frame, read_frame
+
+CODECS = [None, "zlib"] + (["zstd"] if wire.zstandard is not None else [])
+
+
+@pytest.fixture(scope="module")
+def block_message():
+    chain = Blockchain(difficulty=1)
+    sender, receiver = Wallet(), Wallet()
+    for i in range(20):
+        tx = Transaction(sender.public_key_hex, receiver.get_address(), (i + 1) * COIN // 3, metadata=f"tx {i}")
+        tx.sign_transaction(sender)
+        chain.pending_transactions.append(tx)
+    chain.mine_pending_transactions(sender.get_address())
+    return {"type": "new_block", "block": chain.get_latest_block().to_dict()}
+
+
+@pytest.mark.parametrize("payload_format", ["bin1", "cjson"])
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip(block_message, payload_format, codec):
+    frame = encode_frame(block_message, codec, payload_format)
+    assert decode_frame(frame) == block_message
+    if codec:
+        assert frame[3] & (wire.FLAG_ZSTD | wire.FLAG_ZLIB)
+
+
+def test_round_trip_preserves_odd_values():
+    msg = {"type": "x", "n": None, "t": True, "f": False, "big": 1 << 80, "neg": -5, "fl": 0.1,
+           "hex_upper": "ABCDEF", "odd_hex": "abc", "nested": [{"k": []}, "ü"]}
+    for payload_format in ("bin1", "cjson"):
+        assert decode_frame(encode_frame(msg, "zlib", payload_format)) == msg
+
+
+def test_unencodable_in_bin1_raises_wire_error():
+    with pytest.raises(WireError):
+        encode_frame({"k" * 300: 1})
+    with pytest.raises(WireError):
+        encode_frame({"v": 10 ** 300})
+
+
+def _corrupt(frame: bytes, at: int) -> bytes:
+    return frame[:at] + bytes([frame[at] ^ 0xFF]) + frame[at + 1:]
+
+
+@pytest.mark.parametrize("payload_format", ["bin1", "cjson"])
+def test_corrupt_frames_raise_wire_error(block_message, payload_format):
+    frame = encode_frame(block_message, "zlib", payload_format)
+    header = struct.calcsize("<2sBBI")
+    bad_frames = [
+        frame[:3],                         # короче заголовка
+        b"XX" + frame[2:],                 # чужая сигнатура
+        frame[:2] + b"\x09" + frame[3:],   # неизвестная версия
+        frame[:-1],                        # обрезан
+        frame + b"\x00",                   # лишний байт после нагрузки
+        _corrupt(frame, header + 5),       # испорченный сжатый поток
+    ]
+    for bad in bad_frames:
+        with pytest.raises(WireError):
+            decode_frame(bad)
+
+
+def test_corrupt_bin1_payload():
+    raw = encode_frame({"type": "x", "list": [1, 2, 3]})
+    header = struct.calcsize("<2sBBI")
+    with pytest.raises(WireError):
+        decode_frame(raw[:header] + b"\xee" + raw[header + 1:])  # неизвестный тег
+    cut = raw[header:header + 4]  # длина словаря обрезана посередине
+    with pytest.raises(WireError):
+        decode_frame(struct.pack("<2sBBI", b"AC", 1, 0, len(cut)) + cut)
+    not_dict = bytearray()
+    wire._encode_value(not_dict, [1])
+    with pytest.raises(WireError):
+        decode_frame(struct.pack("<2sBBI", b"AC", 1, 0, len(not_dict)) + bytes(not_dict))
+
+
+def test_decompression_bomb_rejected(monkeypatch):
+    monkeypatch.setattr(wire, "MAX_FRAME_SIZE", 1024)
+    payload = zlib.compress(b"{" + b" " * 10_000 + b"}")
+    with pytest.raises(WireError):
+        decode_frame(struct.pack("<2sBBI", b"AC", 1, wire.FLAG_ZLIB | wire.FLAG_JSON, len(payload)) + payload)
+
+
+def test_read_frame_stream(block_message):
+    frames = [encode_frame(block_message, "zlib"), encode_frame({"type": "x"})]
+    stream = io.BytesIO(b"".join(frames))
+    assert [decode_frame(read_frame(stream)), decode_frame(read_frame(stream))] == [block_message, {"type": "x"}]
+    assert read_frame(stream) is None
+    with pytest.raises(WireError):
+        read_frame(io.BytesIO(frames[0][:-3]))
+    with pytest.raises(WireError):
+        read_frame(io.BytesIO(frames[0][:4]))
+
+
+async def _noop(_payload):
+    return None
+
+
+def _session(features: set, local: set) -> PeerSession:
+    session = PeerSession("127.0.0.1:1", send_text=_noop)
+    session.features, session.local_features = features, local
+    return session
+
+
+def test_wire_format_negotiation():
+    local = {"bin1", "cjson", "zlib", "zstd"}
+    assert _session({"bin1", "cjson", "zlib"}, local).wire_format() == ("cjson", "zlib")
+    assert _session({"bin1", "zstd"}, local).wire_format() == ("bin1", "zstd")
+    assert _session({"bin1", "cjson"}, local).wire_format() == ("json", None)
+    assert _session(set(), local).wire_format() == ("json", None)
+
+
+def test_enqueue_falls_back_to_json_text():
+    session = _session({"bin1", "zlib"}, {"bin1", "zlib"})
+    session.enqueue_message({"type": "x", "v": 10 ** 300})
+    assert isinstance(session._queue[0][0], str)
+
+
+def test_corrupt_frame_penalises_peer():
+    manager = PeerManager()
+    session = PeerSession("127.0.0.1:2", send_text=_noop)
+    asyncio.run(manager.dispatch(session, b"AC\x01\x00\xff\xff\xff\xff"))
+    assert session.misbehavior == 10
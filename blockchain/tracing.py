@@ -0,0 +1,243 @@
+"""
+Трассировка узла по запросу: спаны и сэмплирующий профилировщик, без внешних сборщиков.
+
+Спаны (span / traced) записываются только когда трассировка включена
+(enable() или ANONCOIN_TRACE=1); выключенный span — это вызов функции и
+проверка флага. Спаны экспортируются в формате Chrome Trace Event
+(chrome://tracing, Perfetto): строка — поток, а для кода внутри asyncio —
+отдельная задача, поэтому вложенность спанов сохраняется и при await.
+
+Сэмплер раз в interval секунд снимает стеки всех потоков (sys._current_frames)
+и копит их в свёрнутом виде "frame;frame;frame count" — вход для flamegraph.pl,
+speedscope и inferno.
+
+    with span("validate_balance", address=addr):
+        ...
+
+    @traced("handle_p2p_message", args=lambda peer, msg: {"type": msg.get("type")})
+    async def handle_p2p_message(peer, msg): ...
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, deque
+from itertools import count
+from typing import Callable, Optional
+
+MAX_SPANS = 200_000           # последние спаны; старые вытесняются
+SAMPLE_INTERVAL = 0.005       # сек. между снимками стеков
+MAX_STACK_DEPTH = 64
+
+_enabled = os.environ.get("ANONCOIN_TRACE", "") not in ("", "0")
+_events: deque = deque(maxlen=MAX_SPANS)
+_started_ns = time.perf_counter_ns()
+# задача -> номер строки; слабые ключи: завершённые задачи не копятся, а номер
+# не достаётся новой задаче с тем же id()
+_task_ids: "weakref.WeakKeyDictionary[asyncio.Task, int]" = weakref.WeakKeyDictionary()
+_next_task_id = count(0x10000)
+_PID = os.getpid()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def clear():
+    _events.clear()
+    _task_ids.clear()
+
+
+def _track_id() -> int:
+    """Строка трассы: asyncio-задача (если есть) или поток"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is None:
+        return threading.get_ident() & 0xFFFF
+    # Маленькие стабильные номера задач, чтобы не путать с потоками
+    tid = _task_ids.get(task)
+    if tid is None:
+        tid = _task_ids[task] = next(_next_task_id)
+    return tid
+
+
+class _Span:
+    __slots__ = ("name", "args", "start", "tid")
+
+    def __init__(self, name: str, args: Optional[dict]):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.tid = _track_id()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": (self.start - _started_ns) / 1000,
+            "dur": (end - self.start) / 1000,
+            "pid": _PID,
+            "tid": self.tid,
+        }
+        if self.args or exc_type:
+            event["args"] = dict(self.args or {}, **({"error": exc_type.__name__} if exc_type else {}))
+        _events.append(event)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **args):
+    """Контекстный менеджер спана; при выключенной трассировке ничего не записывает"""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, args)
+
+
+def traced(name: Optional[str] = None, args: Optional[Callable[..., dict]] = None):
+    """
+    Декоратор: каждый вызов функции — спан. args(*call_args, **call_kwargs) -> dict
+    добавляет атрибуты (вызывается только при включённой трассировке).
+    Поддерживает и корутины.
+    """
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*a, **kw):
+                if not _enabled:
+                    return await fn(*a, **kw)
+                with _Span(span_name, args(*a, **kw) if args else None):
+                    return await fn(*a, **kw)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if not _enabled:
+                return fn(*a, **kw)
+            with _Span(span_name, args(*a, **kw) if args else None):
+                return fn(*a, **kw)
+        return wrapper
+    return decorator
+
+
+# ==========================
+# СЭМПЛИРОВАНИЕ СТЕКОВ
+# ==========================
+class StackSampler:
+    """Фоновый поток, периодически снимающий стеки всех остальных потоков"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="anoncoin-stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                self.stacks[self._fold(names.get(ident, str(ident)), frame)] += 1
+                self.samples += 1
+
+    @staticmethod
+    def _fold(thread_name: str, frame) -> str:
+        frames = []
+        while frame is not None and len(frames) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# ==========================
+# ЭКСПОРТ
+# ==========================
+def chrome_trace() -> dict:
+    events = list(_events)
+    # Подписи строк: задачи asyncio и потоки
+    meta = [{"name": "thread_name", "ph": "M", "pid": _PID, "tid": tid,
+             "args": {"name": f"asyncio task {tid - 0x10000}" if tid >= 0x10000 else f"thread {tid}"}}
+            for tid in {e["tid"] for e in events}]
+    return {"traceEvents": meta + events, "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(path: str) -> int:
+    """Записать спаны в Chrome Trace JSON; возвращает число спанов"""
+    trace = chrome_trace()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace, f, separators=(",", ":"))
+    return len(trace["traceEvents"])
+
+
+def write_folded(path: str, sampler: StackSampler) -> int:
+    """Записать свёрнутые стеки сэмплера (flamegraph); возвращает число сэмплов"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(sampler.folded())
+    return sampler.samples
+
+
+def stats() -> dict:
+    return {"enabled": _enabled, "spans": len(_events), "max_spans": MAX_SPANS}
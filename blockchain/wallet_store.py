@@ -0,0 +1,217 @@
+"""
+Хранилище кошельков узла: запись на каждый кошелёк вместо перезаписи wallets.json.
+
+wallets.dat — журнал записей фиксированной длины (адрес 32 байта, приватный
+ключ 48, публичный 96), только дозапись; оборванная последняя запись после
+сбоя отбрасывается при открытии.
+
+wallets.idx — отсортированный по адресу индекс (адрес -> номер записи) для
+первых covered записей журнала. При старте он лишь отображается в память (mmap),
+а в словарь читается только «хвост» журнала, дописанный после последней
+компакции. Поиск — двоичный по mmap, поэтому старт с миллионом кошельков не
+читает и не разбирает весь файл, а память занимает только хвост.
+
+Объекты Wallet создаются по запросу из hex-ключей (Wallet.from_keys), SigningKey —
+только при первой подписи; недавно использованные кошельки держатся в LRU.
+"""
+
+import logging
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from heapq import merge
+from typing import Iterator, Optional
+
+from anoncoin_core import Wallet
+from persistence import atomic_write
+
+RECORD = struct.Struct("32s48s96s")        # адрес, приватный ключ, публичный ключ
+INDEX_ENTRY = struct.Struct(">32sI")       # адрес, номер записи
+INDEX_HEADER = struct.Struct(">4sI")       # магия, число проиндексированных записей
+INDEX_MAGIC = b"AWI1"
+COMPACT_THRESHOLD = 50_000   # записей в хвосте — пора переписать индекс
+WALLET_CACHE_SIZE = 1024     # материализованных кошельков в LRU
+
+
+class WalletStore:
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        self.path = path
+        self.index_path = index_path or os.path.splitext(path)[0] + ".idx"
+        self._records = 0
+        self._covered = 0                          # записей в wallets.idx
+        self._index: Optional[mmap.mmap] = None
+        self._tail: dict[bytes, int] = {}          # адрес -> номер записи, не попавшие в индекс
+        self._cache: OrderedDict[str, Wallet] = OrderedDict()
+        self._fd: Optional[int] = None
+
+    # ---------- открытие / закрытие ----------
+    def open(self):
+        self.close()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = os.fstat(self._fd).st_size
+        if size % RECORD.size:
+            logging.warning(f"Хранилище кошельков: отброшена оборванная запись ({size % RECORD.size} байт)")
+            size -= size % RECORD.size
+            os.ftruncate(self._fd, size)
+        self._records = size // RECORD.size
+        self._open_index()
+        self._load_tail()
+        logging.info(f"Хранилище кошельков: {self._records} записей, "
+                     f"в индексе {self._covered}, в хвосте {len(self._tail)}")
+        if len(self._tail) > COMPACT_THRESHOLD:
+            self.compact()
+        return self
+
+    def close(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._covered = 0
+        self._tail = {}
+        self._cache.clear()
+
+    def _open_index(self):
+        self._covered = 0
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) < INDEX_HEADER.size:
+            return
+        with open(self.index_path, "rb") as f:
+            index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, covered = INDEX_HEADER.unpack_from(index)
+        if magic != INDEX_MAGIC or covered > self._records \
+                or len(index) != INDEX_HEADER.size + covered * INDEX_ENTRY.size:
+            # Индекс от другого журнала (или журнал обрезан) — построим заново из хвоста
+            logging.warning("Индекс кошельков не соответствует журналу, будет перестроен")
+            index.close()
+            return
+        self._index, self._covered = index, covered
+
+    def _load_tail(self):
+        self._tail = {}
+        count = self._records - self._covered
+        if not count:
+            return
+        data = os.pread(self._fd, count * RECORD.size, self._covered * RECORD.size)
+        for i in range(count):
+            offset = i * RECORD.size
+            self._tail[data[offset:offset + 32]] = self._covered + i
+
+    # ---------- поиск ----------
+    def _find(self, key: bytes) -> Optional[int]:
+        record = self._tail.get(key)
+        if record is not None or self._index is None:
+            return record
+        index, lo, hi = self._index, 0, self._covered
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = INDEX_HEADER.size + mid * INDEX_ENTRY.size
+            probe = index[offset:offset + 32]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return INDEX_ENTRY.unpack_from(index, offset)[1]
+        return None
+
+    @staticmethod
+    def _key(address: str) -> Optional[bytes]:
+        try:
+            key = bytes.fromhex(address)
+        except (TypeError, ValueError):
+            return None
+        return key if len(key) == 32 else None
+
+    def __contains__(self, address: str) -> bool:
+        key = self._key(address)
+        return key is not None and self._find(key) is not None
+
+    def __len__(self) -> int:
+        return self._records
+
+    def get(self, address: str) -> Optional[Wallet]:
+        """Кошелёк по адресу; ключи читаются с диска, SigningKey — при первой подписи"""
+        wallet = self._cache.get(address)
+        if wallet is not None:
+            self._cache.move_to_end(address)
+            return wallet
+        key = self._key(address)
+        record = self._find(key) if key is not None else None
+        if record is None:
+            return None
+        _, priv, pub = RECORD.unpack(os.pread(self._fd, RECORD.size, record * RECORD.size))
+        wallet = Wallet.from_keys(priv.hex(), pub.hex())
+        self._cache[address] = wallet
+        if len(self._cache) > WALLET_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return wallet
+
+    def addresses(self) -> Iterator[str]:
+        """Все адреса в порядке записи (читается журнал, не индекс)"""
+        chunk = 4096
+        for start in range(0, self._records, chunk):
+            count = min(chunk, self._records - start)
+            data = os.pread(self._fd, count * RECORD.size, start * RECORD.size)
+            for i in range(count):
+                yield data[i * RECORD.size:i * RECORD.size + 32].hex()
+
+    # ---------- запись ----------
+    def add(self, wallet: Wallet) -> bool:
+        return self.add_many([wallet]) == 1
+
+    def add_many(self, wallets) -> int:
+        """Дописать кошельки одним write + fsync; уже известные адреса пропускаются"""
+        records, keys, seen = [], [], set()
+        for w in wallets:
+            address = w.get_address()
+            key = bytes.fromhex(address)
+            if key in seen or self._find(key) is not None:
+                continue
+            records.append(RECORD.pack(key, bytes.fromhex(w.private_key_hex), bytes.fromhex(w.public_key_hex)))
+            keys.append(key)
+            seen.add(key)
+            self._cache[address] = w
+        if not records:
+            return 0
+        os.pwrite(self._fd, b"".join(records), self._records * RECORD.size)
+        os.fsync(self._fd)
+        for key in keys:
+            self._tail[key] = self._records
+            self._records += 1
+        while len(self._cache) > WALLET_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return len(records)
+
+    # ---------- компакция индекса ----------
+    def needs_compaction(self) -> bool:
+        return len(self._tail) > COMPACT_THRESHOLD
+
+    def compact(self):
+        """Слить хвост с индексом в новый отсортированный wallets.idx"""
+        old = self._index
+        existing = ()
+        if old is not None:
+            existing = (INDEX_ENTRY.unpack_from(old, INDEX_HEADER.size + i * INDEX_ENTRY.size)
+                        for i in range(self._covered))
+        entries = merge(existing, sorted(self._tail.items()))
+        body = b"".join(INDEX_ENTRY.pack(key, record) for key, record in entries)
+        atomic_write(self.index_path, INDEX_HEADER.pack(INDEX_MAGIC, self._records) + body)
+        if old is not None:
+            old.close()
+            self._index = None
+        self._open_index()
+        self._tail = {}
+        self._load_tail()
+
+    def stats(self) -> dict:
+        return {
+            "wallets": self._records,
+            "indexed": self._covered,
+            "tail": len(self._tail),
+            "cached": len(self._cache),
+            "data_bytes": self._records * RECORD.size,
+        }
@@ -0,0 +1,289 @@
+"""
+Бинарный формат P2P-сообщений anonCoin (версия 1).
+
+Кадр:  b"AC" | версия (u8) | флаги (u8) | длина полезной нагрузки (u32 LE) | нагрузка
+
+Флаги: бит 0 — нагрузка сжата zlib, бит 1 — zstd, бит 2 — нагрузка JSON.
+Нагрузка bin1 — то же дерево dict/list/str/int/float, что и в JSON-сообщениях,
+но hex-строки (ключи, хеши) и base64-строки (подписи) хранятся сырыми байтами,
+а известные ключи словарей — одним байтом. Декодирование восстанавливает
+исходные строки побайтно, поэтому хеши блоков и подписи не меняются.
+
+Нагрузка JSON (cjson) — текст сообщения, как у JSON-пиров, в том же кадре и
+со сжатием. bin1 на чистом Python в разы медленнее C-модуля json и выигрывает
+только в размере, который даёт и сжатие, поэтому при общем "cjson" пиры
+обмениваются сжатым JSON, а bin1 остаётся для экспорта цепочки и пиров без
+"cjson".
+
+Формат согласуется в hello (features: "bin1", "cjson", "zlib", "zstd"); пиры
+без них продолжают получать JSON-текст.
+"""
+
+import json
+import struct
+import zlib
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+
+try:  # zstd необязателен: без него используется zlib
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+MAGIC = b"AC"
+WIRE_VERSION = 1
+FLAG_ZLIB = 0x01
+FLAG_ZSTD = 0x02
+FLAG_JSON = 0x04
+COMPRESS_THRESHOLD = 512  # байт; меньшие сообщения не сжимаем
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+_HEADER = struct.Struct("<2sBBI")
+
+# Только дописывать в конец: индекс ключа — часть протокола
+KEYS = [
+    "type", "block", "transaction", "chain", "transactions",
+    "index", "previous_hash", "timestamp", "nonce", "manifest", "hash",
+    "sender_pubkey", "receiver_address", "amount", "signature", "metadata",
+    "tx_type", "ring_signature", "inputs", "outputs", "key_image",
+    "prev_txid", "output_index", "txid", "address",
+    "header", "short_id_nonce", "tx_count", "short_ids", "prefilled", "tx", "indexes",
+    "node_id", "listen", "features", "addrs",
+]
+_KEY_ID = {k: i for i, k in enumerate(KEYS)}
+
+T_NONE, T_FALSE, T_TRUE, T_INT, T_FLOAT = 0x00, 0x01, 0x02, 0x03, 0x04
+T_STR8, T_STR32, T_HEX8, T_HEX32, T_B64_8, T_B64_32 = 0x05, 0x06, 0x07, 0x08, 0x09, 0x0A
+T_LIST, T_DICT, T_BIGINT = 0x0B, 0x0C, 0x0D
+KEY_INLINE = 0xFF
+
+_u8 = struct.Struct("<B")
+_u32 = struct.Struct("<I")
+_i64 = struct.Struct("<q")
+_f64 = struct.Struct("<d")
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+_HEX_CHARS = frozenset("0123456789abcdef")
+
+
+class WireError(ValueError):
+    """Некорректный бинарный кадр"""
+
+
+def supported_features() -> list[str]:
+    """Возможности для hello: формат + доступные алгоритмы сжатия"""
+    features = ["bin1", "cjson", "zlib"]
+    if zstandard is not None:
+        features.append("zstd")
+    return features
+
+
+# ==========================
+# КОДИРОВАНИЕ
+# ==========================
+def _put_sized(out: bytearray, tag8: int, tag32: int, raw: bytes):
+    n = len(raw)
+    if n < 256:
+        out += bytes((tag8, n))
+    else:
+        out.append(tag32)
+        out += _u32.pack(n)
+    out += raw
+
+
+def _encode_str(out: bytearray, s: str):
+    # hex в нижнем регистре (ключи, хеши, txid) -> сырые байты
+    if len(s) >= 8 and not len(s) & 1 and _HEX_CHARS.issuperset(s):
+        _put_sized(out, T_HEX8, T_HEX32, bytes.fromhex(s))
+        return
+    # канонический base64 (подписи) -> сырые байты
+    if len(s) >= 16 and not len(s) & 3:
+        try:
+            raw = b64decode(s, validate=True)
+            if b64encode(raw).decode() == s:
+                _put_sized(out, T_B64_8, T_B64_32, raw)
+                return
+        except (BinasciiError, ValueError):
+            pass
+    _put_sized(out, T_STR8, T_STR32, s.encode())
+
+
+def _encode_value(out: bytearray, v):
+    if v is None:
+        out.append(T_NONE)
+    elif v is True:
+        out.append(T_TRUE)
+    elif v is False:
+        out.append(T_FALSE)
+    elif isinstance(v, int):
+        if _INT64_MIN <= v <= _INT64_MAX:
+            out.append(T_INT)
+            out += _i64.pack(v)
+        else:
+            raw = str(v).encode()
+            if len(raw) > 255:
+                raise WireError("целое длиннее 255 цифр не кодируется в bin1")
+            out += bytes((T_BIGINT, len(raw)))
+            out += raw
+    elif isinstance(v, float):
+        out.append(T_FLOAT)
+        out += _f64.pack(v)
+    elif isinstance(v, str):
+        _encode_str(out, v)
+    elif isinstance(v, dict):
+        out.append(T_DICT)
+        out += _u32.pack(len(v))
+        for k, item in v.items():
+            kid = _KEY_ID.get(k)
+            if kid is not None:
+                out.append(kid)
+            else:
+                raw = str(k).encode()
+                if len(raw) > 255:
+                    raise WireError("ключ длиннее 255 байт не кодируется в bin1")
+                out += bytes((KEY_INLINE, len(raw)))
+                out += raw
+            _encode_value(out, item)
+    elif isinstance(v, (list, tuple)):
+        out.append(T_LIST)
+        out += _u32.pack(len(v))
+        for item in v:
+            _encode_value(out, item)
+    else:
+        raise TypeError(f"Тип {type(v).__name__} не поддерживается бинарным форматом")
+
+
+def encode_frame(message: dict, compression: str | None = None, payload_format: str = "bin1") -> bytes:
+    """
+    Сообщение -> кадр. compression: None | "zlib" | "zstd"; payload_format:
+    "bin1" или "cjson". WireError — сообщение не представимо в bin1.
+    """
+    if payload_format == "cjson":
+        # Быстрые уровни: смысл cjson — сжатие почти без затрат CPU сверх json
+        text = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        payload, flags, levels = text.encode(), FLAG_JSON, (1, 1)
+    else:
+        out = bytearray()
+        _encode_value(out, message)
+        payload, flags, levels = bytes(out), 0, (3, 6)
+    if compression and len(payload) >= COMPRESS_THRESHOLD:
+        if compression == "zstd" and zstandard is not None:
+            packed, flag = zstandard.ZstdCompressor(level=levels[0]).compress(payload), flags | FLAG_ZSTD
+        else:
+            packed, flag = zlib.compress(payload, levels[1]), flags | FLAG_ZLIB
+        if len(packed) < len(payload):
+            payload, flags = packed, flag
+    return _HEADER.pack(MAGIC, WIRE_VERSION, flags, len(payload)) + payload
+
+
+# ==========================
+# ДЕКОДИРОВАНИЕ
+# ==========================
+def _decode_value(buf: bytes, pos: int):
+    tag = buf[pos]
+    pos += 1
+    if tag == T_DICT:
+        (n,) = _u32.unpack_from(buf, pos)
+        pos += 4
+        d = {}
+        for _ in range(n):
+            kid = buf[pos]
+            pos += 1
+            if kid == KEY_INLINE:
+                klen = buf[pos]
+                key = buf[pos + 1:pos + 1 + klen].decode()
+                pos += 1 + klen
+            else:
+                key = KEYS[kid]
+            d[key], pos = _decode_value(buf, pos)
+        return d, pos
+    if tag == T_LIST:
+        (n,) = _u32.unpack_from(buf, pos)
+        pos += 4
+        items = []
+        for _ in range(n):
+            item, pos = _decode_value(buf, pos)
+            items.append(item)
+        return items, pos
+    if tag in (T_STR8, T_HEX8, T_B64_8):
+        n = buf[pos]
+        pos += 1
+    elif tag in (T_STR32, T_HEX32, T_B64_32):
+        (n,) = _u32.unpack_from(buf, pos)
+        pos += 4
+    elif tag == T_INT:
+        return _i64.unpack_from(buf, pos)[0], pos + 8
+    elif tag == T_FLOAT:
+        return _f64.unpack_from(buf, pos)[0], pos + 8
+    elif tag == T_NONE:
+        return None, pos
+    elif tag == T_TRUE:
+        return True, pos
+    elif tag == T_FALSE:
+        return False, pos
+    elif tag == T_BIGINT:
+        n = buf[pos]
+        return int(buf[pos + 1:pos + 1 + n]), pos + 1 + n
+    else:
+        raise WireError(f"неизвестный тег {tag:#x}")
+
+    raw = buf[pos:pos + n]
+    if len(raw) != n:
+        raise WireError("кадр обрезан")
+    pos += n
+    if tag in (T_HEX8, T_HEX32):
+        return raw.hex(), pos
+    if tag in (T_B64_8, T_B64_32):
+        return b64encode(raw).decode(), pos
+    return raw.decode(), pos
+
+
+def read_frame(stream) -> bytes | None:
+    """
+    Прочитать один кадр из файлового потока (поток кадров подряд, например
+    экспорт цепочки). None — поток закончился ровно на границе кадра.
+    """
+    header = stream.read(_HEADER.size)
+    if not header:
+        return None
+    if len(header) != _HEADER.size:
+        raise WireError("поток обрезан внутри заголовка")
+    _, _, _, length = _HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise WireError("длина кадра превышает допустимую")
+    payload = stream.read(length)
+    if len(payload) != length:
+        raise WireError("поток обрезан внутри кадра")
+    return header + payload
+
+
+def decode_frame(frame: bytes) -> dict:
+    """Бинарный кадр -> сообщение (dict). WireError при любой ошибке формата"""
+    if len(frame) < _HEADER.size:
+        raise WireError("кадр короче заголовка")
+    magic, version, flags, length = _HEADER.unpack_from(frame)
+    if magic != MAGIC or version != WIRE_VERSION:
+        raise WireError("неизвестная версия кадра")
+    if length > MAX_FRAME_SIZE or len(frame) - _HEADER.size != length:
+        raise WireError("длина кадра не совпадает с заголовком")
+    payload = bytes(frame[_HEADER.size:])
+    try:
+        if flags & FLAG_ZSTD:
+            if zstandard is None:
+                raise WireError("zstd не поддерживается этим узлом")
+            payload = zstandard.ZstdDecompressor().decompress(payload, max_output_size=MAX_FRAME_SIZE)
+        elif flags & FLAG_ZLIB:
+            d = zlib.decompressobj()
+            payload = d.decompress(payload, MAX_FRAME_SIZE)
+            if d.unconsumed_tail:
+                raise WireError("распакованный кадр слишком большой")
+        if flags & FLAG_JSON:
+            msg, pos = json.loads(payload), len(payload)
+        else:
+            msg, pos = _decode_value(payload, 0)
+    except WireError:
+        raise
+    except Exception as e:
+        raise WireError(f"повреждённая нагрузка: {e}") from e
+    if pos != len(payload) or not isinstance(msg, dict):
+        raise WireError("лишние байты или не словарь")
+    return msg